@@ -105,7 +105,7 @@ def print_status() -> None:
         # Get more info
         try:
             from src.daemon.client import DaemonClient
-            c = DaemonClient()
+            c = DaemonClient(persistent=False)
             st = c.get_status()
             srv = "ON" if st.get("server_running") else "OFF"
             mdl = st.get("model_id") or "none"
@@ -10,4 +10,7 @@ Modular structure:
   src.database  — SQLite storage for API keys
   src.tuning    — Generation hyper-parameter management
   src.config    — Shared configuration (ServerConfig, paths)
+  src.metrics   — Prometheus-style metrics registry
+  src.tracing   — Per-request phase timings
+  src.bench     — Offline load generator + FakeBackend
 """
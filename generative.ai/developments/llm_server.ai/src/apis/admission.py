@@ -0,0 +1,107 @@
+"""Per-key admission control for the API server.
+
+Every generation request is admitted (or refused with a retry hint)
+before it reaches the scheduler, keyed on the id returned by
+``verify_api_key``:
+
+  • max concurrent requests — in-flight requests per key
+  • tokens per minute       — a token bucket refilled continuously and
+    charged with each request's actual usage when it finishes
+
+Limits come from the key's row in ``api_keys`` (cached in memory by
+``Database.key_limits``); ``None`` falls back to the server defaults
+and ``0`` disables a limit.  The global queue depth is bounded by the
+scheduler itself.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+#: Seconds a client is told to wait when only the concurrency cap is hit
+CONCURRENCY_RETRY_AFTER = 1
+
+
+class AdmissionRejected(Exception):
+    """The request exceeds a limit; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Track in-flight requests and token budgets per API key.
+
+    *limits* maps a key id to ``(max_concurrent, tokens_per_minute)``
+    with ``None`` meaning "use the default".  Thread-safe: requests are
+    admitted on the event loop and finished from the scheduler thread.
+    """
+
+    def __init__(
+        self,
+        limits: Callable[[int], Tuple[Optional[int], Optional[int]]],
+        default_max_concurrent: int = 0,
+        default_tokens_per_minute: int = 0,
+    ) -> None:
+        self._limits = limits
+        self.default_max_concurrent = default_max_concurrent
+        self.default_tokens_per_minute = default_tokens_per_minute
+        self._inflight: Dict[int, int] = {}
+        # key id → (tokens available, monotonic time of last refill)
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, key_id: int) -> Tuple[int, int]:
+        max_concurrent, tpm = self._limits(key_id)
+        if max_concurrent is None:
+            max_concurrent = self.default_max_concurrent
+        if tpm is None:
+            tpm = self.default_tokens_per_minute
+        return max_concurrent, tpm
+
+    def _refill(self, key_id: int, tpm: int, now: float) -> float:
+        """Return *key_id*'s current token level (capped at one minute's worth)."""
+        level, stamp = self._buckets.get(key_id, (float(tpm), now))
+        level = min(float(tpm), level + (now - stamp) * tpm / 60.0)
+        self._buckets[key_id] = (level, now)
+        return level
+
+    def admit(self, key_id: int) -> None:
+        """Count a new request for *key_id* or raise ``AdmissionRejected``.
+
+        Every admitted request must be paired with ``finish``.
+        """
+        max_concurrent, tpm = self._resolve(key_id)
+        with self._lock:
+            if tpm > 0:
+                level = self._refill(key_id, tpm, time.monotonic())
+                if level <= 0:
+                    # Wait until the bucket is back above zero
+                    wait = math.ceil((1 - level) * 60.0 / tpm)
+                    raise AdmissionRejected(
+                        f"Token rate limit exceeded ({tpm} tokens/min)", wait
+                    )
+            inflight = self._inflight.get(key_id, 0)
+            if max_concurrent > 0 and inflight >= max_concurrent:
+                raise AdmissionRejected(
+                    f"Too many concurrent requests (limit {max_concurrent})",
+                    CONCURRENCY_RETRY_AFTER,
+                )
+            self._inflight[key_id] = inflight + 1
+
+    def finish(self, key_id: int, tokens: int = 0) -> None:
+        """Release an admitted request and charge the *tokens* it used."""
+        _max_concurrent, tpm = self._resolve(key_id)
+        with self._lock:
+            n = self._inflight.get(key_id, 0) - 1
+            if n > 0:
+                self._inflight[key_id] = n
+            else:
+                self._inflight.pop(key_id, None)
+            if tpm > 0 and tokens:
+                level = self._refill(key_id, tpm, time.monotonic())
+                self._buckets[key_id] = (level - tokens, time.monotonic())
@@ -0,0 +1,107 @@
+"""Response cache — replay finished greedy generations.
+
+With sampling off, a model's output depends only on its inputs, so an
+identical request can be answered from memory instead of running a
+full generation.  Entries are keyed by a digest of the resolved model
+id, the normalized prompt / messages and the resolved generation
+params; eviction is least-recently-used, bounded by an entry count,
+and entries expire after ``ttl`` seconds.
+
+The cache is opt-in (``response_cache_entries`` in ``config.json``)
+and callers skip it per request with ``"cache": false``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.llms.backends.base import GenerationResult
+
+#: Default lifetime of a cached response
+DEFAULT_TTL = 300.0
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL map of request digest → ``GenerationResult``."""
+
+    def __init__(self, max_entries: int = 0, ttl: float = DEFAULT_TTL) -> None:
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = ttl
+        # digest → (result, monotonic expiry), least-recently-used first
+        self._entries: "OrderedDict[str, Tuple[GenerationResult, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(kind: str, model: str, payload: Any, params: Dict[str, Any]) -> str:
+        """Digest of everything that determines a greedy generation.
+
+        Messages are reduced to ``role`` / ``content`` so extra client
+        fields don't split otherwise identical requests.
+        """
+        if kind == "chat":
+            payload = [
+                {"role": m.get("role", "user"), "content": m.get("content", "")}
+                for m in payload
+            ]
+        blob = json.dumps(
+            [kind, model, payload, params], sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # ── Lookup / insert ────────────────────────────────────────────
+    def get(self, key: str) -> Optional[GenerationResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, result: GenerationResult) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (result, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry (e.g. after a model was reloaded)."""
+        with self._lock:
+            self._entries.clear()
+
+    # ── Introspection ──────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
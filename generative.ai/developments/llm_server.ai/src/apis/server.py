@@ -2,16 +2,28 @@
 
 from __future__ import annotations
 
+import asyncio
 import time
 import uuid
 import threading
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, Header, Depends
+from fastapi import FastAPI, HTTPException, Header, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
+from src import metrics
+from src.apis.admission import AdmissionController, AdmissionRejected
+from src.apis.response_cache import ResponseCache
+from src.config import TRACE_FILE
+from src.llms.backends.base import GenerationResult, StreamChunk
+from src.llms.stop import MAX_STOP_SEQUENCES, normalize_stop
+from src.llms.scheduler import RequestHandle, RequestScheduler, SchedulerFull
+from src.tracing import Trace, TraceWriter, span
+
 # ── Pydantic schemas ───────────────────────────────────────────────────
 
 class CompletionRequest(BaseModel):
@@ -23,6 +35,10 @@ class CompletionRequest(BaseModel):
     top_k: Optional[int] = None
     repetition_penalty: Optional[float] = None
     do_sample: Optional[bool] = None
+    stop: Optional[Union[str, List[str]]] = None
+    stop_token_ids: Optional[List[int]] = None
+    stream: bool = False
+    cache: bool = True  # False → skip the response cache for this request
 
 
 class ChatMessage(BaseModel):
@@ -39,6 +55,10 @@ class ChatCompletionRequest(BaseModel):
     top_k: Optional[int] = None
     repetition_penalty: Optional[float] = None
     do_sample: Optional[bool] = None
+    stop: Optional[Union[str, List[str]]] = None
+    stop_token_ids: Optional[List[int]] = None
+    stream: bool = False
+    cache: bool = True  # False → skip the response cache for this request
 
 
 class CompletionChoice(BaseModel):
@@ -77,21 +97,175 @@ class ChatCompletionResponse(BaseModel):
     usage: UsageInfo = Field(default_factory=UsageInfo)
 
 
+# ── Streaming (SSE) chunk schemas ──────────────────────────────────────
+
+class CompletionStreamChoice(BaseModel):
+    index: int = 0
+    text: str = ""
+    finish_reason: Optional[str] = None
+
+
+class ChatDelta(BaseModel):
+    role: Optional[str] = None
+    content: Optional[str] = None
+
+
+class ChatStreamChoice(BaseModel):
+    index: int = 0
+    delta: ChatDelta = Field(default_factory=ChatDelta)
+    finish_reason: Optional[str] = None
+
+
+class CompletionChunk(BaseModel):
+    id: str = ""
+    object: str = "text_completion"
+    created: int = 0
+    model: str = ""
+    choices: List[CompletionStreamChoice] = Field(default_factory=list)
+    usage: Optional[UsageInfo] = None
+
+
+class ChatCompletionChunk(BaseModel):
+    id: str = ""
+    object: str = "chat.completion.chunk"
+    created: int = 0
+    model: str = ""
+    choices: List[ChatStreamChoice] = Field(default_factory=list)
+    usage: Optional[UsageInfo] = None
+
+
+def _sse(payload: BaseModel) -> str:
+    """Encode *payload* as one Server-Sent Events ``data:`` frame."""
+    return f"data: {payload.model_dump_json()}\n\n"
+
+
+SSE_DONE = "data: [DONE]\n\n"
+
+
+class _EventStream(StreamingResponse):
+    """SSE response that runs *on_close* however the response ends.
+
+    A client that disconnects before Starlette pulls the first chunk
+    never starts the body generator, so a ``finally`` inside it would
+    never run; wrapping ``__call__`` catches that case too.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content: AsyncIterator[str], on_close: Callable[[], None]) -> None:
+        super().__init__(content)
+        self._on_close = on_close
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+            await self.body_iterator.aclose()
+
+# How often a non-streaming request checks whether its client is gone
+DISCONNECT_POLL_S = 0.5
+
+# Retry-After (seconds) when the shared request queue is full
+QUEUE_FULL_RETRY_AFTER = 1
+
+
+# ── Metrics middleware ────────────────────────────────────────────────
+
+class _MetricsMiddleware:
+    """Count requests by route / status and track requests in flight.
+
+    Plain ASGI (no ``BaseHTTPMiddleware``), so streams pass through
+    untouched and a request stays "in flight" until its body is sent.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def _send(message: Any) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec()
+            # Route template, not the raw path, keeps label cardinality low
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.HTTP_REQUESTS.inc(
+                route=route, method=scope["method"], status=str(status)
+            )
+
+
 # ── Build the FastAPI app ─────────────────────────────────────────────
 
 def create_api(
     inference_engine: Any,
     db: Any,
     config: Any,
+    scheduler: Optional[RequestScheduler] = None,
+    response_cache: Optional[ResponseCache] = None,
 ) -> FastAPI:
-    """Create and return a configured FastAPI application."""
+    """Create and return a configured FastAPI application.
+
+    Pass the daemon's *scheduler* so API and TUI generations share one
+    queue (and one running batch); otherwise the app owns its own.
+    Likewise *response_cache* lets cached responses outlive a server
+    restart; by default one is built from ``config``.
+    """
+
+    owns_scheduler = scheduler is None
+    if scheduler is None:
+        scheduler = RequestScheduler(
+            inference_engine,
+            max_queue=config.max_queue,
+            max_batch_size=config.max_batch_size,
+        )
+
+    if response_cache is None:
+        response_cache = ResponseCache(
+            config.response_cache_entries, config.response_cache_ttl
+        )
+
+    # Per-key concurrency / token-rate limits (see ``admission``)
+    admission = AdmissionController(
+        db.key_limits,
+        default_max_concurrent=config.key_max_concurrent,
+        default_tokens_per_minute=config.key_tokens_per_minute,
+    )
+
+    # Per-request phase timings (see ``tracing``)
+    tracing_on = config.trace_requests or config.trace_header
+    trace_writer = TraceWriter(TRACE_FILE) if config.trace_requests else None
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        scheduler.start()
+        try:
+            yield
+        finally:
+            if owns_scheduler:
+                scheduler.stop()
+            if trace_writer is not None:
+                trace_writer.stop()
 
     app = FastAPI(
         title="LLM Server.AI",
         version="1.0.0",
         description="Local LLM inference server (OpenAI-compatible)",
+        lifespan=lifespan,
     )
 
+    app.add_middleware(_MetricsMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -99,28 +273,55 @@ def create_api(
         allow_headers=["*"],
     )
 
+    # ── Tracing ────────────────────────────────────────────────────
+    # FastAPI caches dependencies per request, so the auth check and
+    # the route receive the same ``Trace``.
+    async def open_trace(request: Request) -> Optional[Trace]:
+        return Trace(request.url.path) if tracing_on else None
+
+    def _close_trace(trace: Trace, handle: RequestHandle) -> None:
+        """Export *trace* once *handle* is done (its last spans are in)."""
+        trace.finish()
+        if trace_writer is None:
+            return
+        if handle.future.done():
+            trace_writer.write(trace)
+        else:
+            handle.future.add_done_callback(lambda _f: trace_writer.write(trace))
+
     # ── Auth dependency ────────────────────────────────────────────
-    async def verify_api_key(
+    # Plain ``def``: FastAPI runs it in the thread pool, keeping the
+    # SQLite lookup off the event loop.
+    def verify_api_key(
         authorization: Optional[str] = Header(None),
+        trace: Optional[Trace] = Depends(open_trace),
     ) -> int:
         """Validate the Bearer token and return the key's database id."""
-        if authorization is None:
-            raise HTTPException(status_code=401, detail="Missing Authorization header")
-        scheme, _, token = authorization.partition(" ")
-        if scheme.lower() != "bearer" or not token:
-            raise HTTPException(status_code=401, detail="Invalid Authorization header")
-        key_id = db.validate_key_get_id(token)
-        if key_id is None:
-            raise HTTPException(status_code=403, detail="Invalid API key")
-        return key_id
+        with span(trace, "auth"):
+            if authorization is None:
+                raise HTTPException(status_code=401, detail="Missing Authorization header")
+            scheme, _, token = authorization.partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                raise HTTPException(status_code=401, detail="Invalid Authorization header")
+            key_id = db.validate_key_get_id(token)
+            if key_id is None:
+                raise HTTPException(status_code=403, detail="Invalid API key")
+            return key_id
 
     # ── Param resolver (merge client overrides with server defaults) ─
     def _resolve_params(req: Any) -> Dict[str, Any]:
         """Merge request params with server-configured tuning defaults.
 
         If the client provides a value it overrides; if omitted (None)
-        the server's ``config.tuning`` value is used.
+        the server's ``config.tuning`` value is used.  ``stop`` strings
+        and ``stop_token_ids`` are per request only.
         """
+        stop = normalize_stop(req.stop)
+        if len(stop) > MAX_STOP_SEQUENCES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MAX_STOP_SEQUENCES} stop sequences are allowed",
+            )
         t = config.tuning
         return {
             "max_tokens": req.max_tokens if req.max_tokens is not None else t.max_tokens,
@@ -129,8 +330,203 @@ def create_api(
             "top_k": req.top_k if req.top_k is not None else t.top_k,
             "repetition_penalty": req.repetition_penalty if req.repetition_penalty is not None else t.repetition_penalty,
             "do_sample": req.do_sample if req.do_sample is not None else t.do_sample,
+            "stop": stop,
+            "stop_token_ids": list(req.stop_token_ids or []),
         }
 
+    def _usage(final: StreamChunk) -> UsageInfo:
+        """Exact usage as reported by the backend for this generation."""
+        return UsageInfo(
+            prompt_tokens=final.prompt_tokens,
+            completion_tokens=final.completion_tokens,
+            total_tokens=final.prompt_tokens + final.completion_tokens,
+        )
+
+    def _record_usage(
+        key_id: int, endpoint: str, usage: UsageInfo, trace: Optional[Trace] = None
+    ) -> None:
+        # Queued for the background writer — no disk I/O on this path
+        try:
+            with span(trace, "usage"):
+                db.usage_writer.record(
+                    key_id, endpoint,
+                    usage.prompt_tokens, usage.completion_tokens, usage.total_tokens,
+                )
+        except Exception:
+            pass  # never fail the request because of metering
+
+    def _submit(
+        key_id: int,
+        kind: str,
+        payload: Any,
+        params: Dict[str, Any],
+        model: str,
+        stream: bool,
+        trace: Optional[Trace] = None,
+    ) -> RequestHandle:
+        """Admit the request for *key_id* and queue it on the scheduler.
+
+        Over-limit requests and a full queue get ``429`` with a
+        ``Retry-After`` header; the key's slot and token budget are
+        settled when the request finishes, however it ends.
+        """
+        try:
+            admission.admit(key_id)
+        except AdmissionRejected as exc:
+            raise HTTPException(
+                status_code=429, detail=str(exc),
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+        try:
+            handle = scheduler.submit(
+                kind, payload, params, model=model, stream=stream, trace=trace
+            )
+        except SchedulerFull:
+            admission.finish(key_id)
+            raise HTTPException(
+                status_code=429, detail="Server busy — request queue is full",
+                headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER)},
+            )
+
+        def _settle(_future: Any) -> None:
+            final = handle.final
+            used = final.prompt_tokens + final.completion_tokens if final else 0
+            admission.finish(key_id, used)
+
+        handle.future.add_done_callback(_settle)
+        return handle
+
+    def _start(
+        key_id: int,
+        kind: str,
+        payload: Any,
+        req: Any,
+        model: str,
+        trace: Optional[Trace] = None,
+    ) -> RequestHandle:
+        """Serve *req* from the response cache, or submit it.
+
+        Only greedy requests (``do_sample`` off) are cacheable — their
+        output is fully determined by model, input and params.  Misses
+        are stored once they finish normally.
+        """
+        if trace is not None:
+            trace.set(key_id=key_id, model=model, stream=req.stream)
+        with span(trace, "params"):
+            params = _resolve_params(req)
+        if not (response_cache.enabled and req.cache and not params["do_sample"]):
+            return _submit(key_id, kind, payload, params, model, req.stream, trace)
+
+        with span(trace, "cache") as attrs:
+            key = response_cache.key(kind, model, payload, params)
+            hit = response_cache.get(key)
+            attrs["hit"] = hit is not None
+        if hit is not None:
+            return RequestHandle.from_result(kind, payload, params, model, hit)
+
+        handle = _submit(key_id, kind, payload, params, model, req.stream, trace)
+
+        def _store(future: Any) -> None:
+            final = handle.final
+            if future.exception() is None and final.finish_reason in ("stop", "length"):
+                response_cache.put(key, GenerationResult(
+                    text=future.result(),
+                    finish_reason=final.finish_reason,
+                    prompt_tokens=final.prompt_tokens,
+                    completion_tokens=final.completion_tokens,
+                ))
+
+        handle.future.add_done_callback(_store)
+        return handle
+
+    # ── Cancellation ───────────────────────────────────────────────
+    # A client that disconnects cancels its generation, so the shared
+    # model stops spending tokens on it; the tokens already generated
+    # are still metered.
+    def _event_stream(
+        handle: RequestHandle,
+        key_id: int,
+        endpoint: str,
+        trace: Optional[Trace],
+        body: AsyncIterator[str],
+    ) -> _EventStream:
+        """Stream *body*, metering and cleaning up *handle* independently of it."""
+
+        def _meter(future: Any) -> None:
+            # Fires when generation ends — finished, cancelled or a
+            # cache replay — whether or not any chunk was ever sent
+            if future.exception() is None and handle.final is not None:
+                _record_usage(key_id, endpoint, _usage(handle.final), trace)
+
+        def _close() -> None:
+            handle.cancel()
+            if trace is not None:
+                _close_trace(trace, handle)
+
+        handle.future.add_done_callback(_meter)
+        return _EventStream(body, on_close=_close)
+
+    async def _wait(handle: RequestHandle, request: Request) -> str:
+        """Await the full text, cancelling if the client disconnects."""
+        waiter = asyncio.ensure_future(handle.wait())
+        while not waiter.done():
+            await asyncio.wait({waiter}, timeout=DISCONNECT_POLL_S)
+            if not waiter.done() and await request.is_disconnected():
+                handle.cancel()
+                break
+        return await waiter
+
+    # ── SSE generators ─────────────────────────────────────────────
+    # Generation runs on the scheduler thread; chunks are awaited here,
+    # so a long stream never blocks the event loop or a pool thread.
+    async def _stream_completion(
+        handle: RequestHandle, model: str
+    ) -> AsyncIterator[str]:
+        cid = f"cmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        async for chunk in handle:
+            if chunk.finish_reason is None:
+                yield _sse(CompletionChunk(
+                    id=cid, created=created, model=model,
+                    choices=[CompletionStreamChoice(text=chunk.text)],
+                ))
+                continue
+            yield _sse(CompletionChunk(
+                id=cid, created=created, model=model,
+                choices=[CompletionStreamChoice(
+                    text=chunk.text, finish_reason=chunk.finish_reason,
+                )],
+                usage=_usage(chunk),
+            ))
+        yield SSE_DONE
+
+    async def _stream_chat_completion(
+        handle: RequestHandle, model: str
+    ) -> AsyncIterator[str]:
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        # OpenAI clients expect the role in the first delta
+        yield _sse(ChatCompletionChunk(
+            id=cid, created=created, model=model,
+            choices=[ChatStreamChoice(delta=ChatDelta(role="assistant", content=""))],
+        ))
+        async for chunk in handle:
+            if chunk.finish_reason is None:
+                yield _sse(ChatCompletionChunk(
+                    id=cid, created=created, model=model,
+                    choices=[ChatStreamChoice(delta=ChatDelta(content=chunk.text))],
+                ))
+                continue
+            yield _sse(ChatCompletionChunk(
+                id=cid, created=created, model=model,
+                choices=[ChatStreamChoice(
+                    delta=ChatDelta(content=chunk.text or None),
+                    finish_reason=chunk.finish_reason,
+                )],
+                usage=_usage(chunk),
+            ))
+        yield SSE_DONE
+
     # ── Routes ─────────────────────────────────────────────────────
 
     @app.get("/")
@@ -141,98 +537,133 @@ def create_api(
             "status": "running",
             "model_loaded": inference_engine.is_loaded,
             "model_id": inference_engine.model_id,
+            "resident_models": [m["model_id"] for m in inference_engine.resident_models()],
             "endpoints": [
                 "/health",
                 "/v1/models",
                 "/v1/completions",
                 "/v1/chat/completions",
+                "/v1/stats",
+                "/metrics",
             ],
         }
 
     @app.get("/v1/models")
     async def list_models(key_id: int = Depends(verify_api_key)):
-        model_id = inference_engine.model_id or "none"
         return {
             "object": "list",
             "data": [
                 {
-                    "id": model_id,
+                    "id": m["model_id"],
                     "object": "model",
                     "owned_by": "local",
+                    "backend": m["backend"],
+                    "active": m["active"],
                 }
+                for m in inference_engine.resident_models()
             ],
         }
 
     @app.post("/v1/completions", response_model=CompletionResponse)
     async def create_completion(
         req: CompletionRequest,
+        request: Request,
+        response: Response,
         key_id: int = Depends(verify_api_key),
+        trace: Optional[Trace] = Depends(open_trace),
     ):
         if not inference_engine.is_loaded:
             raise HTTPException(status_code=503, detail="No model loaded")
 
-        params = _resolve_params(req)
-        text = inference_engine.generate(req.prompt, **params)
-
-        # Rough token estimates (words ÷ 0.75)
-        prompt_tok = max(1, len(req.prompt.split()))
-        completion_tok = max(1, len(text.split()))
-        total_tok = prompt_tok + completion_tok
-
-        # Record usage
-        try:
-            db.record_usage(key_id, "/v1/completions", prompt_tok, completion_tok, total_tok)
-        except Exception:
-            pass  # never fail the request because of metering
+        model = inference_engine.resolve_model(req.model) or ""
+        handle = _start(key_id, "generate", req.prompt, req, model, trace)
+        if req.stream:
+            return _event_stream(
+                handle, key_id, "/v1/completions", trace,
+                _stream_completion(handle, model),
+            )
+        text = await _wait(handle, request)
+
+        usage = _usage(handle.final)
+        _record_usage(key_id, "/v1/completions", usage, trace)
+        if trace is not None:
+            _close_trace(trace, handle)
+            if config.trace_header:
+                response.headers["x-timing"] = trace.header()
 
         return CompletionResponse(
             id=f"cmpl-{uuid.uuid4().hex[:12]}",
             created=int(time.time()),
-            model=inference_engine.model_id or "",
-            choices=[CompletionChoice(text=text)],
-            usage=UsageInfo(
-                prompt_tokens=prompt_tok,
-                completion_tokens=completion_tok,
-                total_tokens=total_tok,
-            ),
+            model=model,
+            choices=[CompletionChoice(
+                text=text, finish_reason=handle.final.finish_reason,
+            )],
+            usage=usage,
         )
 
     @app.post("/v1/chat/completions", response_model=ChatCompletionResponse)
     async def create_chat_completion(
         req: ChatCompletionRequest,
+        request: Request,
+        response: Response,
         key_id: int = Depends(verify_api_key),
+        trace: Optional[Trace] = Depends(open_trace),
     ):
         if not inference_engine.is_loaded:
             raise HTTPException(status_code=503, detail="No model loaded")
 
         messages = [{"role": m.role, "content": m.content} for m in req.messages]
-        params = _resolve_params(req)
-        text = inference_engine.chat_generate(messages, **params)
-
-        # Rough token estimates
-        prompt_text = " ".join(m.content for m in req.messages)
-        prompt_tok = max(1, len(prompt_text.split()))
-        completion_tok = max(1, len(text.split()))
-        total_tok = prompt_tok + completion_tok
-
-        # Record usage
-        try:
-            db.record_usage(key_id, "/v1/chat/completions", prompt_tok, completion_tok, total_tok)
-        except Exception:
-            pass
+        model = inference_engine.resolve_model(req.model) or ""
+        handle = _start(key_id, "chat", messages, req, model, trace)
+        if req.stream:
+            return _event_stream(
+                handle, key_id, "/v1/chat/completions", trace,
+                _stream_chat_completion(handle, model),
+            )
+        text = await _wait(handle, request)
+
+        usage = _usage(handle.final)
+        _record_usage(key_id, "/v1/chat/completions", usage, trace)
+        if trace is not None:
+            _close_trace(trace, handle)
+            if config.trace_header:
+                response.headers["x-timing"] = trace.header()
 
         return ChatCompletionResponse(
             id=f"chatcmpl-{uuid.uuid4().hex[:12]}",
             created=int(time.time()),
-            model=inference_engine.model_id or "",
+            model=model,
             choices=[
-                ChatChoice(message=ChatMessage(role="assistant", content=text))
+                ChatChoice(
+                    message=ChatMessage(role="assistant", content=text),
+                    finish_reason=handle.final.finish_reason,
+                )
             ],
-            usage=UsageInfo(
-                prompt_tokens=prompt_tok,
-                completion_tokens=completion_tok,
-                total_tokens=total_tok,
-            ),
+            usage=usage,
+        )
+
+    @app.get("/v1/stats")
+    async def stats(key_id: int = Depends(verify_api_key)):
+        return {
+            "queue_depth": scheduler.queue_depth,
+            "response_cache": response_cache.stats(),
+            "prefix_cache": inference_engine.cache_stats(),
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        """Prometheus text exposition (unauthenticated, like ``/health``)."""
+        metrics.QUEUE_DEPTH.set(scheduler.queue_depth)
+        for name, st in (
+            ("response", response_cache.stats()),
+            ("prefix", inference_engine.cache_stats()),
+        ):
+            if st:
+                metrics.CACHE_HIT_RATIO.set(st["hit_rate"], cache=name)
+                lookups = st.get("lookups", st["hits"] + st.get("misses", 0))
+                metrics.CACHE_LOOKUPS.set(lookups, cache=name)
+        return PlainTextResponse(
+            metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE
         )
 
     @app.get("/health")
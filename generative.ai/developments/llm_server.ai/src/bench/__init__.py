@@ -0,0 +1,6 @@
+"""Bench — offline load testing of the API stack (``python -m src.bench``)."""
+
+from src.bench.fake_backend import FakeBackend
+from src.bench.loadgen import RequestSample, percentiles, run_load, summarize
+
+__all__ = ["FakeBackend", "RequestSample", "percentiles", "run_load", "summarize"]
@@ -0,0 +1,192 @@
+"""Benchmark the API stack offline.
+
+Usage
+-----
+    python -m src.bench                          FakeBackend, 10 req/s, 200 requests
+    python -m src.bench --rate 50 --requests 1000 --token-delay 0.005
+    python -m src.bench --model /path/to/tiny-model --rate 2 --requests 20
+    python -m src.bench --output before.json     also write the report to a file
+
+Builds the real stack — ``create_api`` with its scheduler, admission
+control and auth against a throw-away SQLite database — serves it with
+uvicorn on a free local port and drives it with the open-loop load
+generator.  The JSON report (latency / TTFT percentiles, tokens/s,
+error rates) goes to stdout, so runs before and after a change can be
+diffed directly.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+from src.apis.keys import generate_api_key
+from src.apis.server import ServerThread, create_api
+from src.bench.fake_backend import FakeBackend
+from src.bench.loadgen import run_load, summarize
+from src.config import ServerConfig
+from src.database.db import Database
+from src.llms.inference import InferenceEngine
+
+#: Seconds to wait for uvicorn to start listening
+STARTUP_TIMEOUT = 30.0
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve(args: argparse.Namespace) -> Iterator[Tuple[str, str, InferenceEngine]]:
+    """Run the API on a free port; yield ``(base_url, api_key, engine)``."""
+    config = ServerConfig(
+        host=args.host,
+        port=_free_port(args.host),
+        max_queue=args.max_queue,
+        max_batch_size=args.max_batch_size,
+        prefix_cache_mb=args.prefix_cache_mb,
+        key_max_concurrent=args.key_max_concurrent,
+        key_tokens_per_minute=0,
+        response_cache_entries=args.response_cache,
+    )
+    with tempfile.TemporaryDirectory(prefix="llm-bench-") as tmp:
+        db = Database(str(Path(tmp) / "bench.db"))
+        api_key = generate_api_key()
+        db.add_key("bench", api_key)
+
+        engine = InferenceEngine(prefix_cache_mb=config.prefix_cache_mb)
+        if args.model == "fake":
+            engine.backend_factories["fake"] = lambda: FakeBackend(
+                token_delay=args.token_delay,
+                prefill_delay=args.prefill_delay,
+                per_seq_delay=args.per_seq_delay,
+                batching=not args.no_batching,
+            )
+            engine.load_model("fake", force_backend="fake")
+        else:
+            engine.load_model(args.model)
+
+        server = ServerThread(create_api(engine, db, config), config.host, config.port)
+        server.start()
+        try:
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while not server.server.started:
+                if not server.is_running or time.monotonic() > deadline:
+                    raise RuntimeError("API server failed to start")
+                time.sleep(0.05)
+            yield f"http://{config.host}:{config.port}", api_key, engine
+        finally:
+            server.stop()
+            engine.unload_model()
+            db.usage_writer.stop()
+            db.close()
+
+
+def _body(args: argparse.Namespace, i: int) -> Dict[str, Any]:
+    # Distinct prompts per request so neither cache short-circuits the run
+    prompt = " ".join(f"w{(i * 7 + j) % 97}" for j in range(args.prompt_words))
+    body: Dict[str, Any] = {
+        "max_tokens": args.max_tokens,
+        "do_sample": False,
+        "stream": not args.no_stream,
+    }
+    if args.chat:
+        body["messages"] = [{"role": "user", "content": f"{i}: {prompt}"}]
+    else:
+        body["prompt"] = f"{i}: {prompt}"
+    return body
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one benchmark and return its JSON-serialisable report."""
+    path = "/v1/chat/completions" if args.chat else "/v1/completions"
+    with serve(args) as (base_url, api_key, engine):
+        backend = engine.active_backend
+        if args.warmup:
+            asyncio.run(run_load(
+                base_url + path, api_key, lambda i: _body(args, -1 - i),
+                requests=args.warmup, rate=args.warmup, connections=1,
+                timeout=args.timeout,
+            ))
+        samples, wall = asyncio.run(run_load(
+            base_url + path, api_key, lambda i: _body(args, i),
+            requests=args.requests, rate=args.rate, arrival=args.arrival,
+            seed=args.seed, connections=args.connections, timeout=args.timeout,
+        ))
+    return {
+        "config": {**vars(args), "endpoint": path, "backend": backend},
+        **summarize(samples, wall),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.bench",
+        description="Benchmark the LLM Server.AI API with an open-loop load",
+    )
+    target = parser.add_argument_group("target")
+    target.add_argument("--model", default="fake",
+                        help="'fake' (default) or a model path / repo-id to load")
+    target.add_argument("--token-delay", type=float, default=0.01,
+                        help="FakeBackend: seconds per decode step")
+    target.add_argument("--prefill-delay", type=float, default=0.0002,
+                        help="FakeBackend: seconds per prompt token")
+    target.add_argument("--per-seq-delay", type=float, default=0.0,
+                        help="FakeBackend: extra seconds per batched sequence per step")
+    target.add_argument("--no-batching", action="store_true",
+                        help="FakeBackend: serve requests one at a time")
+
+    server = parser.add_argument_group("server")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--max-queue", type=int, default=1024)
+    server.add_argument("--max-batch-size", type=int, default=8)
+    server.add_argument("--prefix-cache-mb", type=int, default=512)
+    server.add_argument("--key-max-concurrent", type=int, default=0,
+                        help="per-key in-flight cap (0 = unlimited)")
+    server.add_argument("--response-cache", type=int, default=0,
+                        help="response cache entries (0 = off)")
+
+    load = parser.add_argument_group("load")
+    load.add_argument("--rate", type=float, default=10.0, help="requests per second")
+    load.add_argument("--requests", type=int, default=200)
+    load.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--connections", type=int, default=256)
+    load.add_argument("--timeout", type=float, default=120.0)
+    load.add_argument("--warmup", type=int, default=2,
+                      help="sequential requests sent first and not reported")
+    load.add_argument("--max-tokens", type=int, default=32)
+    load.add_argument("--prompt-words", type=int, default=64)
+    load.add_argument("--chat", action="store_true", help="use /v1/chat/completions")
+    load.add_argument("--no-stream", action="store_true",
+                      help="non-streaming requests (no TTFT)")
+
+    parser.add_argument("--output", help="also write the JSON report here")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        stream=sys.stderr,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Deterministic stand-in model for benchmarks — no weights, fixed costs.
+
+``FakeBackend`` implements the full ``BaseBackend`` contract (one-shot,
+streaming and continuous batching) but only sleeps: prefill costs
+``prefill_delay`` per prompt token and every decode step costs
+``token_delay`` (plus ``per_seq_delay`` for each sequence in the
+batch).  Prompts are "tokenized" on whitespace and the output is a
+fixed word sequence derived from the prompt, so the same workload
+produces the same tokens on every run and any latency change comes
+from the server stack itself.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from src.llms.backends.base import BaseBackend, GenerationResult, StreamChunk
+from src.tracing import span
+
+_WORDS = (
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+    "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+)
+
+
+class FakeBackend(BaseBackend):
+    """Sleep-based backend with configurable prefill / decode costs.
+
+    Parameters
+    ----------
+    token_delay:
+        Seconds per decode step (shared by every sequence in a batch).
+    prefill_delay:
+        Seconds per prompt token.
+    per_seq_delay:
+        Extra seconds per sequence in each batched decode step.
+    batching:
+        ``False`` makes the scheduler run requests one at a time.
+    """
+
+    def __init__(
+        self,
+        token_delay: float = 0.01,
+        prefill_delay: float = 0.0002,
+        per_seq_delay: float = 0.0,
+        batching: bool = True,
+    ) -> None:
+        self.token_delay = token_delay
+        self.prefill_delay = prefill_delay
+        self.per_seq_delay = per_seq_delay
+        self.supports_batching = batching
+        self._model_id: Optional[str] = None
+
+    # ── Lifecycle ──────────────────────────────────────────────────
+    def load(self, model_path: str, **kwargs: Any) -> None:
+        self._model_id = model_path
+
+    def unload(self) -> None:
+        self._model_id = None
+
+    # ── Generation ─────────────────────────────────────────────────
+    @staticmethod
+    def _format_chat(messages: list[dict]) -> str:
+        return " ".join(
+            f"{m.get('role', 'user')}: {m.get('content', '')}" for m in messages
+        )
+
+    def _start(self, prompt: str, kwargs: Dict[str, Any]) -> "_FakeSequence":
+        if self._model_id is None:
+            raise RuntimeError("No model loaded — load a model first.")
+        trace = kwargs.get("trace")
+        with span(trace, "tokenize"):
+            prompt_tokens = max(1, len(prompt.split()))
+        seq = _FakeSequence(prompt, prompt_tokens, int(kwargs.get("max_tokens", 512)))
+        with span(trace, "prefill"):
+            time.sleep(self.prefill_delay * prompt_tokens)
+            seq.advance()
+        return seq
+
+    def generate_stream(self, prompt: str, **kwargs: Any) -> Iterator[StreamChunk]:
+        cancel = kwargs.get("cancel")
+        seq = self._start(prompt, kwargs)
+        started = time.perf_counter()
+        while True:
+            if seq.text_delta:
+                yield StreamChunk(text=seq.text_delta)
+                seq.text_delta = ""
+            if seq.finish_reason is None and cancel is not None and cancel.is_set():
+                seq.finish_reason = "cancelled"
+            if seq.finish_reason is not None:
+                break
+            time.sleep(self.token_delay)
+            seq.advance()
+        trace = kwargs.get("trace")
+        if trace is not None:
+            trace.add("decode", started, time.perf_counter())
+        yield StreamChunk(
+            finish_reason=seq.finish_reason,
+            prompt_tokens=seq.prompt_tokens,
+            completion_tokens=seq.completion_tokens,
+        )
+
+    def chat_generate_stream(
+        self, messages: list[dict], **kwargs: Any
+    ) -> Iterator[StreamChunk]:
+        return self.generate_stream(self._format_chat(messages), **kwargs)
+
+    def generate(self, prompt: str, **kwargs: Any) -> str:
+        return self.complete(prompt, **kwargs).text
+
+    def chat_generate(self, messages: list[dict], **kwargs: Any) -> str:
+        return self.chat_complete(messages, **kwargs).text
+
+    def chat_complete(self, messages: list[dict], **kwargs: Any) -> GenerationResult:
+        return self.complete(self._format_chat(messages), **kwargs)
+
+    # ── Continuous batching ────────────────────────────────────────
+    def start_sequence(self, prompt: str, **kwargs: Any) -> "_FakeSequence":
+        return self._start(prompt, kwargs)
+
+    def chat_start_sequence(
+        self, messages: list[dict], **kwargs: Any
+    ) -> "_FakeSequence":
+        return self._start(self._format_chat(messages), kwargs)
+
+    def decode_step(self, seqs: list["_FakeSequence"]) -> None:
+        live = [s for s in seqs if s.finish_reason is None]
+        if not live:
+            return
+        time.sleep(self.token_delay + self.per_seq_delay * len(live))
+        for seq in live:
+            seq.advance()
+
+    # ── Introspection ──────────────────────────────────────────────
+    @property
+    def is_loaded(self) -> bool:
+        return self._model_id is not None
+
+    @property
+    def model_id(self) -> str | None:
+        return self._model_id
+
+    @property
+    def backend_name(self) -> str:
+        return "fake"
+
+    def device_info(self) -> Dict[str, str]:
+        return {"type": "CPU", "name": "fake", "memory": "—"}
+
+
+class _FakeSequence:
+    """Decode state of one fake request (batched or streamed)."""
+
+    def __init__(self, prompt: str, prompt_tokens: int, max_new_tokens: int) -> None:
+        # Same prompt → same words, independent of PYTHONHASHSEED
+        self._offset = hashlib.sha1(prompt.encode("utf-8")).digest()[0]
+        self.prompt_tokens = prompt_tokens
+        self.max_new_tokens = max(1, max_new_tokens)
+        self.completion_tokens = 0
+        self.text_delta = ""
+        self.finish_reason: Optional[str] = None
+        self.cache: list = []  # the scheduler clears it on cancel
+
+    def advance(self) -> None:
+        word = _WORDS[(self._offset + self.completion_tokens) % len(_WORDS)]
+        self.text_delta += f" {word}"
+        self.completion_tokens += 1
+        if self.completion_tokens >= self.max_new_tokens:
+            self.finish_reason = "length"
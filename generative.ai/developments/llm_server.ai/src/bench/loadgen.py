@@ -0,0 +1,165 @@
+"""Open-loop HTTP load generator and latency summary.
+
+Requests are launched on a fixed schedule (Poisson or evenly spaced
+arrivals at ``rate`` per second), whether or not earlier ones have
+finished, so a slow server builds up a queue instead of quietly
+slowing the client down.  Latency is measured from each request's
+*scheduled* start, which keeps client-side backlog from hiding
+server stalls (coordinated omission).
+
+Needs ``httpx`` (``pip install httpx``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+@dataclass
+class RequestSample:
+    """Outcome of one benchmark request (times in seconds)."""
+
+    ok: bool
+    latency: float
+    ttft: Optional[float] = None
+    completion_tokens: int = 0
+    error: Optional[str] = None  # "http_429", "ReadTimeout", …
+
+
+def percentiles(values: Sequence[float], scale: float = 1.0) -> Dict[str, float]:
+    """``p50`` / ``p95`` / ``p99`` / ``mean`` / ``max`` of *values* × *scale*."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def _pct(p: float) -> float:
+        # Linear interpolation between closest ranks
+        pos = (len(ordered) - 1) * p
+        lo, hi = math.floor(pos), math.ceil(pos)
+        return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+    return {
+        "p50": round(_pct(0.50) * scale, 3),
+        "p95": round(_pct(0.95) * scale, 3),
+        "p99": round(_pct(0.99) * scale, 3),
+        "mean": round(sum(ordered) / len(ordered) * scale, 3),
+        "max": round(ordered[-1] * scale, 3),
+    }
+
+
+def arrival_times(
+    n: int, rate: float, arrival: str = "poisson", seed: int = 0
+) -> List[float]:
+    """Offsets (seconds from start) at which the *n* requests are sent."""
+    rng = random.Random(seed)
+    times, t = [], 0.0
+    for _ in range(n):
+        times.append(t)
+        t += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    return times
+
+
+async def _send(
+    client: Any,
+    url: str,
+    body: Dict[str, Any],
+    scheduled: float,
+) -> RequestSample:
+    ttft: Optional[float] = None
+    tokens = 0
+    try:
+        if not body.get("stream"):
+            resp = await client.post(url, json=body)
+            if resp.status_code != 200:
+                return RequestSample(False, time.perf_counter() - scheduled,
+                                     error=f"http_{resp.status_code}")
+            tokens = resp.json().get("usage", {}).get("completion_tokens", 0)
+            return RequestSample(True, time.perf_counter() - scheduled,
+                                 completion_tokens=tokens)
+
+        async with client.stream("POST", url, json=body) as resp:
+            if resp.status_code != 200:
+                await resp.aread()
+                return RequestSample(False, time.perf_counter() - scheduled,
+                                     error=f"http_{resp.status_code}")
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                chunk = json.loads(line[6:])
+                choice = (chunk.get("choices") or [{}])[0]
+                text = choice.get("text") or (choice.get("delta") or {}).get("content")
+                if text and ttft is None:
+                    ttft = time.perf_counter() - scheduled
+                if chunk.get("usage"):
+                    tokens = chunk["usage"].get("completion_tokens", 0)
+        return RequestSample(True, time.perf_counter() - scheduled, ttft, tokens)
+    except Exception as exc:
+        return RequestSample(False, time.perf_counter() - scheduled,
+                             error=type(exc).__name__)
+
+
+async def run_load(
+    url: str,
+    api_key: str,
+    make_body: Callable[[int], Dict[str, Any]],
+    *,
+    requests: int,
+    rate: float,
+    arrival: str = "poisson",
+    seed: int = 0,
+    connections: int = 256,
+    timeout: float = 120.0,
+) -> tuple[List[RequestSample], float]:
+    """Send *requests* bodies (``make_body(i)``) to *url*; return samples + wall time."""
+    try:
+        import httpx
+    except ImportError as exc:
+        raise RuntimeError(
+            "httpx is not installed. Install it with: pip install httpx"
+        ) from exc
+
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    headers = {"Authorization": f"Bearer {api_key}"}
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        tasks = []
+        for i, offset in enumerate(arrival_times(requests, rate, arrival, seed)):
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(_send(client, url, make_body(i), scheduled)))
+        samples = await asyncio.gather(*tasks)
+        return list(samples), time.perf_counter() - start
+
+
+def summarize(samples: Sequence[RequestSample], wall: float) -> Dict[str, Any]:
+    """Aggregate *samples* into the JSON report (latencies in ms)."""
+    ok = [s for s in samples if s.ok]
+    errors: Dict[str, int] = {}
+    for s in samples:
+        if not s.ok:
+            errors[s.error or "error"] = errors.get(s.error or "error", 0) + 1
+    tokens = sum(s.completion_tokens for s in ok)
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "failed": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 3) if wall > 0 else 0.0,
+        "latency_ms": percentiles([s.latency for s in ok], 1000.0),
+        "ttft_ms": percentiles([s.ttft for s in ok if s.ttft is not None], 1000.0),
+        "completion_tokens": tokens,
+        "tokens_per_s": round(tokens / wall, 3) if wall > 0 else 0.0,
+        "request_tokens_per_s": percentiles(
+            [s.completion_tokens / s.latency for s in ok if s.latency > 0]
+        ),
+    }
@@ -10,6 +10,7 @@ from src.tuning.params import TuningParams
 CONFIG_DIR = Path.home() / ".config" / "llm_server_ai"
 CONFIG_FILE = CONFIG_DIR / "config.json"
 DB_FILE = CONFIG_DIR / "server.db"
+TRACE_FILE = CONFIG_DIR / "traces.jsonl"
 CACHE_DIR = Path.home() / ".cache" / "huggingface"
 
 
@@ -26,6 +27,21 @@ class ServerConfig:
     model_dir: str = ""
     theme: str = "tokyo-night"
     log_level: str = "INFO"
+    max_queue: int = 64
+    max_batch_size: int = 8
+    prefix_cache_mb: int = 512
+    max_models: int = 1
+    model_memory_gb: float = 0.0  # 0 = limit by max_models only
+    usage_retention_days: int = 0  # delete raw usage rows older than this; 0 = keep forever
+    # Per-key admission defaults (overridable per key; 0 = unlimited)
+    key_max_concurrent: int = 4
+    key_tokens_per_minute: int = 0
+    # Exact-match cache for greedy (do_sample=False) responses; 0 = off
+    response_cache_entries: int = 0
+    response_cache_ttl: float = 300.0
+    # Per-request phase timings → traces.jsonl / ``x-timing`` header
+    trace_requests: bool = False
+    trace_header: bool = False
     tuning: TuningParams = field(default_factory=TuningParams)
 
     # ── Persistence ────────────────────────────────────────────────────
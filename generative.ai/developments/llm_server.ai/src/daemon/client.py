@@ -3,9 +3,12 @@
 from __future__ import annotations
 
 import json
+import queue
 import socket
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterator, Optional
 
 
 SOCKET_PATH = Path.home() / ".config" / "llm_server_ai" / "daemon.sock"
@@ -16,15 +19,32 @@ class DaemonDisconnected(Exception):
 
 
 class DaemonClient:
-    """Send JSON commands to the daemon, one connection per call.
+    """Send JSON commands to the daemon.
 
-    This is inherently thread-safe: each ``send_command`` opens its own
-    short-lived Unix socket connection, so multiple TUI worker threads
-    can call the daemon concurrently without contention.
+    By default commands share one persistent connection: each request
+    carries an ``id`` and a reader thread routes responses back to the
+    waiting caller, so any number of TUI worker threads can have
+    commands in flight at once without reconnecting.
+
+    ``persistent=False`` opens a short-lived connection per call
+    (one-shot mode) — handy for scripts like ``run.py --status``.
     """
 
-    def __init__(self, socket_path: str | Path | None = None) -> None:
+    #: Generous timeout for load_model / generate
+    TIMEOUT = 300
+
+    def __init__(
+        self, socket_path: str | Path | None = None, persistent: bool = True
+    ) -> None:
         self.socket_path = str(socket_path or SOCKET_PATH)
+        self.persistent = persistent
+
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()  # guards _sock, ids and writes
+        self._next_id = 0
+        self._pending: Dict[int, Future] = {}
+        # Extra frames (``"event"`` key) for streaming commands, by id
+        self._streams: Dict[int, "queue.Queue[Optional[dict]]"] = {}
 
     # ── Core transport ─────────────────────────────────────────────
     def send_command(self, cmd: str, **kwargs: Any) -> Dict[str, Any]:
@@ -32,8 +52,193 @@ class DaemonClient:
 
         Raises ``DaemonDisconnected`` if the daemon cannot be reached.
         """
+        if not self.persistent:
+            return self._send_oneshot(cmd, kwargs)
+        return self._request(cmd, kwargs)[1]
+
+    def _request(
+        self,
+        cmd: str,
+        kwargs: Dict[str, Any],
+        stream: "queue.Queue[Optional[dict]] | None" = None,
+    ) -> tuple[int, Dict[str, Any]]:
+        """Send one tagged request; return ``(id, response)``.
+
+        If *stream* is given, event frames for this id are put on it
+        (followed by ``None`` once the connection is gone).
+        """
+        future: Future = Future()
+        req_id = self._send(cmd, kwargs, future, stream)
+        try:
+            return req_id, future.result(timeout=self.TIMEOUT)
+        except FutureTimeout:
+            self._forget(req_id)
+            raise DaemonDisconnected(f"Daemon did not answer {cmd!r} in time") from None
+
+    def _send(
+        self,
+        cmd: str,
+        kwargs: Dict[str, Any],
+        future: Future,
+        stream: "queue.Queue[Optional[dict]] | None",
+    ) -> int:
+        with self._lock:
+            self._next_id += 1
+            req_id = self._next_id
+            msg = json.dumps({"cmd": cmd, "id": req_id, **kwargs}) + "\n"
+            self._write(msg)
+            # Still under _lock, so the reader cannot see the reply first
+            self._pending[req_id] = future
+            if stream is not None:
+                self._streams[req_id] = stream
+        return req_id
+
+    def _forget(self, req_id: int) -> None:
+        with self._lock:
+            self._pending.pop(req_id, None)
+            self._streams.pop(req_id, None)
+
+    def stream_command(self, cmd: str, **kwargs: Any) -> Iterator[dict]:
+        """Send a streaming *cmd* and yield its frames as they arrive.
+
+        Frames are ``{"event": ..., "data": {...}}`` dicts.  If the
+        command fails, a single ``{"event": "error"}`` frame is yielded.
+        Raises ``DaemonDisconnected`` if the connection drops.
+        """
+        if not self.persistent:
+            raise RuntimeError("stream_command() needs a persistent DaemonClient")
+        frames: "queue.Queue[Optional[dict]]" = queue.Queue()
+        future: Future = Future()
+        # The response line always follows the command's frames
+        future.add_done_callback(lambda _f: frames.put(None))
+        req_id = self._send(cmd, kwargs, future, frames)
+        try:
+            while True:
+                try:
+                    frame = frames.get(timeout=self.TIMEOUT)
+                except queue.Empty:
+                    raise DaemonDisconnected(f"Daemon stalled on {cmd!r}") from None
+                if frame is None:
+                    break
+                if frame["event"] != "disconnected":
+                    yield frame
+            response = future.result()  # raises DaemonDisconnected
+            if not response.get("ok"):
+                yield {"event": "error", "data": {"error": response.get("error", "?")}}
+        finally:
+            self._forget(req_id)
+
+    # ── Events ─────────────────────────────────────────────────────
+    def subscribe(
+        self,
+        callback: Callable[[str, dict], None],
+        events: list[str] | None = None,
+    ) -> int:
+        """Have the daemon push events; return the subscription id.
+
+        ``callback(event, data)`` runs on a dedicated thread, so it may
+        call back into this client.  Event names are ``download``,
+        ``model``, ``server`` and ``usage``; a final ``disconnected``
+        event is delivered if the connection drops (subscriptions do
+        not survive a reconnect).
+        """
+        if not self.persistent:
+            raise RuntimeError("subscribe() needs a persistent DaemonClient")
+        frames: "queue.Queue[Optional[dict]]" = queue.Queue()
+        kwargs: dict[str, Any] = {"events": events} if events else {}
+        req_id, response = self._request("subscribe", kwargs, stream=frames)
+        if not response.get("ok"):
+            with self._lock:
+                self._streams.pop(req_id, None)
+            raise RuntimeError(response.get("error", "subscribe failed"))
+
+        def _deliver() -> None:
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    return
+                try:
+                    callback(frame["event"], frame.get("data") or {})
+                except Exception:
+                    pass  # a broken listener must not stop the stream
+
+        threading.Thread(target=_deliver, name="daemon-events", daemon=True).start()
+        return response["data"]["subscription"]
+
+    def unsubscribe(self, subscription: int) -> dict:
+        return self.send_command("unsubscribe", subscription=subscription)
+
+    def close(self) -> None:
+        """Close the persistent connection (reopened on next command)."""
+        with self._lock:
+            self._drop(DaemonDisconnected("Client closed"))
+
+    def _write(self, msg: str) -> None:
+        # Called with _lock held; retries once so a daemon restart
+        # (stale socket) is transparent to the caller.
+        for attempt in (1, 2):
+            if self._sock is None:
+                self._connect()
+            try:
+                self._sock.sendall(msg.encode("utf-8"))
+                return
+            except OSError as exc:
+                self._drop(DaemonDisconnected(f"Cannot reach daemon: {exc}"))
+                if attempt == 2:
+                    raise DaemonDisconnected(f"Cannot reach daemon: {exc}") from exc
+
+    def _connect(self) -> None:
         sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.settimeout(300)  # generous timeout for load_model / generate
+        try:
+            sock.connect(self.socket_path)
+        except OSError as exc:
+            sock.close()
+            raise DaemonDisconnected(f"Cannot reach daemon: {exc}") from exc
+        self._sock = sock
+        threading.Thread(
+            target=self._read_loop, args=(sock,), name="daemon-client", daemon=True
+        ).start()
+
+    def _read_loop(self, sock: socket.socket) -> None:
+        """Route each response line to the caller waiting on its ``id``."""
+        try:
+            for line in sock.makefile("r", encoding="utf-8"):
+                response = json.loads(line)
+                req_id = response.pop("id", None)
+                with self._lock:
+                    if "event" in response:
+                        stream = self._streams.get(req_id)
+                        if stream is not None:
+                            stream.put(response)
+                        continue
+                    future = self._pending.pop(req_id, None)
+                if future is not None:
+                    future.set_result(response)
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            if self._sock is sock:
+                self._drop(DaemonDisconnected("Daemon closed the connection"))
+
+    def _drop(self, exc: DaemonDisconnected) -> None:
+        # Called with _lock held: forget the socket, fail in-flight calls
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(exc)
+        streams, self._streams = self._streams, {}
+        for stream in streams.values():
+            stream.put({"event": "disconnected", "data": {"error": str(exc)}})
+            stream.put(None)
+
+    def _send_oneshot(self, cmd: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.TIMEOUT)
         try:
             sock.connect(self.socket_path)
             msg = json.dumps({"cmd": cmd, **kwargs}) + "\n"
@@ -78,8 +283,11 @@ class DaemonClient:
     def switch_backend(self, backend: str) -> dict:
         return self.send_command("switch_backend", backend=backend)
 
-    def unload_model(self) -> dict:
-        return self.send_command("unload_model")
+    def unload_model(self, model_id: str | None = None) -> dict:
+        kwargs: dict = {}
+        if model_id is not None:
+            kwargs["model_id"] = model_id
+        return self.send_command("unload_model", **kwargs)
 
     def list_models(self) -> list:
         return self.send_command("list_models").get("data", [])
@@ -124,6 +332,18 @@ class DaemonClient:
     def set_key_status(self, key_id: int, status: str) -> dict:
         return self.send_command("set_key_status", key_id=key_id, status=status)
 
+    def set_key_limits(
+        self,
+        key_id: int,
+        max_concurrent: int | None = None,
+        tokens_per_minute: int | None = None,
+    ) -> dict:
+        """``None`` → server default, ``0`` → unlimited."""
+        return self.send_command(
+            "set_key_limits", key_id=key_id,
+            max_concurrent=max_concurrent, tokens_per_minute=tokens_per_minute,
+        )
+
     def revoke_key(self, key_id: int) -> dict:
         return self.set_key_status(key_id, "revoked")
 
@@ -142,9 +362,43 @@ class DaemonClient:
             kwargs["key_id"] = key_id
         return self.send_command("key_usage", **kwargs).get("data", [])
 
+    def usage_range(
+        self,
+        start: str,
+        end: str | None = None,
+        key_id: int | None = None,
+        granularity: str = "hour",
+    ) -> list:
+        kwargs: dict[str, Any] = {"start": start, "granularity": granularity}
+        if end is not None:
+            kwargs["end"] = end
+        if key_id is not None:
+            kwargs["key_id"] = key_id
+        return self.send_command("usage_range", **kwargs).get("data", [])
+
     def key_usage_history(self, key_id: int) -> list:
         return self.send_command("key_usage_history", key_id=key_id).get("data", [])
 
+    def usage_history_page(
+        self, key_id: int, before: list | None = None, limit: int = 100
+    ) -> dict:
+        """One page of call records; pass ``next_before`` to get the next.
+
+        The cursor is ``[created_at, id]`` of the last row returned.
+        """
+        kwargs: dict[str, Any] = {"key_id": key_id, "limit": limit}
+        if before is not None:
+            kwargs["before"] = before
+        return self.send_command("usage_history_page", **kwargs).get(
+            "data", {"rows": [], "next_before": None}
+        )
+
+    def compact_usage(self, retain_days: int | None = None) -> dict:
+        kwargs: dict[str, Any] = {}
+        if retain_days is not None:
+            kwargs["retain_days"] = retain_days
+        return self.send_command("compact_usage", **kwargs)
+
     def get_config(self) -> dict:
         return self.send_command("get_config").get("data", {})
 
@@ -176,11 +430,53 @@ class DaemonClient:
     def set_log_level(self, level: str) -> dict:
         return self.send_command("set_log_level", level=level)
 
-    def generate(self, prompt: str) -> dict:
-        return self.send_command("generate", prompt=prompt)
+    # Pass a ``generation_id`` to be able to ``cancel_generation`` it
+    def generate(
+        self,
+        prompt: str,
+        generation_id: str | None = None,
+        stop: str | list | None = None,
+    ) -> dict:
+        return self.send_command(
+            "generate", prompt=prompt, generation_id=generation_id, stop=stop
+        )
+
+    def chat_generate(
+        self,
+        messages: list,
+        generation_id: str | None = None,
+        stop: str | list | None = None,
+    ) -> dict:
+        return self.send_command(
+            "chat_generate", messages=messages, generation_id=generation_id, stop=stop
+        )
+
+    def generate_stream(
+        self,
+        prompt: str,
+        generation_id: str | None = None,
+        stop: str | list | None = None,
+    ) -> Iterator[dict]:
+        """Yield ``token`` frames, then a ``done`` frame with timing stats."""
+        return self.stream_command(
+            "generate_stream", prompt=prompt, generation_id=generation_id, stop=stop
+        )
+
+    def chat_generate_stream(
+        self,
+        messages: list,
+        generation_id: str | None = None,
+        stop: str | list | None = None,
+    ) -> Iterator[dict]:
+        """Yield ``token`` frames, then a ``done`` frame with timing stats."""
+        return self.stream_command(
+            "chat_generate_stream", messages=messages,
+            generation_id=generation_id, stop=stop,
+        )
 
-    def chat_generate(self, messages: list) -> dict:
-        return self.send_command("chat_generate", messages=messages)
+    def cancel_generation(self, generation_id: str | None = None) -> dict:
+        """Stop one daemon generation, or every running one if no id."""
+        return self.send_command("cancel_generation", generation_id=generation_id)
 
     def shutdown(self) -> dict:
         return self.send_command("shutdown")
@@ -7,7 +7,10 @@ A long-running background process that owns all heavy state:
   • ServerThread     (FastAPI/uvicorn)
 
 Communication with the TUI happens over a Unix domain socket using
-new-line-delimited JSON messages.
+new-line-delimited JSON messages, served by an asyncio loop; blocking
+command handlers run on bounded thread pools.  Messages tagged with an ``id`` are
+multiplexed over one long-lived connection; untagged ones get a single
+response and the connection is closed.
 
 Run directly:
     python -m src.daemon.process          # foreground (logs to stdout)
@@ -16,6 +19,7 @@ Run directly:
 
 from __future__ import annotations
 
+import asyncio
 import gc
 import json
 import logging
@@ -25,8 +29,14 @@ import socket
 import sys
 import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from src import metrics
+from src.llms.stop import normalize_stop
 
 # ── Paths ──────────────────────────────────────────────────────────────
 CONFIG_DIR = Path.home() / ".config" / "llm_server_ai"
@@ -34,6 +44,18 @@ PID_FILE = CONFIG_DIR / "daemon.pid"
 SOCKET_PATH = CONFIG_DIR / "daemon.sock"
 LOG_FILE = CONFIG_DIR / "daemon.log"
 
+# ── Socket server limits ───────────────────────────────────────────────
+# Longest accepted request line (chat histories can be large)
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+# Commands that can hold a worker for seconds or minutes; they run on a
+# separate, smaller executor so status / key / usage calls stay snappy.
+SLOW_COMMANDS = frozenset({
+    "load_model", "switch_backend", "unload_model", "delete_model",
+    "generate", "chat_generate", "generate_stream", "chat_generate_stream",
+    "search_models", "list_repo_files", "hf_status", "set_hf_token",
+    "compact_usage",
+})
+
 # ── Logging ────────────────────────────────────────────────────────────
 CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -50,20 +72,64 @@ class LLMDaemon:
     def __init__(self) -> None:
         from src.config import ServerConfig, DB_FILE
         from src.database import Database
-        from src.llms import InferenceEngine, ModelManager
+        from src.apis.response_cache import ResponseCache
+        from src.llms import InferenceEngine, ModelManager, RequestScheduler
 
         self.config = ServerConfig.load()
         self.db = Database(str(DB_FILE))
-        self.engine = InferenceEngine()
+        self.engine = InferenceEngine(
+            prefix_cache_mb=self.config.prefix_cache_mb,
+            max_models=self.config.max_models,
+            memory_budget_gb=self.config.model_memory_gb,
+        )
         self.mm = ModelManager(
             cache_dir=self.config.model_dir or None
         )
+        # Shared by the API server and the TUI's generate commands
+        self.scheduler = RequestScheduler(
+            self.engine,
+            max_queue=self.config.max_queue,
+            max_batch_size=self.config.max_batch_size,
+        )
+        # Outlives API server restarts; cleared whenever models change
+        self.response_cache = ResponseCache(
+            self.config.response_cache_entries, self.config.response_cache_ttl
+        )
 
         self.server_thread: Any = None  # ServerThread | None
         self._running = False
 
+        # Tell subscribers whenever buffered API usage hits the DB
+        self.db.usage_writer.on_flush = lambda rows: self._publish("usage", rows=rows)
+
+        # Event loop (set in _serve) and the bounded executors that run
+        # blocking command handlers: quick commands never queue behind
+        # model loads or generations.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Open client connections (writer → handler task), closed on stop
+        self._clients: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._cmd_pool = ThreadPoolExecutor(
+            max_workers=8, thread_name_prefix="daemon-cmd"
+        )
+        self._slow_pool = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="daemon-slow"
+        )
+
+        # ── Event subscribers (id → (emit, event filter)) ──────────
+        self._subs_lock = threading.Lock()
+        self._subscribers: Dict[int, tuple[Callable[[dict], None], Optional[set]]] = {}
+        self._next_sub = 0
+
         # ── Locks ──────────────────────────────────────────────────
-        self._model_lock = threading.Lock()
+        # Generation needs no daemon lock: each request holds a shared
+        # engine lease on its backend via the scheduler.  Load / swap /
+        # unload are the exclusive side — serialised here, and the
+        # engine only unloads a backend once its leases have drained.
+        self._load_lock = threading.Lock()
+
+        # ── Running daemon generations (generation_id → handle) ────
+        self._gen_lock = threading.Lock()
+        self._generations: Dict[str, Any] = {}
 
         # ── Download state ─────────────────────────────────────────
         self._dl_lock = threading.Lock()
@@ -82,88 +148,147 @@ class LLMDaemon:
         """Start the daemon: listen for clients on the Unix socket."""
         self._check_existing_daemon()
         self._write_pid()
-        self._setup_signals()
 
         log.info("Daemon starting (PID %d)", os.getpid())
 
         # Auto-restore in background so socket is available immediately
         if self.config.auto_restore:
             threading.Thread(target=self._auto_restore, daemon=True).start()
+        threading.Thread(target=self._retention_loop, daemon=True).start()
+        self.scheduler.start()
 
         try:
-            self._accept_loop()
+            asyncio.run(self._serve())
         except KeyboardInterrupt:
             log.info("KeyboardInterrupt — shutting down")
         finally:
             self._shutdown()
 
-    # ── Socket server ──────────────────────────────────────────────
-    def _accept_loop(self) -> None:
+    # ── Socket server (asyncio) ────────────────────────────────────
+    async def _serve(self) -> None:
         sock_path = str(SOCKET_PATH)
 
         # Remove stale socket
         if os.path.exists(sock_path):
             os.unlink(sock_path)
 
-        self._server_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self._server_sock.bind(sock_path)
-        self._server_sock.listen(10)
-        self._server_sock.settimeout(1.0)  # for clean shutdown
-        self._running = True
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._setup_signals()
 
+        server = await asyncio.start_unix_server(
+            self._handle_client, path=sock_path, limit=MAX_MESSAGE_BYTES
+        )
+        self._running = True
         log.info("Listening on %s", sock_path)
 
-        while self._running:
-            try:
-                client, _ = self._server_sock.accept()
-                t = threading.Thread(
-                    target=self._handle_client, args=(client,), daemon=True
-                )
-                t.start()
-            except socket.timeout:
-                continue
-            except OSError:
-                if self._running:
-                    log.exception("Socket accept error")
-                break
+        async with server:
+            await self._stop.wait()
+            # Persistent connections (TUI, subscribers) sit in readline()
+            # forever; since 3.12 leaving the context waits for them
+            server.close()
+            await self._close_clients()
+        self._running = False
 
-    def _handle_client(self, client: socket.socket) -> None:
-        """Process one request per connection (connect-per-command)."""
+    async def _close_clients(self) -> None:
+        # Closing the transport feeds EOF to the handler's readline()
+        handlers = list(self._clients.values())
+        for writer in list(self._clients):
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    def _request_stop(self, delay: float = 0.0) -> None:
+        """Stop serving (thread-safe); *delay* lets a last reply go out."""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.call_later, delay, self._stop.set)
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve one connection.
+
+        A request without an ``id`` is answered and the connection
+        closed (one-shot mode, e.g. ``run.py --status``).  Requests
+        carrying an ``id`` keep the connection open: each runs on an
+        executor and its response echoes the ``id``, so many commands
+        can be in flight on one socket at once.  Idle connections
+        (e.g. event subscribers) cost nothing but a socket.
+        """
+        tasks: set[asyncio.Task] = set()
+        self._clients[writer] = asyncio.current_task()
         try:
-            rfile = client.makefile("r", encoding="utf-8")
-            line = rfile.readline()
-            if not line:
-                return
-
-            request = json.loads(line)
-            cmd = request.pop("cmd", "")
-            response = self._dispatch(cmd, request)
-
-            payload = json.dumps(response, default=str) + "\n"
-            client.sendall(payload.encode("utf-8"))
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                if "id" not in request:
+                    self._write_line(writer, await self._run_command(request))
+                    await writer.drain()
+                    break
+                task = asyncio.create_task(self._serve_tagged(writer, request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
         except Exception:
             log.exception("Error handling client")
-            try:
-                err = json.dumps({"ok": False, "error": "Internal daemon error"}) + "\n"
-                client.sendall(err.encode("utf-8"))
-            except Exception:
-                pass
+            self._write_line(writer, {"ok": False, "error": "Internal daemon error"})
         finally:
-            try:
-                client.close()
-            except Exception:
-                pass
+            self._clients.pop(writer, None)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _serve_tagged(
+        self, writer: asyncio.StreamWriter, request: Dict[str, Any]
+    ) -> None:
+        req_id = request.pop("id")
+        # Streaming commands (e.g. ``subscribe``) push extra frames
+        # tagged with the same id through this callable
+        request["_emit"] = lambda frame: self._emit(writer, {**frame, "id": req_id})
+        response = await self._run_command(request)
+        self._write_line(writer, {**response, "id": req_id})
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass  # client went away — nothing to deliver to
+
+    async def _run_command(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a (blocking) command handler on the matching executor."""
+        cmd = request.pop("cmd", "")
+        pool = self._slow_pool if cmd in SLOW_COMMANDS else self._cmd_pool
+        return await self._loop.run_in_executor(pool, self._dispatch, cmd, request)
+
+    @staticmethod
+    def _write_line(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+        if not writer.is_closing():
+            writer.write((json.dumps(message, default=str) + "\n").encode("utf-8"))
+
+    def _emit(self, writer: asyncio.StreamWriter, frame: Dict[str, Any]) -> None:
+        """Queue *frame* on *writer* from any thread (order is preserved).
+
+        Raises ``OSError`` once the connection is closed, so publishers
+        and streaming commands can stop.
+        """
+        if writer.is_closing():
+            raise OSError("Connection closed")
+        self._loop.call_soon_threadsafe(self._write_line, writer, frame)
 
     # ── Command dispatch ───────────────────────────────────────────
     def _dispatch(self, cmd: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        handler = getattr(self, f"_cmd_{cmd}", None)
+        if handler is None:
+            metrics.DAEMON_COMMANDS.inc(cmd="unknown", outcome="error")
+            return {"ok": False, "error": f"Unknown command: {cmd}"}
         try:
-            handler = getattr(self, f"_cmd_{cmd}", None)
-            if handler is None:
-                return {"ok": False, "error": f"Unknown command: {cmd}"}
-            return handler(args)
+            resp = handler(args)
         except Exception as exc:
             log.exception("Command %s failed", cmd)
-            return {"ok": False, "error": str(exc)}
+            resp = {"ok": False, "error": str(exc)}
+        metrics.DAEMON_COMMANDS.inc(cmd=cmd, outcome="ok" if resp.get("ok") else "error")
+        return resp
 
     # ═══════════════════════════════════════════════════════════════
     #  COMMAND HANDLERS
@@ -172,6 +297,46 @@ class LLMDaemon:
     def _cmd_ping(self, _args: dict) -> dict:
         return {"ok": True, "data": "pong"}
 
+    # ── Events ─────────────────────────────────────────────────────
+    def _cmd_subscribe(self, args: dict) -> dict:
+        """Stream events to this connection until it closes.
+
+        Frames look like ``{"id": <subscribe id>, "event": name,
+        "data": {...}}``; *events* optionally limits the names sent
+        (``download``, ``model``, ``server``, ``usage``).
+        """
+        emit = args.get("_emit")
+        if emit is None:
+            return {"ok": False, "error": "subscribe needs a persistent connection"}
+        events = args.get("events")
+        with self._subs_lock:
+            self._next_sub += 1
+            sub_id = self._next_sub
+            self._subscribers[sub_id] = (emit, set(events) if events else None)
+        return {"ok": True, "data": {"subscription": sub_id}}
+
+    def _cmd_unsubscribe(self, args: dict) -> dict:
+        with self._subs_lock:
+            self._subscribers.pop(int(args.get("subscription", 0)), None)
+        return {"ok": True}
+
+    def _publish(self, event: str, **data: Any) -> None:
+        """Push *event* to every subscriber; drop closed connections."""
+        frame = {"event": event, "data": data}
+        with self._subs_lock:
+            subs = list(self._subscribers.items())
+        for sub_id, (emit, events) in subs:
+            if events is not None and event not in events:
+                continue
+            try:
+                emit(frame)
+            except OSError:
+                with self._subs_lock:
+                    self._subscribers.pop(sub_id, None)
+
+    def _publish_download(self) -> None:
+        self._publish("download", **self._cmd_download_status({})["data"])
+
     # ── Status ─────────────────────────────────────────────────────
     def _cmd_get_status(self, _args: dict) -> dict:
         return {
@@ -185,6 +350,9 @@ class LLMDaemon:
                 "model_id": self.engine.model_id,
                 "active_backend": self.engine.active_backend,
                 "loading_model": self._loading_model,
+                "resident_models": self.engine.resident_models(),
+                "prefix_cache": self.engine.cache_stats(),
+                "response_cache": self.response_cache.stats(),
             },
         }
 
@@ -193,9 +361,9 @@ class LLMDaemon:
         if self.server_thread and self.server_thread.is_running:
             return {"ok": False, "error": "Server is already running"}
 
-        from src.apis import create_api, ServerThread
+        from src.apis import ServerThread
 
-        api = create_api(self.engine, self.db, self.config)
+        api = self._create_api()
         self.server_thread = ServerThread(
             api, host=self.config.host, port=self.config.port
         )
@@ -203,6 +371,7 @@ class LLMDaemon:
         self.config.server_was_running = True
         self.config.save()
         log.info("API server started on %s:%d", self.config.host, self.config.port)
+        self._publish("server", running=True, port=self.config.port)
         return {"ok": True}
 
     def _cmd_stop_server(self, _args: dict) -> dict:
@@ -212,6 +381,7 @@ class LLMDaemon:
         self.config.server_was_running = False
         self.config.save()
         log.info("API server stopped")
+        self._publish("server", running=False, port=self.config.port)
         return {"ok": True}
 
     # ── Model management ───────────────────────────────────────────
@@ -221,9 +391,11 @@ class LLMDaemon:
             return {"ok": False, "error": "No model_id provided"}
         backend = args.get("backend")  # None / "auto" / "transformers" / "llama.cpp"
         self._loading_model = model_id
+        self._publish("model", state="loading", model_id=model_id)
         try:
-            with self._model_lock:
+            with self._load_lock:
                 self.engine.load_model(model_id, force_backend=backend)
+                self.response_cache.clear()  # cached outputs may no longer match
                 self.config.active_model = model_id
                 self.config.save()
             log.info(
@@ -231,12 +403,17 @@ class LLMDaemon:
                 model_id,
                 self.engine.active_backend,
             )
+            self._publish(
+                "model", state="loaded", model_id=model_id,
+                backend=self.engine.active_backend,
+            )
             return {
                 "ok": True,
                 "data": {"backend": self.engine.active_backend},
             }
         except Exception as exc:
             log.exception("Failed to load model %s", model_id)
+            self._publish("model", state="failed", model_id=model_id, error=str(exc))
             return {"ok": False, "error": str(exc)}
         finally:
             self._loading_model = None
@@ -249,30 +426,40 @@ class LLMDaemon:
             return {"ok": False, "error": "No model loaded"}
         model_id = self.engine.model_id
         self._loading_model = model_id
+        self._publish("model", state="loading", model_id=model_id)
         try:
-            with self._model_lock:
+            with self._load_lock:
                 self.engine.reload_with_backend(backend)
+                self.response_cache.clear()
             log.info(
                 "Backend switched to %s for %s",
                 self.engine.active_backend,
                 model_id,
             )
+            self._publish(
+                "model", state="loaded", model_id=model_id,
+                backend=self.engine.active_backend,
+            )
             return {
                 "ok": True,
                 "data": {"backend": self.engine.active_backend, "model_id": model_id},
             }
         except Exception as exc:
             log.exception("Failed to switch backend to %s", backend)
+            self._publish("model", state="failed", model_id=model_id, error=str(exc))
             return {"ok": False, "error": str(exc)}
         finally:
             self._loading_model = None
 
-    def _cmd_unload_model(self, _args: dict) -> dict:
-        with self._model_lock:
-            self.engine.unload_model()
-            self.config.active_model = ""
+    def _cmd_unload_model(self, args: dict) -> dict:
+        model_id = args.get("model_id")  # None → every resident model
+        with self._load_lock:
+            self.engine.unload_model(model_id)
+            self.response_cache.clear()
+            self.config.active_model = self.engine.model_id or ""
             self.config.save()
-        log.info("Model unloaded")
+        log.info("Model unloaded: %s", model_id or "all")
+        self._publish("model", state="unloaded", model_id=model_id)
         return {"ok": True}
 
     def _cmd_model_status(self, _args: dict) -> dict:
@@ -289,11 +476,8 @@ class LLMDaemon:
     def _cmd_list_models(self, _args: dict) -> dict:
         models = self.mm.list_downloaded_models()
         for m in models:
-            m["is_loaded"] = self.engine.model_id == m["repo_id"]
-            if m["is_loaded"] and self.engine.active_backend:
-                m["backend"] = self.engine.active_backend
-            else:
-                m["backend"] = None
+            m["is_loaded"] = self.engine.is_resident(m["repo_id"])
+            m["backend"] = self.engine.backend_name_for(m["repo_id"])
             if "last_modified" in m:
                 m["last_modified"] = str(m["last_modified"])
         return {"ok": True, "data": models}
@@ -309,12 +493,14 @@ class LLMDaemon:
         model_id = args.get("model_id", "")
         if not model_id:
             return {"ok": False, "error": "No model_id provided"}
-        # Unload first if it's the active model
-        if self.engine.model_id == model_id:
-            with self._model_lock:
-                self.engine.unload_model()
-                self.config.active_model = ""
+        # Unload first if it's resident
+        if self.engine.is_resident(model_id):
+            with self._load_lock:
+                self.engine.unload_model(model_id)
+                self.response_cache.clear()
+                self.config.active_model = self.engine.model_id or ""
                 self.config.save()
+            self._publish("model", state="unloaded", model_id=model_id)
         ok = self.mm.delete_model(model_id)
         if ok:
             log.info("Deleted model %s", model_id)
@@ -385,6 +571,21 @@ class LLMDaemon:
             return {"ok": False, "error": str(exc)}
         return {"ok": True}
 
+    def _cmd_set_key_limits(self, args: dict) -> dict:
+        """Per-key admission limits; omitted / ``None`` → server default."""
+        key_id = args.get("key_id")
+        if key_id is None:
+            return {"ok": False, "error": "key_id required"}
+        try:
+            self.db.set_key_limits(
+                int(key_id),
+                max_concurrent=args.get("max_concurrent"),
+                tokens_per_minute=args.get("tokens_per_minute"),
+            )
+        except ValueError as exc:
+            return {"ok": False, "error": str(exc)}
+        return {"ok": True}
+
     # Legacy aliases (kept for backward compat)
     def _cmd_revoke_key(self, args: dict) -> dict:
         args["status"] = "revoked"
@@ -407,12 +608,53 @@ class LLMDaemon:
             key_id = int(key_id)
         return {"ok": True, "data": self.db.get_key_usage(key_id)}
 
+    def _cmd_usage_range(self, args: dict) -> dict:
+        start = args.get("start")
+        if not start:
+            return {"ok": False, "error": "No start"}
+        key_id = args.get("key_id")
+        try:
+            rows = self.db.get_usage_range(
+                start,
+                end=args.get("end"),
+                key_id=int(key_id) if key_id is not None else None,
+                granularity=args.get("granularity", "hour"),
+            )
+        except ValueError as exc:
+            return {"ok": False, "error": str(exc)}
+        return {"ok": True, "data": rows}
+
     def _cmd_key_usage_history(self, args: dict) -> dict:
         key_id = args.get("key_id")
         if key_id is None:
             return {"ok": False, "error": "No key_id"}
         return {"ok": True, "data": self.db.get_key_usage_history(int(key_id))}
 
+    def _cmd_usage_history_page(self, args: dict) -> dict:
+        key_id = args.get("key_id")
+        if key_id is None:
+            return {"ok": False, "error": "No key_id"}
+        limit = max(1, min(int(args.get("limit", 100)), self.db.HISTORY_PAGE_MAX))
+        before = args.get("before")
+        if before is not None:
+            try:
+                created_at, row_id = before
+                before = (str(created_at), int(row_id))
+            except (TypeError, ValueError):
+                return {"ok": False, "error": "before must be [created_at, id]"}
+        rows = self.db.get_key_usage_history(int(key_id), before=before, limit=limit)
+        # Cursor for the next (older) page; None once exhausted
+        next_before = (
+            [rows[-1]["created_at"], rows[-1]["id"]] if len(rows) == limit else None
+        )
+        return {"ok": True, "data": {"rows": rows, "next_before": next_before}}
+
+    def _cmd_compact_usage(self, args: dict) -> dict:
+        days = int(args.get("retain_days", self.config.usage_retention_days))
+        deleted = self.db.compact_usage(days)
+        log.info("Compacted usage: %d raw rows older than %d days removed", deleted, days)
+        return {"ok": True, "data": {"deleted": deleted}}
+
     # ── Device info ────────────────────────────────────────────────
     def _cmd_device_info(self, _args: dict) -> dict:
         return {"ok": True, "data": self.engine.device_info()}
@@ -514,9 +756,9 @@ class LLMDaemon:
             # Restart server with new port
             self.server_thread.stop()
             self.server_thread = None
-            from src.apis import create_api, ServerThread
+            from src.apis import ServerThread
 
-            api = create_api(self.engine, self.db, self.config)
+            api = self._create_api()
             self.server_thread = ServerThread(
                 api, host=self.config.host, port=self.config.port
             )
@@ -524,6 +766,7 @@ class LLMDaemon:
             log.info(
                 "Server restarted on %s:%d", self.config.host, self.config.port
             )
+            self._publish("server", running=True, port=self.config.port)
 
         return {
             "ok": True,
@@ -607,35 +850,140 @@ class LLMDaemon:
         return {"ok": True, "data": self._cmd_get_config({})["data"]}
 
     # ── Generation ─────────────────────────────────────────────────
+    @contextmanager
+    def _generation(
+        self, kind: str, payload: Any, args: dict, stream: bool
+    ) -> Iterator[Any]:
+        """Queue a generation on the shared scheduler and track its handle.
+
+        Requests run concurrently with API traffic (batched where the
+        backend supports it) and never wait for a model load — the
+        current model keeps serving until the new one is swapped in.
+        While running, the handle can be cancelled by its
+        ``generation_id`` (see ``cancel_generation``).  An optional
+        ``stop`` (string or list) ends the generation at a stop string.
+        Raises ``SchedulerFull`` when the queue is at capacity.
+        """
+        gen_id = args.get("generation_id") or uuid.uuid4().hex[:12]
+        params = {**self._tuning_kwargs(), "stop": normalize_stop(args.get("stop"))}
+        handle = self.scheduler.submit(
+            kind, payload, params,
+            model=args.get("model"), stream=stream, source="daemon",
+        )
+        with self._gen_lock:
+            self._generations[gen_id] = handle
+        try:
+            yield handle
+        finally:
+            with self._gen_lock:
+                if self._generations.get(gen_id) is handle:
+                    del self._generations[gen_id]
+
     def _cmd_generate(self, args: dict) -> dict:
         if not self.engine.is_loaded:
             return {"ok": False, "error": "No model loaded"}
-        prompt = args.get("prompt", "")
-        kwargs = self._tuning_kwargs()
-        with self._model_lock:
-            text = self.engine.generate(prompt, **kwargs)
-        return {"ok": True, "data": {"text": text}}
+        with self._generation("generate", args.get("prompt", ""), args, False) as handle:
+            text = handle.result()
+        return {
+            "ok": True,
+            "data": {"text": text, "finish_reason": handle.final.finish_reason},
+        }
 
     def _cmd_chat_generate(self, args: dict) -> dict:
         if not self.engine.is_loaded:
             return {"ok": False, "error": "No model loaded"}
-        messages = args.get("messages", [])
-        kwargs = self._tuning_kwargs()
-        with self._model_lock:
-            text = self.engine.chat_generate(messages, **kwargs)
-        return {"ok": True, "data": {"text": text}}
+        with self._generation("chat", args.get("messages", []), args, False) as handle:
+            text = handle.result()
+        return {
+            "ok": True,
+            "data": {"text": text, "finish_reason": handle.final.finish_reason},
+        }
+
+    def _cmd_cancel_generation(self, args: dict) -> dict:
+        """Cancel the generation with ``generation_id`` — or all of them.
+
+        Cancelled requests finish early with ``finish_reason``
+        ``"cancelled"`` and whatever text was produced so far.
+        """
+        gen_id = args.get("generation_id")
+        with self._gen_lock:
+            if gen_id:
+                handles = [self._generations[gen_id]] if gen_id in self._generations else []
+            else:
+                handles = list(self._generations.values())
+        for handle in handles:
+            handle.cancel()
+        return {"ok": True, "data": {"cancelled": len(handles)}}
+
+    def _cmd_generate_stream(self, args: dict) -> dict:
+        return self._stream_generation("generate", args.get("prompt", ""), args)
+
+    def _cmd_chat_generate_stream(self, args: dict) -> dict:
+        return self._stream_generation("chat", args.get("messages", []), args)
+
+    def _stream_generation(self, kind: str, payload: Any, args: dict) -> dict:
+        """Emit ``token`` frames as text is generated, then a ``done`` frame.
+
+        The ``done`` frame (and the command response) carry usage and
+        timing: time-to-first-token and completion tokens per second.
+        """
+        emit = args.get("_emit")
+        if emit is None:
+            return {"ok": False, "error": "Streaming needs a persistent connection"}
+        if not self.engine.is_loaded:
+            return {"ok": False, "error": "No model loaded"}
+        start = time.perf_counter()
+        ttft: Optional[float] = None
+        final = None
+        with self._generation(kind, payload, args, True) as handle:
+            try:
+                for chunk in handle:
+                    if chunk.text:
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                        emit({"event": "token", "data": {"text": chunk.text}})
+                    if chunk.finish_reason is not None:
+                        final = chunk
+            except OSError:
+                # Nobody is reading any more — free the model
+                handle.cancel()
+                return {"ok": False, "error": "Client disconnected"}
+        elapsed = time.perf_counter() - start
+
+        completion = final.completion_tokens if final else 0
+        stats = {
+            "finish_reason": final.finish_reason if final else "stop",
+            "prompt_tokens": final.prompt_tokens if final else 0,
+            "completion_tokens": completion,
+            "ttft_ms": round((ttft if ttft is not None else elapsed) * 1000, 1),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "tokens_per_s": round(completion / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+        try:
+            emit({"event": "done", "data": stats})
+        except OSError:
+            pass
+        return {"ok": True, "data": stats}
 
     # ── Shutdown ───────────────────────────────────────────────────
     def _cmd_shutdown(self, _args: dict) -> dict:
         log.info("Shutdown requested")
-        # Schedule shutdown after response is sent
-        threading.Thread(target=self._deferred_shutdown, daemon=True).start()
+        # Stop shortly, once the response has been sent
+        self._request_stop(delay=0.3)
         return {"ok": True}
 
     # ═══════════════════════════════════════════════════════════════
     #  INTERNAL HELPERS
     # ═══════════════════════════════════════════════════════════════
 
+    def _create_api(self) -> Any:
+        """FastAPI app sharing the daemon's scheduler and response cache."""
+        from src.apis import create_api
+
+        return create_api(
+            self.engine, self.db, self.config, self.scheduler, self.response_cache
+        )
+
     def _tuning_kwargs(self) -> dict:
         t = self.config.tuning
         return {
@@ -675,6 +1023,7 @@ class LLMDaemon:
             self._dl_state["active"] = True
             self._dl_state["model_id"] = model_id
             self._dl_state["phase"] = "preparing"
+        self._publish_download()
 
         self._dl_thread = threading.Thread(
             target=self._run_download,
@@ -714,6 +1063,7 @@ class LLMDaemon:
                 self._dl_state["total_files"] = len(files)
                 self._dl_state["bytes_total"] = sum(f["size"] for f in files)
                 self._dl_state["phase"] = "downloading"
+            self._publish_download()
 
         def on_progress(
             fname: str,
@@ -745,6 +1095,7 @@ class LLMDaemon:
                     if f["name"] == fname:
                         f["status"] = file_status
                         break
+            self._publish_download()
 
         try:
             log.info("Download started: %s", model_id)
@@ -763,6 +1114,7 @@ class LLMDaemon:
                     if f["status"] == "pending":
                         f["status"] = "done"
             log.info("Download completed: %s", model_id)
+            self._publish_download()
 
         except DownloadCancelled:
             with self._dl_lock:
@@ -772,6 +1124,7 @@ class LLMDaemon:
                     if f["status"] == "pending":
                         f["status"] = "stopped"
             log.info("Download cancelled: %s", model_id)
+            self._publish_download()
 
         except Exception as exc:
             with self._dl_lock:
@@ -779,6 +1132,18 @@ class LLMDaemon:
                 self._dl_state["phase"] = "error"
                 self._dl_state["error"] = str(exc)
             log.exception("Download failed: %s", model_id)
+            self._publish_download()
+
+    # ── Usage retention ────────────────────────────────────────────
+    def _retention_loop(self) -> None:
+        """Compact raw usage rows at startup and then once a day."""
+        while True:
+            if self.config.usage_retention_days > 0:
+                try:
+                    self._cmd_compact_usage({})
+                except Exception:
+                    log.exception("Usage compaction failed")
+            time.sleep(24 * 3600)
 
     # ── Auto-restore ───────────────────────────────────────────────
     def _auto_restore(self) -> None:
@@ -786,27 +1151,34 @@ class LLMDaemon:
             model_id = self.config.active_model
             log.info("Auto-restoring model: %s", model_id)
             self._loading_model = model_id
+            self._publish("model", state="loading", model_id=model_id)
             try:
-                with self._model_lock:
+                with self._load_lock:
                     self.engine.load_model(model_id)
                 log.info("Model restored: %s", model_id)
-            except Exception:
+                self._publish(
+                    "model", state="loaded", model_id=model_id,
+                    backend=self.engine.active_backend,
+                )
+            except Exception as exc:
                 log.exception("Could not restore model %s", model_id)
                 self.config.active_model = ""
                 self.config.save()
+                self._publish("model", state="failed", model_id=model_id, error=str(exc))
             finally:
                 self._loading_model = None
 
         if self.config.server_was_running:
             try:
-                from src.apis import create_api, ServerThread
+                from src.apis import ServerThread
 
-                api = create_api(self.engine, self.db, self.config)
+                api = self._create_api()
                 self.server_thread = ServerThread(
                     api, host=self.config.host, port=self.config.port
                 )
                 self.server_thread.start()
                 log.info("API server auto-started on %s:%d", self.config.host, self.config.port)
+                self._publish("server", running=True, port=self.config.port)
             except Exception:
                 log.exception("Could not auto-start server")
 
@@ -838,17 +1210,12 @@ class LLMDaemon:
         PID_FILE.write_text(str(os.getpid()))
 
     def _setup_signals(self) -> None:
-        signal.signal(signal.SIGTERM, self._signal_handler)
-        signal.signal(signal.SIGINT, self._signal_handler)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self._loop.add_signal_handler(signum, self._signal_handler, signum)
 
-    def _signal_handler(self, signum: int, frame: Any) -> None:
+    def _signal_handler(self, signum: int) -> None:
         log.info("Signal %d received", signum)
-        self._running = False
-
-    def _deferred_shutdown(self) -> None:
-        """Give the response time to be sent, then shut down."""
-        time.sleep(0.3)
-        self._running = False
+        self._stop.set()
 
     def _shutdown(self) -> None:
         log.info("Daemon shutting down")
@@ -867,6 +1234,14 @@ class LLMDaemon:
             except Exception:
                 pass
             self.server_thread = None
+        self.scheduler.stop()
+
+        # Flush buffered usage rows before exiting
+        try:
+            self.db.usage_writer.stop()
+        except Exception:
+            log.exception("Could not flush usage records")
+        self.db.close()
 
         # Unload model to free GPU
         if self.engine.is_loaded:
@@ -875,11 +1250,10 @@ class LLMDaemon:
             except Exception:
                 pass
 
+        self._cmd_pool.shutdown(wait=False)
+        self._slow_pool.shutdown(wait=False)
+
         # Clean up socket and PID
-        try:
-            self._server_sock.close()
-        except Exception:
-            pass
         SOCKET_PATH.unlink(missing_ok=True)
         PID_FILE.unlink(missing_ok=True)
 
@@ -1,25 +1,93 @@
 """SQLite storage for API keys, usage tracking, and metadata."""
 
 import sqlite3
+import threading
 from pathlib import Path
-from datetime import datetime
-from typing import List, Dict, Optional
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+
+from src.database.key_cache import DEFAULT_TTL, KeyCache, KeyLimits
+from src.database.usage_writer import UsageRow, UsageWriter
 
 
 class Database:
-    """Thin wrapper around a SQLite database for API-key management."""
+    """Thin wrapper around a SQLite database for API-key management.
+
+    Each thread reuses one WAL-mode connection with a prepared-statement
+    cache, so request handlers, the usage writer and daemon commands
+    read and write concurrently without reconnecting per call.
+    """
 
-    def __init__(self, db_path: str) -> None:
+    def __init__(self, db_path: str, key_cache_ttl: float = DEFAULT_TTL) -> None:
         self.db_path = db_path
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # One persistent connection per thread (thread ident → conn)
+        self._local = threading.local()
+        self._pool: Dict[int, sqlite3.Connection] = {}
+        self._pool_lock = threading.Lock()
         self._init_db()
+        # Serves key validation from memory; invalidated on writes below
+        self.key_cache = KeyCache(self._active_keys, ttl=key_cache_ttl)
+        # Batches usage rows off the request path; see ``record_usage``
+        self.usage_writer = UsageWriter(self)
 
     # Valid key statuses
     STATUSES = ("active", "revoked", "deleted", "expired")
 
+    # Usage rollup table → length of the ISO-timestamp prefix it buckets by
+    ROLLUPS = {"usage_hourly": 13, "usage_daily": 10}
+    GRANULARITIES = {"hour": "usage_hourly", "day": "usage_daily"}
+
+    # Largest page ``get_key_usage_history`` returns
+    HISTORY_PAGE_MAX = 1000
+
+    # ── Connections ────────────────────────────────────────────────────
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=10,
+            check_same_thread=False,  # only so close() may run elsewhere
+            cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row
+        # WAL: readers never block on the writer (or vice versa);
+        # NORMAL only fsyncs at checkpoints, which is safe under WAL.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's pooled connection, opening it on first use.
+
+        Use it as ``with self._conn() as conn:`` — the block commits
+        (or rolls back) but leaves the connection open for reuse.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._pool_lock:
+                # Close connections whose threads have exited
+                alive = {t.ident for t in threading.enumerate()}
+                for ident in [i for i in self._pool if i not in alive]:
+                    self._pool.pop(ident).close()
+                self._pool[threading.get_ident()] = conn
+        return conn
+
+    def close(self) -> None:
+        """Close every pooled connection (call once at shutdown)."""
+        with self._pool_lock:
+            for conn in self._pool.values():
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._pool.clear()
+        self._local = threading.local()
+
     # ── Schema ─────────────────────────────────────────────────────────
     def _init_db(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._conn() as conn:
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS api_keys (
@@ -45,13 +113,53 @@ class Database:
                 )
                 """
             )
-            # Index for fast per-key lookups
+            # Per-key, time-ordered lookups (history pages, retention);
+            # supersedes the old key_id-only index
             conn.execute(
                 """
-                CREATE INDEX IF NOT EXISTS idx_key_usage_key_id
-                ON key_usage(key_id)
+                CREATE INDEX IF NOT EXISTS idx_key_usage_key_created
+                ON key_usage(key_id, created_at)
                 """
             )
+            conn.execute("DROP INDEX IF EXISTS idx_key_usage_key_id")
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_key_usage_created
+                ON key_usage(created_at)
+                """
+            )
+            # Hourly / daily rollups, maintained as usage is written
+            for table, width in self.ROLLUPS.items():
+                existed = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (table,),
+                ).fetchone()
+                conn.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        key_id            INTEGER NOT NULL,
+                        endpoint          TEXT    NOT NULL,
+                        bucket            TEXT    NOT NULL,
+                        calls             INTEGER DEFAULT 0,
+                        prompt_tokens     INTEGER DEFAULT 0,
+                        completion_tokens INTEGER DEFAULT 0,
+                        total_tokens      INTEGER DEFAULT 0,
+                        last_used         TEXT,
+                        PRIMARY KEY (key_id, endpoint, bucket)
+                    )
+                    """
+                )
+                if not existed:
+                    # Back-fill from the raw rows recorded so far
+                    conn.execute(
+                        f"""INSERT INTO {table}
+                            SELECT key_id, endpoint, substr(created_at, 1, {width}),
+                                   COUNT(*), SUM(prompt_tokens),
+                                   SUM(completion_tokens), SUM(total_tokens),
+                                   MAX(created_at)
+                            FROM key_usage
+                            GROUP BY 1, 2, 3"""
+                    )
 
             # ── Migrations ─────────────────────────────────────────
             cols = [
@@ -79,6 +187,12 @@ class Database:
                     "WHEN is_active = -1 THEN 'deleted' "
                     "ELSE 'revoked' END"
                 )
+            # Per-key admission limits (NULL → server default, 0 → unlimited)
+            for col in ("max_concurrent", "tokens_per_minute"):
+                if col not in cols:
+                    conn.execute(
+                        f"ALTER TABLE api_keys ADD COLUMN {col} INTEGER DEFAULT NULL"
+                    )
             conn.commit()
             # Unique constraint on key name
             conn.execute(
@@ -89,7 +203,7 @@ class Database:
 
     # ── CRUD ───────────────────────────────────────────────────────────
     def add_key(self, name: str, key: str) -> None:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._conn() as conn:
             dup = conn.execute(
                 "SELECT 1 FROM api_keys WHERE name = ?", (name,)
             ).fetchone()
@@ -101,6 +215,7 @@ class Database:
                 (name, key, datetime.now().isoformat()),
             )
             conn.commit()
+        self.key_cache.invalidate()
 
     def get_keys(self, status_filter: str = "all") -> List[Dict]:
         """Return API keys filtered by status.
@@ -108,8 +223,7 @@ class Database:
         *status_filter*: ``"all"`` (non-deleted), ``"active"``,
         ``"revoked"``, ``"expired"``, ``"deleted"``, or ``"every"``.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._conn() as conn:
             if status_filter in self.STATUSES:
                 rows = conn.execute(
                     "SELECT * FROM api_keys WHERE status = ? "
@@ -131,7 +245,7 @@ class Database:
         """Change a key's status to *status* (active/revoked/deleted/expired)."""
         if status not in self.STATUSES:
             raise ValueError(f"Invalid status '{status}', must be one of {self.STATUSES}")
-        with sqlite3.connect(self.db_path) as conn:
+        with self._conn() as conn:
             extra = ""
             params: list = [status]
             if status == "deleted":
@@ -145,6 +259,34 @@ class Database:
                 params,
             )
             conn.commit()
+        self.key_cache.invalidate()
+
+    def set_key_limits(
+        self,
+        key_id: int,
+        max_concurrent: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ) -> None:
+        """Set a key's admission limits.
+
+        ``None`` falls back to the server-wide default, ``0`` means
+        unlimited.
+        """
+        for value in (max_concurrent, tokens_per_minute):
+            if value is not None and value < 0:
+                raise ValueError("Limits must be >= 0 (or None for the default)")
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE api_keys SET max_concurrent = ?, tokens_per_minute = ? "
+                "WHERE id = ?",
+                (max_concurrent, tokens_per_minute, key_id),
+            )
+            conn.commit()
+        self.key_cache.invalidate()
+
+    def key_limits(self, key_id: int) -> KeyLimits:
+        """``(max_concurrent, tokens_per_minute)`` for an active key (cached)."""
+        return self.key_cache.limits(key_id)
 
     # ── Legacy convenience wrappers (thin) ─────────────────────────
     def revoke_key(self, key_id: int) -> None:
@@ -157,24 +299,25 @@ class Database:
         self.set_key_status(key_id, "deleted")
 
     def validate_key(self, key: str) -> bool:
-        with sqlite3.connect(self.db_path) as conn:
-            row = conn.execute(
-                "SELECT id FROM api_keys WHERE key = ? AND status = 'active'",
-                (key,),
-            ).fetchone()
-            return row is not None
+        return self.validate_key_get_id(key) is not None
 
     def validate_key_get_id(self, key: str) -> Optional[int]:
-        """Validate an API key; return its id if active, else None."""
-        with sqlite3.connect(self.db_path) as conn:
-            row = conn.execute(
-                "SELECT id FROM api_keys WHERE key = ? AND status = 'active'",
-                (key,),
-            ).fetchone()
-            return row[0] if row else None
+        """Validate an API key; return its id if active, else None.
+
+        Served from ``key_cache`` — SQLite is only read when the cache
+        is stale or has been invalidated.
+        """
+        return self.key_cache.get(key)
+
+    def _active_keys(self) -> List[Tuple[str, int, Optional[int], Optional[int]]]:
+        with self._conn() as conn:
+            return conn.execute(
+                "SELECT key, id, max_concurrent, tokens_per_minute "
+                "FROM api_keys WHERE status = 'active'"
+            ).fetchall()
 
     def key_count(self, active_only: bool = True) -> int:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._conn() as conn:
             if active_only:
                 q = "SELECT COUNT(*) FROM api_keys WHERE status = 'active'"
             else:
@@ -190,42 +333,60 @@ class Database:
         completion_tokens: int = 0,
         total_tokens: int = 0,
     ) -> None:
-        """Record a single API call for usage metering."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
+        """Record a single API call for usage metering (synchronously).
+
+        Request handlers should use ``usage_writer.record`` instead,
+        which batches writes in the background.
+        """
+        self.record_usage_many([(
+            key_id, endpoint, prompt_tokens, completion_tokens,
+            total_tokens, datetime.now().isoformat(),
+        )])
+
+    def record_usage_many(self, rows: List[UsageRow]) -> None:
+        """Insert many usage rows and update the rollups in one transaction."""
+        with self._conn() as conn:
+            conn.executemany(
                 """INSERT INTO key_usage
                    (key_id, endpoint, prompt_tokens, completion_tokens,
                     total_tokens, created_at)
                    VALUES (?, ?, ?, ?, ?, ?)""",
-                (
-                    key_id,
-                    endpoint,
-                    prompt_tokens,
-                    completion_tokens,
-                    total_tokens,
-                    datetime.now().isoformat(),
-                ),
+                rows,
             )
+            for table, width in self.ROLLUPS.items():
+                conn.executemany(
+                    f"""INSERT INTO {table}
+                        (key_id, endpoint, bucket, calls, prompt_tokens,
+                         completion_tokens, total_tokens, last_used)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (key_id, endpoint, bucket) DO UPDATE SET
+                            calls             = calls + excluded.calls,
+                            prompt_tokens     = prompt_tokens + excluded.prompt_tokens,
+                            completion_tokens = completion_tokens + excluded.completion_tokens,
+                            total_tokens      = total_tokens + excluded.total_tokens,
+                            last_used         = MAX(last_used, excluded.last_used)""",
+                    _bucket_rows(rows, width),
+                )
             conn.commit()
 
     def get_key_usage(self, key_id: Optional[int] = None) -> List[Dict]:
         """Return per-key aggregated usage stats.
 
         If *key_id* is given, return stats for that key only; otherwise
-        return stats for every key.
+        return stats for every key.  Reads the daily rollup, so the
+        cost does not grow with the number of recorded calls.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._conn() as conn:
             if key_id is not None:
                 rows = conn.execute(
                     """SELECT k.id, k.name,
-                              COUNT(u.id) AS total_calls,
+                              COALESCE(SUM(u.calls), 0)             AS total_calls,
                               COALESCE(SUM(u.prompt_tokens), 0)     AS prompt_tokens,
                               COALESCE(SUM(u.completion_tokens), 0) AS completion_tokens,
                               COALESCE(SUM(u.total_tokens), 0)      AS total_tokens,
-                              MAX(u.created_at)                     AS last_used
+                              MAX(u.last_used)                      AS last_used
                        FROM api_keys k
-                       LEFT JOIN key_usage u ON k.id = u.key_id
+                       LEFT JOIN usage_daily u ON k.id = u.key_id
                        WHERE k.id = ?
                        GROUP BY k.id""",
                     (key_id,),
@@ -233,29 +394,118 @@ class Database:
             else:
                 rows = conn.execute(
                     """SELECT k.id, k.name,
-                              COUNT(u.id) AS total_calls,
+                              COALESCE(SUM(u.calls), 0)             AS total_calls,
                               COALESCE(SUM(u.prompt_tokens), 0)     AS prompt_tokens,
                               COALESCE(SUM(u.completion_tokens), 0) AS completion_tokens,
                               COALESCE(SUM(u.total_tokens), 0)      AS total_tokens,
-                              MAX(u.created_at)                     AS last_used
+                              MAX(u.last_used)                      AS last_used
                        FROM api_keys k
-                       LEFT JOIN key_usage u ON k.id = u.key_id
+                       LEFT JOIN usage_daily u ON k.id = u.key_id
                        GROUP BY k.id
                        ORDER BY total_calls DESC"""
                 ).fetchall()
             return [dict(r) for r in rows]
 
-    def get_key_usage_history(self, key_id: int) -> List[Dict]:
-        """Return individual API-call records for *key_id* (newest first)."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def get_usage_range(
+        self,
+        start: str,
+        end: Optional[str] = None,
+        key_id: Optional[int] = None,
+        granularity: str = "hour",
+    ) -> List[Dict]:
+        """Return rolled-up usage per key, endpoint and time bucket.
+
+        *start* / *end* are ISO timestamps (``end`` defaults to now);
+        every ``"hour"`` or ``"day"`` bucket they touch is included,
+        oldest first.
+        """
+        table = self.GRANULARITIES.get(granularity)
+        if table is None:
+            raise ValueError(
+                f"Invalid granularity '{granularity}', "
+                f"must be one of {tuple(self.GRANULARITIES)}"
+            )
+        width = self.ROLLUPS[table]
+        end = end or datetime.now().isoformat()
+        query = (
+            f"SELECT key_id, endpoint, bucket, calls, prompt_tokens, "
+            f"completion_tokens, total_tokens, last_used FROM {table} "
+            f"WHERE bucket >= ? AND bucket <= ?"
+        )
+        params: list = [start[:width], end[:width]]
+        if key_id is not None:
+            query += " AND key_id = ?"
+            params.append(key_id)
+        with self._conn() as conn:
+            rows = conn.execute(query + " ORDER BY bucket, key_id", params).fetchall()
+            return [dict(r) for r in rows]
+
+    def get_key_usage_history(
+        self,
+        key_id: int,
+        before: Optional[Tuple[str, int]] = None,
+        limit: int = 100,
+    ) -> List[Dict]:
+        """Return individual API-call records for *key_id* (newest first).
+
+        Keyset-paginated on ``(created_at, id)``: pass the last row's
+        ``(created_at, id)`` as *before* to get the next page.  The id
+        breaks ties between rows written in the same batch, which share
+        a timestamp.  Served by the ``(key_id, created_at)`` index (its
+        entries end in the rowid), so deep pages cost the same as the
+        first.  *limit* is clamped to ``HISTORY_PAGE_MAX``.
+        """
+        query = (
+            "SELECT id, endpoint, prompt_tokens, completion_tokens, "
+            "total_tokens, created_at FROM key_usage WHERE key_id = ?"
+        )
+        params: list = [key_id]
+        if before is not None:
+            query += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        params.append(max(1, min(int(limit), self.HISTORY_PAGE_MAX)))
+        with self._conn() as conn:
             rows = conn.execute(
-                """SELECT endpoint, prompt_tokens, completion_tokens,
-                          total_tokens, created_at
-                   FROM key_usage
-                   WHERE key_id = ?
-                   ORDER BY created_at DESC
-                   LIMIT 100""",
-                (key_id,),
+                query + " ORDER BY created_at DESC, id DESC LIMIT ?", params
             ).fetchall()
             return [dict(r) for r in rows]
+
+    # ── Retention ──────────────────────────────────────────────────────
+    def compact_usage(self, retain_days: int) -> int:
+        """Delete raw ``key_usage`` rows older than *retain_days* days.
+
+        Their totals live on in the per-day ``usage_daily`` summary
+        rows (kept up to date on every write), so stats and range
+        queries are unaffected.  Hourly rollups past the horizon are
+        dropped as well.  Returns the number of raw rows deleted.
+        """
+        if retain_days <= 0:
+            return 0
+        cutoff = (datetime.now() - timedelta(days=retain_days)).isoformat()
+        with self._conn() as conn:
+            # Anything written before the rollups existed is summarised
+            # by the initial back-fill; nothing else needs re-aggregating.
+            deleted = conn.execute(
+                "DELETE FROM key_usage WHERE created_at < ?", (cutoff,)
+            ).rowcount
+            conn.execute(
+                "DELETE FROM usage_hourly WHERE bucket < ?",
+                (cutoff[: self.ROLLUPS["usage_hourly"]],),
+            )
+            conn.commit()
+        return deleted
+
+
+def _bucket_rows(rows: List[UsageRow], width: int) -> List[tuple]:
+    """Aggregate raw usage rows into rollup upsert parameters."""
+    buckets: Dict[tuple, list] = {}
+    for key_id, endpoint, prompt, completion, total, created_at in rows:
+        agg = buckets.setdefault(
+            (key_id, endpoint, created_at[:width]), [0, 0, 0, 0, created_at]
+        )
+        agg[0] += 1
+        agg[1] += prompt
+        agg[2] += completion
+        agg[3] += total
+        agg[4] = max(agg[4], created_at)
+    return [k + tuple(v) for k, v in buckets.items()]
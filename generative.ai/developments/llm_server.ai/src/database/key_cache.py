@@ -0,0 +1,78 @@
+"""In-memory API-key cache — keeps SQLite off the auth hot path.
+
+Active keys are held as ``sha256(key) → key_id`` so plaintext keys
+never sit in the lookup table, alongside each key's admission limits.
+The whole set is (re)loaded with one query when it is older than
+``ttl`` seconds or has been invalidated; every other lookup is a
+single dict access.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+#: Seconds before external DB edits become visible
+DEFAULT_TTL = 30.0
+
+#: ``(max_concurrent, tokens_per_minute)``; ``None`` → server default
+KeyLimits = Tuple[Optional[int], Optional[int]]
+
+
+def hash_key(key: str) -> bytes:
+    return hashlib.sha256(key.encode("utf-8")).digest()
+
+
+class KeyCache:
+    """Thread-safe map of active API keys, refreshed from *loader*.
+
+    *loader* returns ``(key, key_id, max_concurrent, tokens_per_minute)``
+    rows for every active key.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Iterable[Tuple[str, int, Optional[int], Optional[int]]]],
+        ttl: float = DEFAULT_TTL,
+    ) -> None:
+        self._loader = loader
+        self.ttl = ttl
+        self._keys: Dict[bytes, int] = {}
+        self._limits: Dict[int, KeyLimits] = {}
+        self._expires = 0.0  # monotonic deadline; 0 → reload on next lookup
+        self._generation = 0  # bumped by invalidate()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[int]:
+        """Return the id of *key* if it is active, else ``None``."""
+        if time.monotonic() >= self._expires:
+            self._reload()
+        return self._keys.get(hash_key(key))
+
+    def limits(self, key_id: int) -> KeyLimits:
+        """Return the admission limits configured for *key_id*."""
+        if time.monotonic() >= self._expires:
+            self._reload()
+        return self._limits.get(key_id, (None, None))
+
+    def invalidate(self) -> None:
+        """Force a reload on the next lookup (after add / status change)."""
+        self._generation += 1
+        self._expires = 0.0
+
+    def _reload(self) -> None:
+        with self._lock:
+            if time.monotonic() < self._expires:
+                return  # another thread refreshed it meanwhile
+            deadline = time.monotonic() + self.ttl
+            generation = self._generation
+            rows = list(self._loader())
+            # Swap in whole maps so readers never see a partial one
+            self._keys = {hash_key(row[0]): row[1] for row in rows}
+            self._limits = {row[1]: (row[2], row[3]) for row in rows}
+            # An invalidate() during the load may postdate these rows
+            # (e.g. a revoke) — keep the cache expired so it reloads
+            if self._generation == generation:
+                self._expires = deadline
@@ -0,0 +1,131 @@
+"""Write-behind usage recorder — keeps disk I/O off the request path.
+
+Request handlers ``record()`` usage events into an in-memory queue; a
+background thread writes them in one transaction per batch, whenever
+``max_batch`` events are waiting or ``flush_interval`` seconds have
+passed.  ``stop()`` drains whatever is still queued.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+log = logging.getLogger("llm_daemon")
+
+#: (key_id, endpoint, prompt_tokens, completion_tokens, total_tokens, created_at)
+UsageRow = Tuple[int, str, int, int, int, str]
+
+
+class UsageWriter:
+    """Buffer usage rows and flush them to *db* in batched transactions."""
+
+    def __init__(
+        self,
+        db: Any,
+        max_batch: int = 256,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.db = db
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[UsageRow]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._running = False
+        #: Optional ``callback(rows_written)`` after each batch commit
+        self.on_flush: Optional[Callable[[int], None]] = None
+
+    # ── Producer side ──────────────────────────────────────────────
+    def record(
+        self,
+        key_id: int,
+        endpoint: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        total_tokens: int = 0,
+    ) -> None:
+        """Queue one API call for metering; never blocks on disk."""
+        self._ensure_started()
+        self._queue.put((
+            key_id, endpoint, prompt_tokens, completion_tokens,
+            total_tokens, datetime.now().isoformat(),
+        ))
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    # ── Lifecycle ──────────────────────────────────────────────────
+    def _ensure_started(self) -> None:
+        if self._running:
+            return
+        with self._start_lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._loop, name="usage-writer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the writer thread and flush every queued row."""
+        with self._start_lock:
+            self._running = False
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=timeout)
+        self.flush()
+
+    def flush(self) -> int:
+        """Write everything queued so far; return the number of rows."""
+        written = 0
+        while True:
+            batch = self._drain(self.max_batch)
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    # ── Worker ─────────────────────────────────────────────────────
+    def _loop(self) -> None:
+        while self._running:
+            deadline = time.monotonic() + self.flush_interval
+            batch: List[UsageRow] = []
+            # Collect until the batch is full or the interval elapses
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def _drain(self, limit: int) -> List[UsageRow]:
+        batch: List[UsageRow] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[UsageRow]) -> None:
+        try:
+            self.db.record_usage_many(batch)
+        except Exception:
+            log.exception("Failed to write %d usage rows", len(batch))
+            return
+        if self.on_flush is not None:
+            try:
+                self.on_flush(len(batch))
+            except Exception:
+                log.exception("Usage flush callback failed")
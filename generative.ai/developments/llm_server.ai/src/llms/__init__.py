@@ -2,5 +2,12 @@
 
 from src.llms.inference import InferenceEngine
 from src.llms.model_manager import ModelManager, DownloadCancelled
+from src.llms.scheduler import RequestScheduler, SchedulerFull
 
-__all__ = ["InferenceEngine", "ModelManager", "DownloadCancelled"]
+__all__ = [
+    "InferenceEngine",
+    "ModelManager",
+    "DownloadCancelled",
+    "RequestScheduler",
+    "SchedulerFull",
+]
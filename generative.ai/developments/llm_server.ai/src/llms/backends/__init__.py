@@ -1,7 +1,13 @@
 """LLM inference backends — pluggable model runners."""
 
-from src.llms.backends.base import BaseBackend
+from src.llms.backends.base import BaseBackend, GenerationResult, StreamChunk
 from src.llms.backends.llms_transformers import TransformersBackend
 from src.llms.backends.llms_llama_cpp import LlamaCppBackend
 
-__all__ = ["BaseBackend", "TransformersBackend", "LlamaCppBackend"]
+__all__ = [
+    "BaseBackend",
+    "GenerationResult",
+    "StreamChunk",
+    "TransformersBackend",
+    "LlamaCppBackend",
+]
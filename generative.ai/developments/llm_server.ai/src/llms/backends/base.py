@@ -1,9 +1,43 @@
-"""Abstract base class that every inference backend must implement."""
+"""Abstract base class that every inference backend must implement.
+
+Generation methods accept an optional ``cancel`` keyword — a
+``threading.Event``.  Once it is set the backend stops at the next
+token and reports ``finish_reason="cancelled"``.  An optional
+``trace`` keyword (``src.tracing.Trace``) collects the backend's phase
+timings (templating, tokenization, prefill, decode).
+"""
 
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+
+
+@dataclass
+class StreamChunk:
+    """One incremental piece of a streamed generation.
+
+    Intermediate chunks carry a text delta only.  The final chunk has
+    an empty (or trailing) ``text``, a ``finish_reason`` of ``"stop"``,
+    ``"length"`` or ``"cancelled"`` and the prompt / completion token
+    counts.
+    """
+
+    text: str = ""
+    finish_reason: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+@dataclass
+class GenerationResult:
+    """A finished (non-streamed) generation with exact token usage."""
+
+    text: str
+    finish_reason: str = "stop"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
 
 
 class BaseBackend(ABC):
@@ -35,6 +69,48 @@ class BaseBackend(ABC):
         Each message dict has ``role`` and ``content`` keys.
         """
 
+    @abstractmethod
+    def generate_stream(self, prompt: str, **kwargs: Any) -> Iterator[StreamChunk]:
+        """Yield ``StreamChunk`` deltas for a plain-text *prompt*.
+
+        The last chunk always carries ``finish_reason`` and usage.
+        """
+
+    @abstractmethod
+    def chat_generate_stream(
+        self, messages: list[dict], **kwargs: Any
+    ) -> Iterator[StreamChunk]:
+        """Yield ``StreamChunk`` deltas for a list of chat *messages*."""
+
+    def complete(self, prompt: str, **kwargs: Any) -> GenerationResult:
+        """Like ``generate`` but also report ``finish_reason`` and usage.
+
+        The default drains ``generate_stream``; backends override it
+        when generation itself already yields exact token counts.
+        """
+        return _collect(self.generate_stream(prompt, **kwargs))
+
+    def chat_complete(self, messages: list[dict], **kwargs: Any) -> GenerationResult:
+        """Like ``chat_generate`` but also report ``finish_reason`` and usage."""
+        return _collect(self.chat_generate_stream(messages, **kwargs))
+
+    # ── Continuous batching (optional) ─────────────────────────────
+    #: Backends that can decode several requests in one forward pass
+    #: set this and implement the three methods below.
+    supports_batching: bool = False
+
+    def start_sequence(self, prompt: str, **kwargs: Any) -> Any:
+        """Prefill *prompt* and return an opaque per-request sequence."""
+        raise NotImplementedError
+
+    def chat_start_sequence(self, messages: list[dict], **kwargs: Any) -> Any:
+        """Like ``start_sequence`` for a list of chat *messages*."""
+        raise NotImplementedError
+
+    def decode_step(self, seqs: list[Any]) -> None:
+        """Advance every unfinished sequence in *seqs* by one token."""
+        raise NotImplementedError
+
     # ── Introspection ──────────────────────────────────────────────
     @property
     @abstractmethod
@@ -54,3 +130,27 @@ class BaseBackend(ABC):
     @abstractmethod
     def device_info(self) -> Dict[str, str]:
         """Return dict with ``type``, ``name``, ``memory`` of the device."""
+
+    def memory_footprint(self) -> int:
+        """Approximate bytes held by the loaded model (0 if unknown)."""
+        return 0
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Prefix-cache statistics (hit rate, prefill tokens saved…)."""
+        return {}
+
+    def reset_cache_stats(self) -> None:
+        """Zero the prefix-cache counters (e.g. after the load warm-up)."""
+
+
+def _collect(chunks: Iterator[StreamChunk]) -> GenerationResult:
+    parts: list[str] = []
+    result = GenerationResult(text="")
+    for chunk in chunks:
+        parts.append(chunk.text)
+        if chunk.finish_reason is not None:
+            result.finish_reason = chunk.finish_reason
+            result.prompt_tokens = chunk.prompt_tokens
+            result.completion_tokens = chunk.completion_tokens
+    result.text = "".join(parts)
+    return result
@@ -4,10 +4,14 @@ from __future__ import annotations
 
 import gc
 import logging
+import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional
 
-from src.llms.backends.base import BaseBackend
+from src.llms.backends.base import BaseBackend, GenerationResult, StreamChunk
+from src.llms.prefix_cache import DEFAULT_BUDGET_BYTES, PrefixCache, common_prefix_len
+from src.llms.stop import StopMatcher, normalize_stop
+from src.tracing import span
 
 log = logging.getLogger("llm_daemon")
 
@@ -40,6 +44,136 @@ def _find_gguf_file(path: str) -> str:
     )
 
 
+def _make_state_cache(prefix_cache: PrefixCache, llm: Any) -> Any:
+    """Wrap *prefix_cache* in llama-cpp-python's cache interface.
+
+    ``Llama`` looks the prompt up before evaluation and restores the
+    saved state (``load_state``) on a hit, then stores a fresh
+    ``save_state()`` snapshot after each completion — so only the
+    uncached suffix of the prompt is evaluated.
+
+    ``Llama`` skips a found state when its own context already shares
+    a longer prefix, so a hit is only counted once *llm* has actually
+    loaded the state, with the prefix it reuses from it.
+    """
+    from llama_cpp.llama_cache import BaseLlamaCache
+
+    class _PrefixStateCache(BaseLlamaCache):
+        def __init__(self) -> None:
+            super().__init__(capacity_bytes=prefix_cache.budget_bytes)
+            self._pending: Optional[tuple[Any, list[int]]] = None
+            self._load_state = llm.load_state
+            llm.load_state = self._loaded
+
+        @property
+        def cache_size(self) -> int:
+            return prefix_cache.stats()["bytes"]
+
+        def _loaded(self, state: Any) -> None:
+            self._load_state(state)
+            pending, self._pending = self._pending, None
+            if pending is not None and pending[0] is state:
+                prompt = pending[1]
+                # generate() always re-evaluates the last prompt token
+                reused = common_prefix_len(
+                    state.input_ids[: state.n_tokens].tolist(), prompt
+                )
+                prefix_cache.record_hit(min(reused, len(prompt) - 1))
+
+        def __getitem__(self, key: Any) -> Any:
+            prompt = list(key)
+            _reused, state = prefix_cache.lookup(prompt, count_hit=False)
+            if state is None:
+                raise KeyError("Key not found")
+            self._pending = (state, prompt)
+            return state
+
+        def __contains__(self, key: Any) -> bool:
+            return prefix_cache.contains(list(key))
+
+        def __setitem__(self, key: Any, value: Any) -> None:
+            prefix_cache.insert(list(key), value, int(value.llama_state_size))
+
+    return _PrefixStateCache()
+
+
+class _TokenWatch:
+    """llama.cpp stopping criterion that also counts sampled tokens.
+
+    ``Llama.generate`` calls it once per sampled token with the ids
+    evaluated so far (the prompt, then each earlier sample), and
+    ``create_completion`` once more afterwards with the same ids — so
+    the distinct lengths seen give the exact number of sampled tokens,
+    however llama.cpp groups their text into stream chunks.
+
+    A sample from *stop_ids* is only seen here once it was evaluated,
+    i.e. one sample late: generation then stops with it as the last
+    completion token, recorded in ``hit`` for the caller to drop.
+    """
+
+    def __init__(self, cancel: Any = None, stop_ids: Iterable[int] = ()) -> None:
+        self.cancel = cancel
+        self.stop_ids = frozenset(stop_ids)
+        self.prompt_tokens = 0
+        self.sampled = 0
+        self.rejected = False  # the last sample was refused, never emitted
+        self.hit: Optional[int] = None  # the stop id generation ended on
+        self._seen = -1
+
+    def __call__(self, input_ids: Any, _logits: Any) -> bool:
+        n = len(input_ids)
+        fresh = n > self._seen
+        if fresh:
+            if self._seen < 0:
+                self.prompt_tokens = n
+            elif self.hit is None and int(input_ids[-1]) in self.stop_ids:
+                self.hit = int(input_ids[-1])
+            self._seen = n
+            self.sampled += 1
+        stop = self.hit is not None or (
+            self.cancel is not None and self.cancel.is_set()
+        )
+        if stop and fresh:
+            self.rejected = True
+        return stop
+
+
+class _WatchedLlama:
+    """A ``Llama`` whose completions also report to a :class:`_TokenWatch`.
+
+    ``create_chat_completion`` accepts no stopping criteria, but every
+    chat handler ends in ``llama.create_completion`` — handing the
+    handler this proxy puts *watch* on that call.
+    """
+
+    def __init__(self, llm: Any, watch: _TokenWatch) -> None:
+        self._llm = llm
+        self._watch = watch
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    def create_completion(
+        self, *args: Any, stopping_criteria: Any = None, **kwargs: Any
+    ) -> Any:
+        from llama_cpp import StoppingCriteriaList
+
+        criteria = StoppingCriteriaList([self._watch, *(stopping_criteria or [])])
+        return self._llm.create_completion(*args, stopping_criteria=criteria, **kwargs)
+
+    def create_chat_completion(self, messages: list[dict], **kwargs: Any) -> Any:
+        # the handler lookup of ``Llama.create_chat_completion``
+        from llama_cpp import llama_chat_format
+
+        llm = self._llm
+        handler = (
+            llm.chat_handler
+            or llm._chat_handlers.get(llm.chat_format)
+            or llama_chat_format.get_chat_completion_handler(llm.chat_format)
+        )
+        return handler(llama=self, messages=messages, **kwargs)
+
+
 class LlamaCppBackend(BaseBackend):
     """Run GGUF models via ``llama-cpp-python``."""
 
@@ -47,6 +181,7 @@ class LlamaCppBackend(BaseBackend):
         self._llm: Any = None
         self._model_id: Optional[str] = None
         self._model_path: Optional[str] = None
+        self._prefix_cache = PrefixCache(0)
 
     # ── Lifecycle ──────────────────────────────────────────────────
     def load(self, model_path: str, **kwargs: Any) -> None:
@@ -66,6 +201,9 @@ class LlamaCppBackend(BaseBackend):
         # Determine GPU layers
         n_gpu_layers = kwargs.pop("n_gpu_layers", -1)  # -1 = offload all
         n_ctx = kwargs.pop("n_ctx", 4096)
+        self._prefix_cache = PrefixCache(
+            kwargs.pop("prefix_cache_bytes", DEFAULT_BUDGET_BYTES)
+        )
 
         self._llm = Llama(
             model_path=gguf_path,
@@ -74,6 +212,8 @@ class LlamaCppBackend(BaseBackend):
             verbose=False,
             **kwargs,
         )
+        if self._prefix_cache.enabled:
+            self._llm.set_cache(_make_state_cache(self._prefix_cache, self._llm))
 
         self._model_path = gguf_path
         # Use the parent directory name or file stem as model_id
@@ -91,6 +231,7 @@ class LlamaCppBackend(BaseBackend):
 
         self._model_id = None
         self._model_path = None
+        self._prefix_cache.clear()
 
         gc.collect()
         try:
@@ -101,45 +242,203 @@ class LlamaCppBackend(BaseBackend):
             pass
 
     # ── Generation ─────────────────────────────────────────────────
-    def generate(self, prompt: str, **kwargs: Any) -> str:
+    def _gen_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
         if self._llm is None:
             raise RuntimeError("No model loaded — load a GGUF model first.")
-
-        gen_kwargs: Dict[str, Any] = {
+        return {
             "max_tokens": int(kwargs.get("max_tokens", 512)),
             "temperature": float(kwargs.get("temperature", 0.7)),
             "top_p": float(kwargs.get("top_p", 0.9)),
             "top_k": int(kwargs.get("top_k", 50)),
             "repeat_penalty": float(kwargs.get("repetition_penalty", 1.1)),
+            "stop": normalize_stop(kwargs.get("stop")),
         }
 
-        result = self._llm.create_completion(prompt, **gen_kwargs)
-        return result["choices"][0]["text"]
+    @staticmethod
+    def _watch(kwargs: Dict[str, Any]) -> _TokenWatch:
+        stop_ids = (int(t) for t in kwargs.get("stop_token_ids") or ())
+        return _TokenWatch(kwargs.get("cancel"), stop_ids)
+
+    def _strip_hit(self, text: str, watch: _TokenWatch) -> str:
+        """Drop the text of the stop id *watch* ended on from *text*."""
+        if watch.hit is None:
+            return text
+        # special tokens mostly render as "" — then there is nothing to drop
+        piece = self._llm.detokenize([watch.hit]).decode("utf-8", errors="ignore")
+        return text[: -len(piece)] if piece and text.endswith(piece) else text
+
+    @staticmethod
+    def _chat_messages(messages: list[dict]) -> list[dict]:
+        return [
+            {"role": m.get("role", "user"), "content": m.get("content", "")}
+            for m in messages
+        ]
+
+    def _result(self, result: dict, text: str, watch: _TokenWatch) -> GenerationResult:
+        # llama.cpp counts the tokens it evaluated — use them as-is,
+        # less a stop id (dropped like an end-of-turn token)
+        usage = result.get("usage") or {}
+        completion_tokens = int(usage.get("completion_tokens", 0))
+        if watch.hit is not None:
+            completion_tokens -= 1
+        finish = result["choices"][0].get("finish_reason") or "stop"
+        cancel = watch.cancel
+        if finish == "stop" and cancel is not None and cancel.is_set():
+            finish = "cancelled"
+        return GenerationResult(
+            text=self._strip_hit(text, watch),
+            finish_reason=finish,
+            prompt_tokens=int(usage.get("prompt_tokens", 0)),
+            completion_tokens=max(0, completion_tokens),
+        )
+
+    def complete(self, prompt: str, **kwargs: Any) -> GenerationResult:
+        watch = self._watch(kwargs)
+        gen_kwargs = self._gen_kwargs(kwargs)
+        # llama.cpp tokenizes, prefills and decodes in this one call
+        with span(kwargs.get("trace"), "generate"):
+            result = _WatchedLlama(self._llm, watch).create_completion(
+                prompt, **gen_kwargs
+            )
+        return self._result(result, result["choices"][0]["text"], watch)
+
+    def chat_complete(self, messages: list[dict], **kwargs: Any) -> GenerationResult:
+        watch = self._watch(kwargs)
+        gen_kwargs = self._gen_kwargs(kwargs)
+        with span(kwargs.get("trace"), "generate"):
+            result = _WatchedLlama(self._llm, watch).create_chat_completion(
+                messages=self._chat_messages(messages), **gen_kwargs
+            )
+        return self._result(
+            result, result["choices"][0]["message"]["content"] or "", watch
+        )
+
+    def generate(self, prompt: str, **kwargs: Any) -> str:
+        return self.complete(prompt, **kwargs).text
 
     def chat_generate(self, messages: list[dict], **kwargs: Any) -> str:
-        if self._llm is None:
-            raise RuntimeError("No model loaded — load a GGUF model first.")
+        return self.chat_complete(messages, **kwargs).text
+
+    def _stream(
+        self,
+        chunks: Iterator[dict],
+        chat: bool,
+        watch: _TokenWatch,
+        stops: list[str],
+        cancel: Any = None,
+        trace: Any = None,
+    ) -> Iterator[StreamChunk]:
+        """Translate llama.cpp stream chunks into ``StreamChunk`` deltas.
+
+        Token counts come from *watch*, not from the chunks: one chunk
+        may carry several tokens (held-back multibyte text) or none.
+        *stops* are matched here rather than by llama.cpp, so a
+        ``"stop"`` finish from llama.cpp always means an end-of-turn
+        token, which — as in one-shot usage — is not counted.  With
+        stop ids the latest text is held back one chunk, so the text of
+        a stop id (seen one sample late) is never emitted.  Setting
+        *cancel* (or closing this generator) aborts llama.cpp's token
+        loop.  Time to the first text delta is traced as ``prefill``,
+        the rest as ``decode``.
+        """
+        matcher = StopMatcher(stops) if stops else None
+        started = time.perf_counter()
+        first: Optional[float] = None
+        finish: Optional[str] = None  # as reported by llama.cpp
+        stopped = False  # by one of *stops*
+        held = "" if watch.stop_ids else None
+        tail = ""
+        try:
+            for chunk in chunks:
+                if cancel is not None and cancel.is_set():
+                    break
+                if not chunk.get("choices"):
+                    continue
+                choice = chunk["choices"][0]
+                if chat:
+                    text = choice.get("delta", {}).get("content") or ""
+                else:
+                    text = choice.get("text") or ""
+                if matcher is not None:
+                    text, stopped = matcher.feed(text)
+                if held is not None and text:
+                    text, held = held, text
+                if text:
+                    if first is None:
+                        first = time.perf_counter()
+                    yield StreamChunk(text=text)
+                if stopped:
+                    break
+                finish = choice.get("finish_reason") or finish
+            else:
+                tail = matcher.flush() if matcher is not None else ""
+            tail = self._strip_hit((held or "") + tail, watch)
+            if tail:
+                yield StreamChunk(text=tail)
+        finally:
+            chunks.close()
+            if trace is not None:
+                done = time.perf_counter()
+                trace.add("prefill", started, first or done)
+                if first is not None:
+                    trace.add("decode", first, done)
+
+        completion_tokens = watch.sampled
+        if watch.rejected or finish == "stop":
+            completion_tokens -= 1  # refused sample / end-of-turn token
+        if watch.hit is not None:
+            completion_tokens -= 1
+        if stopped:
+            finish = "stop"
+        elif cancel is not None and cancel.is_set():
+            finish = "cancelled"
+        yield StreamChunk(
+            finish_reason=finish or "stop",
+            prompt_tokens=watch.prompt_tokens,
+            completion_tokens=max(0, completion_tokens),
+        )
 
-        gen_kwargs: Dict[str, Any] = {
-            "max_tokens": int(kwargs.get("max_tokens", 512)),
-            "temperature": float(kwargs.get("temperature", 0.7)),
-            "top_p": float(kwargs.get("top_p", 0.9)),
-            "top_k": int(kwargs.get("top_k", 50)),
-            "repeat_penalty": float(kwargs.get("repetition_penalty", 1.1)),
+    def _stream_kwargs(
+        self, kwargs: Dict[str, Any]
+    ) -> tuple[_WatchedLlama, Dict[str, Any], Dict[str, Any]]:
+        """``(llm, gen_kwargs, _stream kwargs)`` for one streamed request."""
+        watch = self._watch(kwargs)
+        gen_kwargs = self._gen_kwargs(kwargs)
+        stops = gen_kwargs.pop("stop")
+        return _WatchedLlama(self._llm, watch), gen_kwargs, {
+            "watch": watch, "stops": stops, "cancel": watch.cancel,
+            "trace": kwargs.get("trace"),
         }
 
-        # Format messages for llama.cpp
-        chat_messages = [
-            {"role": m.get("role", "user"), "content": m.get("content", "")}
-            for m in messages
-        ]
-
-        result = self._llm.create_chat_completion(
-            messages=chat_messages, **gen_kwargs
+    def generate_stream(self, prompt: str, **kwargs: Any) -> Iterator[StreamChunk]:
+        llm, gen_kwargs, opts = self._stream_kwargs(kwargs)
+        chunks = llm.create_completion(prompt, stream=True, **gen_kwargs)
+        yield from self._stream(chunks, chat=False, **opts)
+
+    def chat_generate_stream(
+        self, messages: list[dict], **kwargs: Any
+    ) -> Iterator[StreamChunk]:
+        llm, gen_kwargs, opts = self._stream_kwargs(kwargs)
+        chunks = llm.create_chat_completion(
+            messages=self._chat_messages(messages), stream=True, **gen_kwargs
         )
-        return result["choices"][0]["message"]["content"]
+        yield from self._stream(chunks, chat=True, **opts)
 
     # ── Introspection ──────────────────────────────────────────────
+    def memory_footprint(self) -> int:
+        if self._model_path is None:
+            return 0
+        try:
+            return Path(self._model_path).stat().st_size
+        except OSError:
+            return 0
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._prefix_cache.stats()
+
+    def reset_cache_stats(self) -> None:
+        self._prefix_cache.reset_stats()
+
     @property
     def is_loaded(self) -> bool:
         return self._llm is not None
@@ -3,11 +3,20 @@
 from __future__ import annotations
 
 import gc
-from typing import Any, Dict, Optional
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
 
 import torch
 
-from src.llms.backends.base import BaseBackend
+from src.llms.backends.base import BaseBackend, GenerationResult, StreamChunk
+from src.llms.prefix_cache import DEFAULT_BUDGET_BYTES, PrefixCache
+from src.llms.stop import normalize_stop, stop_matcher
+from src.tracing import span
+
+# Stand-in assistant reply used to find what the chat template puts
+# after a finished turn (see ``_template_end_ids``)
+_REPLY_PROBE = "\u2063reply\u2063"
 
 
 class TransformersBackend(BaseBackend):
@@ -17,13 +26,20 @@ class TransformersBackend(BaseBackend):
         self._model: Any = None
         self._tokenizer: Any = None
         self._model_id: Optional[str] = None
+        # Resolved once per loaded model
+        self._chat_template: Optional[str] = None
+        self._stop_ids: frozenset[int] = frozenset()
         self._device: str = "cuda" if torch.cuda.is_available() else "cpu"
+        self._prefix_cache = PrefixCache(0)
 
     # ── Lifecycle ──────────────────────────────────────────────────
     def load(self, model_path: str, **kwargs: Any) -> None:
         from transformers import AutoModelForCausalLM, AutoTokenizer
 
         self.unload()
+        self._prefix_cache = PrefixCache(
+            kwargs.pop("prefix_cache_bytes", DEFAULT_BUDGET_BYTES)
+        )
 
         self._tokenizer = AutoTokenizer.from_pretrained(
             model_path, trust_remote_code=True
@@ -40,6 +56,8 @@ class TransformersBackend(BaseBackend):
         if self._tokenizer.pad_token is None:
             self._tokenizer.pad_token = self._tokenizer.eos_token
 
+        self._chat_template = getattr(self._tokenizer, "chat_template", None) or None
+        self._stop_ids = self._resolve_stop_ids()
         self._model_id = model_path
 
     def unload(self) -> None:
@@ -71,6 +89,9 @@ class TransformersBackend(BaseBackend):
             self._tokenizer = None
 
         self._model_id = None
+        self._chat_template = None
+        self._stop_ids = frozenset()
+        self._prefix_cache.clear()
 
         gc.collect()
         if torch.cuda.is_available():
@@ -81,13 +102,10 @@ class TransformersBackend(BaseBackend):
             torch.cuda.empty_cache()
 
     # ── Generation ─────────────────────────────────────────────────
-    def generate(self, prompt: str, **kwargs: Any) -> str:
-        if self._model is None or self._tokenizer is None:
-            raise RuntimeError("No model loaded — load a model first.")
-
-        inputs = self._tokenizer(prompt, return_tensors="pt")
-        inputs = {k: v.to(self._model.device) for k, v in inputs.items()}
-
+    def _gen_kwargs(
+        self, kwargs: Dict[str, Any], *stop_events: Optional[threading.Event]
+    ) -> Dict[str, Any]:
+        events = [e for e in (kwargs.get("cancel"), *stop_events) if e is not None]
         gen_kwargs: Dict[str, Any] = {
             "max_new_tokens": int(kwargs.get("max_tokens", 512)),
             "temperature": float(kwargs.get("temperature", 0.7)),
@@ -97,14 +115,97 @@ class TransformersBackend(BaseBackend):
             "do_sample": bool(kwargs.get("do_sample", True)),
             "pad_token_id": self._tokenizer.pad_token_id,
         }
+        eos_ids = self._stop_ids | set(kwargs.get("stop_token_ids") or ())
+        if eos_ids:
+            gen_kwargs["eos_token_id"] = sorted(eos_ids)
+        stops = normalize_stop(kwargs.get("stop"))
+        if events or stops:
+            gen_kwargs["stopping_criteria"] = _stopping_criteria(
+                events, self._tokenizer, stops
+            )
+        return gen_kwargs
 
-        with torch.no_grad():
-            outputs = self._model.generate(**inputs, **gen_kwargs)
+    def _encode(self, prompt: str, trace: Any = None) -> Dict[str, Any]:
+        if self._model is None or self._tokenizer is None:
+            raise RuntimeError("No model loaded — load a model first.")
+        with span(trace, "tokenize"):
+            inputs = self._tokenizer(prompt, return_tensors="pt")
+            return {k: v.to(self._model.device) for k, v in inputs.items()}
 
-        new_tokens = outputs[0][inputs["input_ids"].shape[1] :]
-        return self._tokenizer.decode(new_tokens, skip_special_tokens=True)
+    # ── Chat template ──────────────────────────────────────────────
+    def _chat_inputs(
+        self, messages: list[dict], kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Model inputs for chat *messages*, formatted by the model's template.
 
-    def chat_generate(self, messages: list[dict], **kwargs: Any) -> str:
+        ``apply_chat_template`` renders and tokenizes in one call and
+        transformers caches the compiled Jinja template, so nothing is
+        re-parsed per request.  Models without a template fall back to
+        the plain ``System:/User:/Assistant:`` format.
+        """
+        if self._model is None or self._tokenizer is None:
+            raise RuntimeError("No model loaded — load a model first.")
+        trace = kwargs.get("trace")
+        if self._chat_template is None:
+            with span(trace, "template"):
+                prompt = self._format_chat(messages)
+            return self._encode(prompt, trace)
+        with span(trace, "template"):
+            inputs = self._tokenizer.apply_chat_template(
+                _chat_messages(messages),
+                add_generation_prompt=True,
+                tokenize=True,
+                return_dict=True,
+                return_tensors="pt",
+            )
+            return {
+                k: inputs[k].to(self._model.device)
+                for k in ("input_ids", "attention_mask")
+            }
+
+    def _resolve_stop_ids(self) -> frozenset[int]:
+        """Token ids that end a reply: EOS plus the template's end-of-turn."""
+        ids: set[int] = set()
+        eos = getattr(self._model.generation_config, "eos_token_id", None)
+        if isinstance(eos, int):
+            ids.add(eos)
+        elif eos:
+            ids.update(eos)
+        if self._tokenizer.eos_token_id is not None:
+            ids.add(self._tokenizer.eos_token_id)
+        if self._chat_template is not None:
+            ids.update(self._template_end_ids())
+        return frozenset(ids)
+
+    def _template_end_ids(self) -> set[int]:
+        """The special token the template closes an assistant turn with.
+
+        Instruct models emit it (``<|im_end|>``, ``<|eot_id|>``,
+        ``<end_of_turn>``…) instead of — or before — the tokenizer's
+        EOS, so generation must stop on it too.
+        """
+        tok = self._tokenizer
+        try:
+            text = tok.apply_chat_template(
+                [
+                    {"role": "user", "content": "hi"},
+                    {"role": "assistant", "content": _REPLY_PROBE},
+                ],
+                tokenize=False,
+            )
+        except Exception:
+            return set()  # template rejects the probe conversation
+        _head, found, tail = text.partition(_REPLY_PROBE)
+        if not found:
+            return set()
+        special = set(tok.all_special_ids) | set(getattr(tok, "added_tokens_decoder", {}))
+        for token in tok(tail, add_special_tokens=False)["input_ids"][:2]:
+            if token in special:
+                return {token}
+        return set()
+
+    @staticmethod
+    def _format_chat(messages: list[dict]) -> str:
         prompt_parts: list[str] = []
         for msg in messages:
             role = msg.get("role", "user")
@@ -116,9 +217,318 @@ class TransformersBackend(BaseBackend):
             elif role == "assistant":
                 prompt_parts.append(f"Assistant: {content}\n")
         prompt_parts.append("Assistant:")
-        return self.generate("".join(prompt_parts), **kwargs)
+        return "".join(prompt_parts)
+
+    # ── Prefix cache ───────────────────────────────────────────────
+    def _cached_prefix(self, ids: list[int]) -> tuple[int, Any]:
+        """Return ``(reused_len, DynamicCache | None)`` for prompt *ids*."""
+        reused, layers = self._prefix_cache.lookup(ids, limit=len(ids) - 1)
+        if not reused:
+            return 0, None
+        return reused, _layers_to_cache(
+            [(k[:, :, :reused], v[:, :, :reused]) for k, v in layers]
+        )
+
+    def _remember_prefix(
+        self, ids: list[int], layers: list[tuple[torch.Tensor, torch.Tensor]]
+    ) -> None:
+        size = sum(k.numel() * k.element_size() * 2 for k, _v in layers)
+        self._prefix_cache.insert(ids, layers, size)
+
+    def _hf_generate(
+        self, inputs: Dict[str, Any], gen_kwargs: Dict[str, Any], streamer: Any = None
+    ) -> torch.Tensor:
+        """Run ``model.generate`` seeded from / refreshing the prefix cache."""
+        ids = inputs["input_ids"][0].tolist()
+        reused, past = self._cached_prefix(ids)
+        if past is not None:
+            gen_kwargs = {**gen_kwargs, "past_key_values": past}
+
+        with torch.no_grad():
+            out = self._model.generate(
+                **inputs, **gen_kwargs,
+                streamer=streamer, return_dict_in_generate=True,
+            )
+
+        if self._prefix_cache.enabled and out.past_key_values is not None:
+            n = len(ids)
+            self._remember_prefix(ids, [
+                (k[:, :, :n].clone(), v[:, :, :n].clone())
+                for k, v in _cache_to_layers(out.past_key_values)
+            ])
+        return out.sequences
+
+    def complete(self, prompt: str, **kwargs: Any) -> GenerationResult:
+        return self._complete(self._encode(prompt, kwargs.get("trace")), kwargs)
+
+    def chat_complete(self, messages: list[dict], **kwargs: Any) -> GenerationResult:
+        return self._complete(self._chat_inputs(messages, kwargs), kwargs)
+
+    def _complete(self, inputs: Dict[str, Any], kwargs: Dict[str, Any]) -> GenerationResult:
+        gen_kwargs = self._gen_kwargs(kwargs)
+
+        # Prefill and decode run inside one ``model.generate`` call
+        with span(kwargs.get("trace"), "generate"):
+            outputs = self._hf_generate(inputs, gen_kwargs)
+
+        # Usage straight from the tensor lengths — no re-tokenization
+        prompt_len = inputs["input_ids"].shape[1]
+        new_tokens = outputs[0][prompt_len:]
+        shown = self._strip_stop(new_tokens, kwargs)
+        text = self._tokenizer.decode(shown, skip_special_tokens=True)
+        stopped = len(shown) < len(new_tokens)
+        matcher = stop_matcher(kwargs.get("stop"))
+        if matcher is not None:
+            text, hit = matcher.feed(text)
+            text += "" if hit else matcher.flush()
+            stopped = stopped or hit
+        return GenerationResult(
+            text=text,
+            finish_reason=(
+                "stop" if stopped
+                else self._finish_reason(len(new_tokens), gen_kwargs, kwargs)
+            ),
+            prompt_tokens=prompt_len,
+            completion_tokens=len(shown),
+        )
+
+    def generate(self, prompt: str, **kwargs: Any) -> str:
+        return self.complete(prompt, **kwargs).text
+
+    def chat_generate(self, messages: list[dict], **kwargs: Any) -> str:
+        return self.chat_complete(messages, **kwargs).text
+
+    def _strip_stop(self, new_tokens: Any, kwargs: Dict[str, Any]) -> Any:
+        """Drop a trailing EOS / stop token from the generated ids.
+
+        The token that ended generation is neither returned nor counted
+        in ``completion_tokens`` — the same rule ``_advance`` applies
+        to batched sequences, so usage does not depend on the path.
+        """
+        stop_ids = self._stop_ids | frozenset(kwargs.get("stop_token_ids") or ())
+        if len(new_tokens) and int(new_tokens[-1]) in stop_ids:
+            return new_tokens[:-1]
+        return new_tokens
+
+    @staticmethod
+    def _finish_reason(
+        completion_len: int, gen_kwargs: Dict[str, Any], kwargs: Dict[str, Any]
+    ) -> str:
+        if completion_len >= gen_kwargs["max_new_tokens"]:
+            return "length"
+        cancel = kwargs.get("cancel")
+        return "cancelled" if cancel is not None and cancel.is_set() else "stop"
+
+    def generate_stream(self, prompt: str, **kwargs: Any) -> Iterator[StreamChunk]:
+        return self._stream(self._encode(prompt, kwargs.get("trace")), kwargs)
+
+    def chat_generate_stream(
+        self, messages: list[dict], **kwargs: Any
+    ) -> Iterator[StreamChunk]:
+        return self._stream(self._chat_inputs(messages, kwargs), kwargs)
+
+    def _stream(
+        self, inputs: Dict[str, Any], kwargs: Dict[str, Any]
+    ) -> Iterator[StreamChunk]:
+        from transformers import TextIteratorStreamer
+
+        trace = kwargs.get("trace")
+        # Also stop when the consumer abandons this generator
+        abandoned = threading.Event()
+        gen_kwargs = self._gen_kwargs(kwargs, abandoned)
+        prompt_len = inputs["input_ids"].shape[1]
+
+        streamer = TextIteratorStreamer(
+            self._tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        result: Dict[str, Any] = {}
+
+        def _run() -> None:
+            try:
+                result["outputs"] = self._hf_generate(inputs, gen_kwargs, streamer)
+            except Exception as exc:
+                result["error"] = exc
+                streamer.end()
+
+        thread = threading.Thread(target=_run, daemon=True)
+        matcher = stop_matcher(kwargs.get("stop"))
+        stopped = False
+        started = time.perf_counter()
+        first: Optional[float] = None
+        thread.start()
+        try:
+            for text in streamer:
+                if matcher is not None:
+                    text, stopped = matcher.feed(text)
+                if text:
+                    if first is None:
+                        first = time.perf_counter()
+                    yield StreamChunk(text=text)
+                if stopped:
+                    break  # ``finally`` stops the generate thread
+            else:
+                tail = matcher.flush() if matcher is not None else ""
+                if tail:
+                    yield StreamChunk(text=tail)
+        finally:
+            if thread.is_alive():
+                abandoned.set()
+            thread.join()
+            if trace is not None:
+                # Prefill ends with the first streamed text
+                done = time.perf_counter()
+                trace.add("prefill", started, first or done)
+                if first is not None:
+                    trace.add("decode", first, done)
+
+        if "error" in result:
+            raise result["error"]
+        new_tokens = result["outputs"][0][prompt_len:]
+        completion_len = len(self._strip_stop(new_tokens, kwargs))
+        stopped = stopped or completion_len < len(new_tokens)
+        yield StreamChunk(
+            finish_reason=(
+                "stop" if stopped
+                else self._finish_reason(len(new_tokens), gen_kwargs, kwargs)
+            ),
+            prompt_tokens=prompt_len,
+            completion_tokens=completion_len,
+        )
+
+    # ── Continuous batching ────────────────────────────────────────
+    supports_batching = True
+
+    def start_sequence(self, prompt: str, **kwargs: Any) -> "_BatchSequence":
+        """Prefill *prompt* and return a sequence ready for ``decode_step``.
+
+        The first token is sampled from the prefill logits, so a
+        sequence may already be finished when this returns.
+        """
+        return self._start(self._encode(prompt, kwargs.get("trace")), kwargs)
+
+    def chat_start_sequence(
+        self, messages: list[dict], **kwargs: Any
+    ) -> "_BatchSequence":
+        return self._start(self._chat_inputs(messages, kwargs), kwargs)
+
+    def _start(
+        self, inputs: Dict[str, Any], kwargs: Dict[str, Any]
+    ) -> "_BatchSequence":
+        trace = kwargs.get("trace")
+        seq = _BatchSequence(inputs["input_ids"][0].tolist(), kwargs)
+
+        # Only the suffix past the longest cached prefix needs prefill
+        reused, past = self._cached_prefix(seq.ids)
+        with span(trace, "prefill", cached_tokens=reused), torch.no_grad():
+            if past is None:
+                out = self._model(**inputs, use_cache=True)
+            else:
+                input_ids = inputs["input_ids"]
+                out = self._model(
+                    input_ids=input_ids[:, reused:],
+                    attention_mask=inputs["attention_mask"],
+                    position_ids=torch.arange(
+                        reused, input_ids.shape[1], device=input_ids.device
+                    ).unsqueeze(0),
+                    past_key_values=past,
+                    use_cache=True,
+                )
+            seq.cache = _cache_to_layers(out.past_key_values)
+            self._remember_prefix(seq.ids, seq.cache)
+            self._advance(seq, out.logits[:, -1, :])
+        return seq
+
+    def decode_step(self, seqs: list["_BatchSequence"]) -> None:
+        """Run one batched decode step over every unfinished sequence.
+
+        KV caches of different lengths are left-padded to a common
+        length and masked out, so sequences can join and leave the
+        batch at any token boundary.
+        """
+        live = [s for s in seqs if s.finish_reason is None]
+        if not live:
+            return
+
+        lengths = [s.cache_len for s in live]
+        max_len = max(lengths)
+        device = self._model.device
+
+        layers: list[tuple[torch.Tensor, torch.Tensor]] = []
+        for layer_idx in range(len(live[0].cache)):
+            keys, values = [], []
+            for s, n in zip(live, lengths):
+                k, v = s.cache[layer_idx]
+                if n < max_len:
+                    pad = (0, 0, max_len - n, 0)
+                    k = torch.nn.functional.pad(k, pad)
+                    v = torch.nn.functional.pad(v, pad)
+                keys.append(k)
+                values.append(v)
+            layers.append((torch.cat(keys), torch.cat(values)))
+
+        mask = torch.zeros(len(live), max_len + 1, dtype=torch.long, device=device)
+        for row, n in enumerate(lengths):
+            mask[row, max_len - n :] = 1
+        input_ids = torch.tensor(
+            [[s.ids[-1]] for s in live], dtype=torch.long, device=device
+        )
+        position_ids = torch.tensor([[n] for n in lengths], device=device)
+
+        with torch.no_grad():
+            out = self._model(
+                input_ids=input_ids,
+                attention_mask=mask,
+                position_ids=position_ids,
+                past_key_values=_layers_to_cache(layers),
+                use_cache=True,
+            )
+
+        new_layers = _cache_to_layers(out.past_key_values)
+        for row, (s, n) in enumerate(zip(live, lengths)):
+            start = max_len - n
+            s.cache = [
+                (k[row : row + 1, :, start:], v[row : row + 1, :, start:])
+                for k, v in new_layers
+            ]
+            self._advance(s, out.logits[row : row + 1, -1, :])
+
+    def _advance(self, seq: "_BatchSequence", logits: torch.Tensor) -> None:
+        """Sample the next token for *seq* and update its text / status."""
+        token = seq.sample(logits)
+        if token in self._stop_ids or token in seq.stop_token_ids:
+            # Not kept in ``ids``, so not counted (cf. ``_strip_stop``)
+            seq.finish_reason = "stop"
+        else:
+            seq.ids.append(token)
+            if seq.completion_tokens >= seq.max_new_tokens:
+                seq.finish_reason = "length"
+        final = seq.finish_reason is not None
+        delta = seq.detokenize(self._tokenizer, final=final)
+        if seq.stop is not None:
+            delta, hit = seq.stop.feed(delta)
+            if hit:
+                seq.finish_reason = "stop"
+            elif final:
+                delta += seq.stop.flush()
+        seq.text_delta += delta
+        if seq.finish_reason is not None:
+            seq.cache = []
 
     # ── Introspection ──────────────────────────────────────────────
+    def memory_footprint(self) -> int:
+        if self._model is None:
+            return 0
+        try:
+            return int(self._model.get_memory_footprint())
+        except Exception:
+            return 0
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._prefix_cache.stats()
+
+    def reset_cache_stats(self) -> None:
+        self._prefix_cache.reset_stats()
+
     @property
     def is_loaded(self) -> bool:
         return self._model is not None
@@ -140,3 +550,147 @@ class TransformersBackend(BaseBackend):
                 "memory": f"{props.total_memory / 1024**3:.1f} GB",
             }
         return {"type": "CPU", "name": "—", "memory": "—"}
+
+
+# ── Continuous-batching helpers ────────────────────────────────────────
+
+def _cache_to_layers(cache: Any) -> list[tuple[torch.Tensor, torch.Tensor]]:
+    """Return per-layer ``(key, value)`` tensors from any HF cache object."""
+    if hasattr(cache, "layers"):  # transformers >= 4.56
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [(k, v) for k, v, *_ in cache]  # legacy tuple-of-tuples
+
+
+def _chat_messages(messages: list[dict]) -> list[dict]:
+    return [
+        {"role": m.get("role", "user"), "content": m.get("content", "")}
+        for m in messages
+    ]
+
+
+def _stopping_criteria(
+    events: list[threading.Event], tokenizer: Any, stops: list[str]
+) -> Any:
+    """``StoppingCriteriaList`` ending ``model.generate`` early.
+
+    Generation stops once any of *events* is set or the generated text
+    contains one of the *stops* strings.  Only a short window of the
+    newest tokens is decoded per step: a stop string of ``n`` characters
+    can span at most ``n`` tokens.
+    """
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    def _flags(input_ids: torch.Tensor, done: bool) -> torch.Tensor:
+        return torch.full(
+            (input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device
+        )
+
+    class _EventSet(StoppingCriteria):
+        def __call__(self, input_ids: torch.Tensor, scores: Any, **kwargs: Any) -> torch.Tensor:
+            return _flags(input_ids, any(e.is_set() for e in events))
+
+    class _StopStrings(StoppingCriteria):
+        def __init__(self) -> None:
+            self.window = max(len(s) for s in stops) + 1
+            self.start: Optional[int] = None  # first generated position
+
+        def __call__(self, input_ids: torch.Tensor, scores: Any, **kwargs: Any) -> torch.Tensor:
+            if self.start is None:
+                # First call comes right after the first sampled token
+                self.start = input_ids.shape[1] - 1
+            tail = input_ids[0, max(self.start, input_ids.shape[1] - self.window):]
+            text = tokenizer.decode(tail, skip_special_tokens=True)
+            return _flags(input_ids, any(s in text for s in stops))
+
+    criteria: list[Any] = []
+    if events:
+        criteria.append(_EventSet())
+    if stops:
+        criteria.append(_StopStrings())
+    return StoppingCriteriaList(criteria)
+
+
+def _layers_to_cache(layers: list[tuple[torch.Tensor, torch.Tensor]]) -> Any:
+    from transformers import DynamicCache
+
+    cache = DynamicCache()
+    for idx, (k, v) in enumerate(layers):
+        cache.update(k, v, idx)
+    return cache
+
+
+class _BatchSequence:
+    """Decode state of one request inside a continuous batch."""
+
+    def __init__(self, prompt_ids: list[int], kwargs: Dict[str, Any]) -> None:
+        self.ids: list[int] = list(prompt_ids)
+        self.prompt_tokens = len(prompt_ids)
+        self.cache: list[tuple[torch.Tensor, torch.Tensor]] = []
+        self.finish_reason: Optional[str] = None
+        self.text_delta = ""
+
+        self.max_new_tokens = int(kwargs.get("max_tokens", 512))
+        self.temperature = float(kwargs.get("temperature", 0.7))
+        self.top_p = float(kwargs.get("top_p", 0.9))
+        self.top_k = int(kwargs.get("top_k", 50))
+        self.repetition_penalty = float(kwargs.get("repetition_penalty", 1.1))
+        self.do_sample = bool(kwargs.get("do_sample", True))
+        # Request-level stops on top of the backend's EOS / end-of-turn ids
+        self.stop = stop_matcher(kwargs.get("stop"))
+        self.stop_token_ids = frozenset(kwargs.get("stop_token_ids") or ())
+
+        # Incremental detokenisation offsets (into the generated ids)
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    @property
+    def completion_tokens(self) -> int:
+        return len(self.ids) - self.prompt_tokens
+
+    @property
+    def cache_len(self) -> int:
+        # The last sampled token has not been fed through the model yet
+        return len(self.ids) - 1
+
+    def sample(self, logits: torch.Tensor) -> int:
+        from transformers.generation.logits_process import (
+            RepetitionPenaltyLogitsProcessor,
+            TemperatureLogitsWarper,
+            TopKLogitsWarper,
+            TopPLogitsWarper,
+        )
+
+        scores = logits.float()
+        ids = torch.tensor([self.ids], device=scores.device)
+        if self.repetition_penalty != 1.0:
+            scores = RepetitionPenaltyLogitsProcessor(self.repetition_penalty)(ids, scores)
+        if not self.do_sample:
+            return int(scores.argmax(dim=-1).item())
+        if self.temperature > 0 and self.temperature != 1.0:
+            scores = TemperatureLogitsWarper(self.temperature)(ids, scores)
+        if self.top_k > 0:
+            scores = TopKLogitsWarper(self.top_k)(ids, scores)
+        if self.top_p < 1.0:
+            scores = TopPLogitsWarper(self.top_p)(ids, scores)
+        probs = torch.softmax(scores, dim=-1)
+        return int(torch.multinomial(probs, num_samples=1).item())
+
+    def detokenize(self, tokenizer: Any, final: bool = False) -> str:
+        """Return newly completed text since the previous call.
+
+        Decodes a short window of generated ids so multi-byte
+        characters split across tokens are only emitted once whole
+        (or flushed as-is when *final*).
+        """
+        gen = self.ids[self.prompt_tokens :]
+        prefix = tokenizer.decode(
+            gen[self._prefix_offset : self._read_offset], skip_special_tokens=True
+        )
+        text = tokenizer.decode(gen[self._prefix_offset :], skip_special_tokens=True)
+        if len(text) > len(prefix) and (final or not text.endswith("\ufffd")):
+            self._prefix_offset = self._read_offset
+            self._read_offset = len(gen)
+            return text[len(prefix) :]
+        return ""
@@ -11,10 +11,16 @@ repo contents and delegates all calls.
 from __future__ import annotations
 
 import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterator, Optional
 
-from src.llms.backends.base import BaseBackend
+from src import metrics
+from src.tracing import Trace
+from src.llms.backends.base import BaseBackend, StreamChunk
 from src.llms.backends.llms_transformers import TransformersBackend
 from src.llms.backends.llms_llama_cpp import LlamaCppBackend
 
@@ -73,18 +79,66 @@ def detect_backend(model_path: str) -> str:
     return "transformers"
 
 
+def _estimate_model_bytes(local_path: str, backend_name: str) -> int:
+    """Rough resident size of a model, from its weight files on disk."""
+    p = Path(local_path)
+    try:
+        if backend_name == "llama.cpp":
+            from src.llms.backends.llms_llama_cpp import _find_gguf_file
+
+            return Path(_find_gguf_file(local_path)).stat().st_size
+        if p.is_dir():
+            return sum(
+                f.stat().st_size
+                for pattern in ("*.safetensors", "*.bin", "*.pt")
+                for f in p.rglob(pattern)
+            )
+    except Exception:
+        pass
+    return 0
+
+
 class InferenceEngine:
-    """Auto-routing inference engine.
+    """Auto-routing inference engine with a pool of resident models.
 
     On ``load_model`` it detects whether the model is GGUF or
     safetensors/pytorch format and instantiates the correct backend.
-    All downstream callers (daemon, FastAPI server) work through
-    the same interface unchanged.
+    Up to ``max_models`` backends stay loaded at once (optionally
+    bounded by ``memory_budget_gb``); the least-recently-used one is
+    evicted to make room.  Callers lease a backend for the duration
+    of a request so swaps and evictions never pull a model out from
+    under in-flight work.  Generation calls are routed by model id —
+    an empty or unknown id falls back to the *active* (most recently
+    loaded) model, so single-model callers work unchanged.
     """
 
-    def __init__(self) -> None:
-        self._backend: Optional[BaseBackend] = None
-        self._active_backend_name: Optional[str] = None
+    def __init__(
+        self,
+        prefix_cache_mb: int = 512,
+        max_models: int = 1,
+        memory_budget_gb: float = 0.0,
+    ) -> None:
+        # model_id → backend, least-recently-used first
+        self._pool: "OrderedDict[str, BaseBackend]" = OrderedDict()
+        self._backend_names: Dict[str, str] = {}
+        self._active_id: Optional[str] = None
+        self._lock = threading.RLock()
+
+        # In-flight leases per backend; a replaced / evicted backend is
+        # only unloaded once its count drains to zero.
+        self._inflight: Dict[BaseBackend, int] = {}
+        self._drained = threading.Condition(self._lock)
+
+        self.prefix_cache_mb = prefix_cache_mb
+        self.max_models = max(1, max_models)
+        self.memory_budget_gb = memory_budget_gb
+
+        #: Backend name → constructor; extra entries (e.g. the bench's
+        #: ``FakeBackend``) are selected with ``force_backend``
+        self.backend_factories: Dict[str, Callable[[], BaseBackend]] = {
+            "transformers": TransformersBackend,
+            "llama.cpp": LlamaCppBackend,
+        }
 
     # Backend name constants
     BACKENDS = ("auto", "transformers", "llama.cpp")
@@ -99,6 +153,13 @@ class InferenceEngine:
     ) -> None:
         """Load *model_id* with automatic or forced backend selection.
 
+        If the model is already resident (with the requested backend)
+        it just becomes the active model.  Otherwise the new backend is
+        loaded and warmed up *while the current one keeps serving*
+        (blue/green); the active pointer then switches atomically and
+        any replaced or evicted backend is unloaded once its in-flight
+        requests have drained.
+
         Parameters
         ----------
         model_id:
@@ -107,11 +168,12 @@ class InferenceEngine:
             ``None`` / ``'auto'`` → auto-detect from model files.
             ``'transformers'``   → force the Transformers backend.
             ``'llama.cpp'``      → force the llama.cpp (GGUF) backend.
+            Any other key of ``backend_factories`` selects that backend.
         **kwargs:
             Forwarded to the backend's ``load()``
             (e.g. ``n_gpu_layers``, ``n_ctx`` for llama.cpp).
         """
-        self.unload_model()
+        kwargs.setdefault("prefix_cache_bytes", self.prefix_cache_mb * 1024**2)
 
         # Resolve HF repo-id → local snapshot path so both
         # detect_backend and the backend itself can inspect files.
@@ -123,69 +185,307 @@ class InferenceEngine:
         else:
             backend_name = detect_backend(local_path)
             log.info("Detected backend '%s' for %s", backend_name, model_id)
-
-        if backend_name == "llama.cpp":
-            backend: BaseBackend = LlamaCppBackend()
-        else:
-            backend = TransformersBackend()
-
-        backend.load(local_path, **kwargs)
-        self._backend = backend
-        self._active_backend_name = backend_name
-        # Store the human-friendly model_id (repo-id) for display
-        self._backend._model_id = model_id
+        factory = self.backend_factories.get(backend_name)
+        if factory is None:
+            raise ValueError(f"Unknown backend: {backend_name}")
+
+        with self._lock:
+            if (
+                model_id in self._pool
+                and self._backend_names[model_id] == backend_name
+            ):
+                self._pool.move_to_end(model_id)
+                self._active_id = model_id
+                return
+            # Free idle models up front, but never the ones serving now
+            victims = self._pick_victims(
+                _estimate_model_bytes(local_path, backend_name),
+                incoming=0 if model_id in self._pool else 1,
+                keep={self._active_id, model_id},
+            )
+        for victim in victims:
+            self._retire(victim)
+
+        backend = factory()
+
+        started = time.perf_counter()
+        try:
+            backend.load(local_path, **kwargs)
+            # Store the human-friendly model_id (repo-id) for display
+            backend._model_id = model_id
+            try:
+                self._warm_up(backend)
+            except Exception:
+                backend.unload()
+                raise
+        except Exception:
+            metrics.MODEL_LOAD.observe(
+                time.perf_counter() - started, backend=backend_name, outcome="error"
+            )
+            raise
+        metrics.MODEL_LOAD.observe(
+            time.perf_counter() - started, backend=backend_name, outcome="ok"
+        )
+
+        with self._lock:
+            replaced = self._pool.pop(model_id, None)
+            self._pool[model_id] = backend
+            self._backend_names[model_id] = backend_name
+            self._active_id = model_id
+            # Actual footprint may exceed the on-disk estimate
+            victims = self._pick_victims(0, incoming=0, keep={model_id})
+        if replaced is not None:
+            victims.append(replaced)
+        for victim in victims:
+            self._retire(victim)
+
+    @staticmethod
+    def _warm_up(backend: BaseBackend) -> None:
+        """Run one tiny generation so kernels / allocators are initialised."""
+        backend.generate("Hello", max_tokens=1, do_sample=False)
+        # Not real traffic — keep it out of the hit rate
+        backend.reset_cache_stats()
+
+    def _pick_victims(
+        self, incoming_bytes: int, incoming: int, keep: set
+    ) -> list[BaseBackend]:
+        """Remove LRU models from the pool until the incoming one fits.
+
+        Must be called with ``_lock`` held; returns the removed backends
+        for the caller to ``_retire`` outside the lock.
+        """
+        budget = int(self.memory_budget_gb * 1024**3)
+        victims: list[BaseBackend] = []
+        while True:
+            candidates = [m for m in self._pool if m not in keep]
+            if not candidates:
+                return victims
+            count = len(self._pool) + incoming
+            used = sum(b.memory_footprint() for b in self._pool.values())
+            over_count = count > self.max_models
+            over_budget = budget > 0 and used + incoming_bytes > budget
+            if not (over_count or over_budget):
+                return victims
+            log.info("Evicting least-recently-used model %s", candidates[0])
+            victims.append(self._pool.pop(candidates[0]))
+            self._backend_names.pop(candidates[0], None)
+            if self._active_id == candidates[0]:
+                self._active_id = next(reversed(self._pool), None)
+
+    def _retire(self, backend: BaseBackend, wait: bool = False) -> None:
+        """Unload *backend* (already out of the pool) once it is idle.
+
+        Busy backends are drained in a background thread unless *wait*.
+        """
+        with self._lock:
+            busy = self._inflight.get(backend, 0) > 0
+        if busy and not wait:
+            threading.Thread(
+                target=self._retire, args=(backend, True), daemon=True
+            ).start()
+            return
+        with self._lock:
+            while self._inflight.get(backend, 0) > 0:
+                self._drained.wait()
+        log.info("Unloading %s", backend.model_id)
+        backend.unload()
 
     def reload_with_backend(self, backend_name: str, **kwargs: Any) -> None:
-        """Switch the currently loaded model to a different backend.
+        """Switch the active model to a different backend.
 
-        The model is unloaded and reloaded using *backend_name*.
-        Raises ``RuntimeError`` if no model is currently loaded.
+        The model is reloaded using *backend_name* and swapped in
+        without downtime.  Raises ``RuntimeError`` if no model is loaded.
         """
-        if not self.is_loaded or self._backend is None:
+        if not self.is_loaded or self._active_id is None:
             raise RuntimeError("No model loaded — load a model first.")
-        model_id = self._backend.model_id
-        if model_id is None:
-            raise RuntimeError("Current model has no model_id.")
-        self.load_model(model_id, force_backend=backend_name, **kwargs)
-
-    def unload_model(self) -> None:
-        """Release current backend and reclaim resources."""
-        if self._backend is not None:
-            self._backend.unload()
-            self._backend = None
-        self._active_backend_name = None
+        self.load_model(self._active_id, force_backend=backend_name, **kwargs)
+
+    def unload_model(self, model_id: str | None = None) -> None:
+        """Release *model_id* (or every resident model) and reclaim resources.
+
+        New requests stop routing to the model immediately; the call
+        returns once its in-flight requests have drained.
+        """
+        with self._lock:
+            targets = list(self._pool) if model_id is None else [model_id]
+            removed = []
+            for mid in targets:
+                backend = self._pool.pop(mid, None)
+                self._backend_names.pop(mid, None)
+                if backend is not None:
+                    removed.append(backend)
+            if self._active_id not in self._pool:
+                # Fall back to the most recently used survivor
+                self._active_id = next(reversed(self._pool), None)
+        for backend in removed:
+            self._retire(backend, wait=True)
+
+    # ── Routing ────────────────────────────────────────────────────────
+    def resolve_model(self, model: str | None = None) -> Optional[str]:
+        """Return the resident model id that serves *model*."""
+        with self._lock:
+            if model and model in self._pool:
+                return model
+            return self._active_id
+
+    def get_backend(self, model: str | None = None) -> BaseBackend:
+        """Return the backend serving *model* and mark it recently used."""
+        with self._lock:
+            model_id = self.resolve_model(model)
+            if model_id is None:
+                raise RuntimeError("No model loaded — load a model first.")
+            self._pool.move_to_end(model_id)
+            return self._pool[model_id]
+
+    def acquire(
+        self, model: str | None = None, trace: Optional[Trace] = None
+    ) -> BaseBackend:
+        """Lease the backend serving *model*; pair with ``release``.
+
+        A leased backend is never unloaded, even if it is swapped out
+        or evicted meanwhile.  *trace* is tagged with the model and
+        backend that serve the request.
+        """
+        with self._lock:
+            backend = self.get_backend(model)
+            self._inflight[backend] = self._inflight.get(backend, 0) + 1
+        if trace is not None:
+            trace.set(model=backend.model_id, backend=backend.backend_name)
+        return backend
+
+    def release(self, backend: BaseBackend) -> None:
+        with self._lock:
+            n = self._inflight.get(backend, 0) - 1
+            if n > 0:
+                self._inflight[backend] = n
+            else:
+                self._inflight.pop(backend, None)
+                self._drained.notify_all()
+
+    @contextmanager
+    def lease(
+        self, model: str | None = None, trace: Optional[Trace] = None
+    ) -> Iterator[BaseBackend]:
+        backend = self.acquire(model, trace)
+        try:
+            yield backend
+        finally:
+            self.release(backend)
 
     # ── Generation ─────────────────────────────────────────────────────
-    def generate(self, prompt: str, **kwargs: Any) -> str:
-        """Generate text continuation for *prompt*."""
-        if self._backend is None:
-            raise RuntimeError("No model loaded — load a model first.")
-        return self._backend.generate(prompt, **kwargs)
+    def generate(self, prompt: str, *, model: str | None = None, **kwargs: Any) -> str:
+        """Generate text continuation for *prompt*.
 
-    def chat_generate(self, messages: list[dict], **kwargs: Any) -> str:
+        A ``trace`` keyword (``tracing.Trace``) is passed through to the
+        backend, which records its phases on it.
+        """
+        started = time.perf_counter()
+        with self.lease(model, kwargs.get("trace")) as backend:
+            result = backend.complete(prompt, **kwargs)
+        self._observe(result, started)
+        return result.text
+
+    def chat_generate(
+        self, messages: list[dict], *, model: str | None = None, **kwargs: Any
+    ) -> str:
         """Generate a response from chat *messages*."""
-        if self._backend is None:
-            raise RuntimeError("No model loaded — load a model first.")
-        return self._backend.chat_generate(messages, **kwargs)
+        started = time.perf_counter()
+        with self.lease(model, kwargs.get("trace")) as backend:
+            result = backend.chat_complete(messages, **kwargs)
+        self._observe(result, started)
+        return result.text
+
+    @staticmethod
+    def _observe(result: Any, started: float) -> None:
+        # Direct (unscheduled) calls — no queue wait or TTFT to report
+        metrics.observe_generation(
+            "engine", result.finish_reason,
+            result.prompt_tokens, result.completion_tokens,
+            duration=time.perf_counter() - started,
+        )
+
+    @contextmanager
+    def generate_stream(
+        self, prompt: str, *, model: str | None = None, **kwargs: Any
+    ) -> Iterator[Iterator[StreamChunk]]:
+        """Lease the model and yield the ``StreamChunk`` deltas for *prompt*.
+
+        Use as ``with engine.generate_stream(p) as chunks: for c in chunks``.
+        The lease ends with the ``with`` block, not whenever an abandoned
+        generator happens to be collected, so a swap or eviction waiting
+        to drain the model is never held up by a dropped stream.
+        """
+        with self.lease(model, kwargs.get("trace")) as backend:
+            yield from self._closing(backend.generate_stream(prompt, **kwargs))
+
+    @contextmanager
+    def chat_generate_stream(
+        self, messages: list[dict], *, model: str | None = None, **kwargs: Any
+    ) -> Iterator[Iterator[StreamChunk]]:
+        """Like ``generate_stream``, for chat *messages*."""
+        with self.lease(model, kwargs.get("trace")) as backend:
+            yield from self._closing(backend.chat_generate_stream(messages, **kwargs))
+
+    @staticmethod
+    def _closing(chunks: Iterator[StreamChunk]) -> Iterator[Iterator[StreamChunk]]:
+        try:
+            yield chunks
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()  # stops the backend's decode before the lease ends
 
     # ── Introspection ──────────────────────────────────────────────────
     @property
     def is_loaded(self) -> bool:
-        return self._backend is not None and self._backend.is_loaded
+        backend = self.backend
+        return backend is not None and backend.is_loaded
 
     @property
     def model_id(self) -> str | None:
-        return self._backend.model_id if self._backend else None
+        """Id of the active (most recently loaded) model."""
+        return self._active_id
+
+    @property
+    def backend(self) -> Optional[BaseBackend]:
+        """The active backend instance, or ``None`` if nothing is loaded."""
+        with self._lock:
+            return self._pool.get(self._active_id) if self._active_id else None
 
     @property
     def active_backend(self) -> str | None:
-        """Name of the currently active backend (``'transformers'`` / ``'llama.cpp'``)."""
-        return self._active_backend_name
+        """Backend name of the active model (``'transformers'`` / ``'llama.cpp'``)."""
+        return self._backend_names.get(self._active_id) if self._active_id else None
+
+    def is_resident(self, model_id: str) -> bool:
+        return model_id in self._pool
+
+    def backend_name_for(self, model_id: str) -> str | None:
+        return self._backend_names.get(model_id)
+
+    def resident_models(self) -> list[Dict[str, Any]]:
+        """Describe every loaded model, most recently used first."""
+        with self._lock:
+            return [
+                {
+                    "model_id": mid,
+                    "backend": self._backend_names.get(mid),
+                    "memory_bytes": backend.memory_footprint(),
+                    "active": mid == self._active_id,
+                }
+                for mid, backend in reversed(self._pool.items())
+            ]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Prefix-cache hit rate / prefill tokens saved for the active model."""
+        backend = self.backend
+        return backend.cache_stats() if backend else {}
 
     def device_info(self) -> Dict[str, str]:
-        if self._backend is not None:
-            info = self._backend.device_info()
-            info["backend"] = self._backend.backend_name
+        backend = self.backend
+        if backend is not None:
+            info = backend.device_info()
+            info["backend"] = backend.backend_name
             return info
         # Fallback — no model loaded
         try:
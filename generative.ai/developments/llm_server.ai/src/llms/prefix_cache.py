@@ -0,0 +1,145 @@
+"""Prefix cache — reuse prompt KV state across requests.
+
+Entries are keyed by the token-id sequence they were computed for and
+hold an opaque, backend-specific value (per-layer KV tensors for
+transformers, a ``LlamaState`` snapshot for llama.cpp).  A lookup
+returns the entry sharing the longest common token prefix with the new
+prompt, so only the remaining suffix needs prefill.
+
+Eviction is least-recently-used, bounded by a byte budget.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+#: Default prefix-cache budget per loaded model
+DEFAULT_BUDGET_BYTES = 512 * 1024**2
+
+
+def common_prefix_len(a: Sequence[int], b: Sequence[int]) -> int:
+    """Length of the longest common prefix of two token sequences."""
+    lo, hi = 0, min(len(a), len(b))
+    # Binary search over slice equality — each compare runs in C
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class PrefixCache:
+    """Thread-safe LRU cache of prompt state keyed by token-id prefix."""
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes = max(0, int(budget_bytes))
+        self._entries: "OrderedDict[Tuple[int, ...], Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.lookups = 0
+        self.hits = 0
+        self.prefill_tokens_saved = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_bytes > 0
+
+    # ── Lookup / insert ────────────────────────────────────────────
+    def lookup(
+        self, ids: Sequence[int], limit: Optional[int] = None, count_hit: bool = True
+    ) -> Tuple[int, Any]:
+        """Return ``(reused_len, value)`` for the best entry matching *ids*.
+
+        *reused_len* is the common-prefix length, capped at *limit*
+        (callers pass ``len(ids) - 1`` so at least one token is left
+        to produce logits).  ``(0, None)`` on a miss.  With
+        ``count_hit=False`` only the lookup is counted; the caller
+        reports the hit with ``record_hit`` if the value really gets
+        used.
+        """
+        if not self.enabled:
+            return 0, None
+        key = tuple(ids)
+        cap = len(key) if limit is None else limit
+        with self._lock:
+            self.lookups += 1
+            best_key, best_len = None, 0
+            for k in self._entries:
+                n = common_prefix_len(k, key)
+                if n > best_len:
+                    best_key, best_len = k, n
+            best_len = min(best_len, cap)
+            if best_key is None or best_len <= 0:
+                return 0, None
+            self._entries.move_to_end(best_key)
+            if count_hit:
+                self.hits += 1
+                self.prefill_tokens_saved += best_len
+            return best_len, self._entries[best_key][0]
+
+    def record_hit(self, reused: int) -> None:
+        """Count a hit of *reused* prompt tokens found by an uncounted lookup."""
+        if reused <= 0:
+            return
+        with self._lock:
+            self.hits += 1
+            self.prefill_tokens_saved += reused
+
+    def contains(self, ids: Sequence[int]) -> bool:
+        """``True`` if some entry shares a prefix with *ids* (no stats)."""
+        key = tuple(ids)
+        with self._lock:
+            return any(common_prefix_len(k, key) > 0 for k in self._entries)
+
+    def insert(self, ids: Sequence[int], value: Any, size_bytes: int) -> None:
+        """Store *value* for *ids*, evicting LRU entries over budget."""
+        if not self.enabled or size_bytes > self.budget_bytes:
+            return
+        key = tuple(ids)
+        with self._lock:
+            # Entries that are a prefix of the new key are now redundant
+            # (e.g. the previous turn of a growing chat history).
+            stale = [
+                k for k in self._entries
+                if len(k) <= len(key) and key[: len(k)] == k
+            ]
+            for k in stale:
+                self._bytes -= self._entries.pop(k)[1]
+
+            self._entries[key] = (value, size_bytes)
+            self._bytes += size_bytes
+            while self._bytes > self.budget_bytes and self._entries:
+                _k, (_v, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.lookups = self.hits = 0
+            self.prefill_tokens_saved = self.evictions = 0
+
+    # ── Introspection ──────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": (self.hits / self.lookups) if self.lookups else 0.0,
+                "prefill_tokens_saved": self.prefill_tokens_saved,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,499 @@
+"""Request scheduler — bounded queue + continuous batching.
+
+Sits between the FastAPI routes and the ``InferenceEngine``.  Every
+request is queued and answered through its own ``RequestHandle``
+(a future for the full text plus an iterator of ``StreamChunk``
+deltas).  A single worker thread owns the model:
+
+  • backends with ``supports_batching`` (transformers) are driven
+    token-by-token; new requests join the running batch and finished
+    ones leave it at every token boundary (continuous batching)
+  • other backends (llama.cpp) run one request at a time on a worker
+    thread of their own, so a long generation there never stalls the
+    batched models' decode steps or admission
+
+Requests are routed to a resident model by id; each model gets its
+own running batch and the loop steps them in turn.  Every running
+request holds an engine lease on its backend, so a model that is
+hot-swapped or evicted finishes its in-flight work before unloading.
+
+Handles created from inside a running asyncio loop (the FastAPI
+routes) deliver their chunks onto that loop, so routes ``await`` /
+``async for`` them without tying up a thread per request.
+
+A handle may carry a ``tracing.Trace``: the scheduler records the
+``queue`` (and, when batching, ``decode``) phases on it and hands it
+to the backend, which records its own.
+
+``RequestHandle.cancel()`` (e.g. on client disconnect) drops a queued
+request, removes a running one from its batch at the next token, or
+aborts a serial backend's generation; the request then finishes with
+``finish_reason="cancelled"`` and the usage consumed so far.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from src import metrics
+from src.tracing import Trace
+from src.llms.backends.base import GenerationResult, StreamChunk
+
+log = logging.getLogger("llm_daemon")
+
+
+class SchedulerFull(Exception):
+    """Raised when the request queue has reached its bound."""
+
+
+class RequestHandle:
+    """Caller-side view of one queued generation request.
+
+    Iterate it (``for`` from threads, ``async for`` from the event
+    loop it was created on) to receive ``StreamChunk`` deltas — the
+    last one carries ``finish_reason`` and usage — or call
+    ``result()`` / ``await wait()`` for the complete text; usage is
+    then available on ``final``.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        payload: Any,
+        params: Dict[str, Any],
+        model: Optional[str] = None,
+        stream: bool = True,
+        source: Optional[str] = None,
+        trace: Optional[Trace] = None,
+    ) -> None:
+        self.kind = kind  # "generate" | "chat"
+        self.payload = payload  # prompt str | list of message dicts
+        self.params = params
+        self.model = model  # routed via InferenceEngine.get_backend
+        self.stream = stream  # False → serial backends answer in one piece
+        self.source = source  # metrics label ("api" / "daemon"); None → untracked
+        self.trace = trace
+        self.future: Future = Future()
+        #: Set by ``cancel()``; backends poll it between tokens
+        self.cancelled = threading.Event()
+        # perf_counter timestamps: queued / admitted / first text / done
+        self.submitted_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.decode_started_at: Optional[float] = None  # batched: after prefill
+        self.finished_at: Optional[float] = None
+        #: Final chunk (``finish_reason`` + exact usage) once done
+        self.final: Optional[StreamChunk] = None
+        self._text: List[str] = []
+        try:
+            self._loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        self._chunks: Any = asyncio.Queue() if self._loop else queue.Queue()
+
+    @classmethod
+    def from_result(
+        cls,
+        kind: str,
+        payload: Any,
+        params: Dict[str, Any],
+        model: Optional[str],
+        result: GenerationResult,
+    ) -> "RequestHandle":
+        """An already finished handle replaying *result* (e.g. a cache hit)."""
+        handle = cls(kind, payload, params, model)
+        if result.text:
+            handle._push(StreamChunk(text=result.text))
+        handle._push(StreamChunk(
+            finish_reason=result.finish_reason,
+            prompt_tokens=result.prompt_tokens,
+            completion_tokens=result.completion_tokens,
+        ))
+        return handle
+
+    # ── Worker side ────────────────────────────────────────────────
+    def _deliver(self, item: Any) -> None:
+        if self._loop is None:
+            self._chunks.put(item)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._chunks.put_nowait, item)
+        except RuntimeError:
+            pass  # loop already closed — nobody is listening
+
+    def _push(self, chunk: StreamChunk) -> None:
+        if chunk.text:
+            self._text.append(chunk.text)
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+        self._deliver(chunk)
+        if chunk.finish_reason is not None:
+            self.final = chunk
+            self.finished_at = time.perf_counter()
+            self._observe(chunk)
+            self._trace(chunk)
+            self.future.set_result("".join(self._text))
+
+    def _fail(self, exc: BaseException) -> None:
+        self._deliver(exc)
+        if self.source is not None:
+            metrics.GENERATIONS.inc(source=self.source, finish_reason="error")
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+    def _observe(self, final: StreamChunk) -> None:
+        if self.source is None:
+            return
+        t0 = self.submitted_at
+        metrics.observe_generation(
+            self.source,
+            final.finish_reason or "stop",
+            final.prompt_tokens,
+            final.completion_tokens,
+            duration=self.finished_at - t0,
+            ttft=None if self.first_token_at is None else self.first_token_at - t0,
+            queue_wait=None if self.started_at is None else self.started_at - t0,
+        )
+
+    def _trace(self, final: StreamChunk) -> None:
+        trace = self.trace
+        if trace is None:
+            return
+        if self.started_at is not None:
+            trace.add("queue", self.submitted_at, self.started_at)
+        if self.decode_started_at is not None:
+            trace.add("decode", self.decode_started_at, self.finished_at)
+        trace.set(
+            finish_reason=final.finish_reason,
+            prompt_tokens=final.prompt_tokens,
+            completion_tokens=final.completion_tokens,
+        )
+        if self.first_token_at is not None:
+            trace.set(ttft_ms=round((self.first_token_at - self.submitted_at) * 1000.0, 3))
+
+    # ── Caller side ────────────────────────────────────────────────
+    def cancel(self) -> None:
+        """Stop generating for this request (no-op once finished)."""
+        if not self.future.done():
+            self.cancelled.set()
+
+    def __iter__(self) -> Iterator[StreamChunk]:
+        if self._loop is not None:
+            raise TypeError("Handle is bound to an event loop — use 'async for'")
+        while True:
+            item = self._chunks.get()
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+            if item.finish_reason is not None:
+                return
+
+    async def __aiter__(self) -> AsyncIterator[StreamChunk]:
+        if self._loop is None:
+            raise TypeError("Handle was created outside an event loop — use 'for'")
+        while True:
+            item = await self._chunks.get()
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+            if item.finish_reason is not None:
+                return
+
+    def result(self, timeout: Optional[float] = None) -> str:
+        return self.future.result(timeout)
+
+    async def wait(self) -> str:
+        """Await the complete text without blocking the event loop."""
+        return await asyncio.wrap_future(self.future)
+
+
+class RequestScheduler:
+    """Queue requests and run them on one inference worker thread."""
+
+    def __init__(
+        self,
+        engine: Any,
+        max_queue: int = 64,
+        max_batch_size: int = 8,
+    ) -> None:
+        self.engine = engine
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue[RequestHandle]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # Serial backend → its worker (touched by the loop thread only)
+        self._serial: Dict[Any, _SerialWorker] = {}
+
+    # ── Lifecycle ──────────────────────────────────────────────────
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._loop, name="llm-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+        # The loop drains on exit too; this covers a join timeout
+        self._drain_queue()
+
+    def _drain_queue(self) -> None:
+        # Fail anything still waiting so callers don't hang
+        while True:
+            try:
+                handle = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            handle._fail(RuntimeError("Scheduler stopped"))
+
+    # ── Submission ─────────────────────────────────────────────────
+    def submit(
+        self,
+        kind: str,
+        payload: Any,
+        params: Dict[str, Any],
+        model: Optional[str] = None,
+        stream: bool = True,
+        source: str = "api",
+        trace: Optional[Trace] = None,
+    ) -> RequestHandle:
+        """Queue a ``"generate"`` (prompt) or ``"chat"`` (messages) request.
+
+        *model* selects a resident model (default: the active one).
+        Pass ``stream=False`` when only the full text is wanted.
+        *source* labels the request's latency / token metrics and
+        *trace* collects its phase timings.
+        Raises ``SchedulerFull`` if the queue is at capacity.
+        """
+        handle = RequestHandle(kind, payload, params, model, stream, source, trace)
+        if self._queue.maxsize and self.queue_depth >= self._queue.maxsize:
+            # Serial backlogs count too: they left the queue, not the line
+            raise SchedulerFull("Request queue is full")
+        try:
+            self._queue.put_nowait(handle)
+        except queue.Full:
+            raise SchedulerFull("Request queue is full") from None
+        return handle
+
+    @property
+    def queue_depth(self) -> int:
+        waiting = sum(w.backlog for w in list(self._serial.values()))
+        return self._queue.qsize() + waiting
+
+    # ── Worker loop ────────────────────────────────────────────────
+    def _loop(self) -> None:
+        # One running batch per resident backend (i.e. per model)
+        batches: Dict[Any, List[tuple[RequestHandle, Any]]] = {}
+
+        while self._running:
+            for backend in [b for b in batches if not b.is_loaded]:
+                # Model was unloaded / evicted under the running batch
+                for handle, _seq in batches.pop(backend):
+                    handle._fail(RuntimeError("Model unloaded during generation"))
+                    self.engine.release(backend)
+            for backend in [b for b in self._serial if not b.is_loaded]:
+                # Drained (its leases are gone) and unloaded — retire it
+                self._serial.pop(backend).close()
+
+            # Admit new requests — block only when nothing is running
+            while sum(len(b) for b in batches.values()) < self.max_batch_size:
+                try:
+                    if batches:
+                        handle = self._queue.get_nowait()
+                    else:
+                        handle = self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    break
+                if handle.cancelled.is_set():
+                    handle._push(StreamChunk(finish_reason="cancelled"))
+                    continue
+                try:
+                    # Lease the backend so a hot swap / eviction waits
+                    # for this request before unloading it
+                    backend = self.engine.acquire(handle.model, trace=handle.trace)
+                except RuntimeError as exc:
+                    handle._fail(exc)
+                    continue
+                if not getattr(backend, "supports_batching", False):
+                    # The worker releases the lease when the request ends
+                    worker = self._serial.get(backend)
+                    if worker is None:
+                        worker = self._serial[backend] = _SerialWorker(self, backend)
+                    worker.put(handle)
+                    continue
+                handle.started_at = time.perf_counter()
+                seq = self._start(backend, handle)
+                if seq is None:
+                    self.engine.release(backend)
+                else:
+                    batches.setdefault(backend, []).append((handle, seq))
+
+            for backend, active in list(batches.items()):
+                for handle, seq in active:
+                    if handle.cancelled.is_set() and seq.finish_reason is None:
+                        # Leaves the batch below, before the next step
+                        seq.finish_reason = "cancelled"
+                        seq.cache = []
+                try:
+                    backend.decode_step([seq for _h, seq in active])
+                except Exception as exc:
+                    log.exception("Batched decode step failed")
+                    for handle, _seq in batches.pop(backend):
+                        handle._fail(exc)
+                        self.engine.release(backend)
+                    continue
+                still = []
+                for handle, seq in active:
+                    if self._emit(handle, seq):
+                        self.engine.release(backend)
+                    else:
+                        still.append((handle, seq))
+                if still:
+                    batches[backend] = still
+                else:
+                    del batches[backend]
+
+        # Stopped: resolve in-flight requests and drop their leases, or
+        # unloading the model would wait on them forever
+        for backend, active in batches.items():
+            for handle, seq in active:
+                seq.cache = []
+                handle._fail(RuntimeError("Scheduler stopped"))
+                self.engine.release(backend)
+        for worker in self._serial.values():
+            worker.close(abort=True)
+        for worker in self._serial.values():
+            worker.join(timeout=5)
+        self._serial.clear()
+        self._drain_queue()
+
+    def _start(self, backend: Any, handle: RequestHandle) -> Any:
+        params = {**handle.params, "trace": handle.trace}
+        try:
+            if handle.kind == "chat":
+                seq = backend.chat_start_sequence(handle.payload, **params)
+            else:
+                seq = backend.start_sequence(handle.payload, **params)
+        except Exception as exc:
+            log.exception("Prefill failed")
+            handle._fail(exc)
+            return None
+        handle.decode_started_at = time.perf_counter()
+        return None if self._emit(handle, seq) else seq
+
+    @staticmethod
+    def _emit(handle: RequestHandle, seq: Any) -> bool:
+        """Forward new text for *seq*; return ``True`` once it finished."""
+        if seq.text_delta:
+            handle._push(StreamChunk(text=seq.text_delta))
+            seq.text_delta = ""
+        if seq.finish_reason is None:
+            return False
+        handle._push(StreamChunk(
+            finish_reason=seq.finish_reason,
+            prompt_tokens=seq.prompt_tokens,
+            completion_tokens=seq.completion_tokens,
+        ))
+        return True
+
+    @staticmethod
+    def _run_serial(backend: Any, handle: RequestHandle) -> None:
+        params = {**handle.params, "cancel": handle.cancelled, "trace": handle.trace}
+        try:
+            if not handle.stream:
+                if handle.kind == "chat":
+                    res = backend.chat_complete(handle.payload, **params)
+                else:
+                    res = backend.complete(handle.payload, **params)
+                handle._push(StreamChunk(
+                    text=res.text,
+                    finish_reason=res.finish_reason,
+                    prompt_tokens=res.prompt_tokens,
+                    completion_tokens=res.completion_tokens,
+                ))
+                return
+            if handle.kind == "chat":
+                chunks = backend.chat_generate_stream(handle.payload, **params)
+            else:
+                chunks = backend.generate_stream(handle.payload, **params)
+            for chunk in chunks:
+                handle._push(chunk)
+        except Exception as exc:
+            log.exception("Generation failed")
+            handle._fail(exc)
+
+
+class _SerialWorker:
+    """Runs a non-batching backend's requests one by one on its own thread.
+
+    Each queued handle arrives holding an engine lease on *backend*,
+    which is released once that request ends.
+    """
+
+    def __init__(self, scheduler: RequestScheduler, backend: Any) -> None:
+        self._scheduler = scheduler
+        self._backend = backend
+        self._jobs: "queue.Queue[Optional[RequestHandle]]" = queue.Queue()
+        self._current: Optional[RequestHandle] = None
+        self._aborted = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"llm-serial-{backend.backend_name}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def backlog(self) -> int:
+        return self._jobs.qsize()
+
+    def put(self, handle: RequestHandle) -> None:
+        self._jobs.put(handle)
+
+    def close(self, abort: bool = False) -> None:
+        """Let the thread exit; with *abort*, fail waiting requests and
+        cancel the running one first."""
+        if abort:
+            self._aborted = True
+            while True:
+                try:
+                    handle = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if handle is not None:
+                    handle._fail(RuntimeError("Scheduler stopped"))
+                    self._scheduler.engine.release(self._backend)
+            current = self._current
+            if current is not None:
+                current.cancel()
+        self._jobs.put(None)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            handle = self._jobs.get()
+            if handle is None:
+                return
+            self._current = handle
+            try:
+                if self._aborted:
+                    handle._fail(RuntimeError("Scheduler stopped"))
+                elif handle.cancelled.is_set():
+                    handle._push(StreamChunk(finish_reason="cancelled"))
+                else:
+                    handle.started_at = time.perf_counter()
+                    RequestScheduler._run_serial(self._backend, handle)
+            finally:
+                self._current = None
+                self._scheduler.engine.release(self._backend)
@@ -0,0 +1,60 @@
+"""Stop sequences — cut a generation at the first OpenAI-style ``stop`` string.
+
+``StopMatcher`` is fed the text deltas of one generation as they are
+decoded.  It only ever scans the held-back tail plus the new delta, and
+it withholds any suffix that could still grow into a stop string, so a
+stream never emits text it later has to take back.  The stop string
+itself is never returned.
+"""
+
+from __future__ import annotations
+
+from typing import Any, List, Optional, Tuple
+
+#: Most stop strings a request may pass (as in the OpenAI API)
+MAX_STOP_SEQUENCES = 4
+
+
+def normalize_stop(stop: Any) -> List[str]:
+    """``None`` / ``str`` / list of ``str`` → list of non-empty strings."""
+    if stop is None:
+        return []
+    if isinstance(stop, str):
+        stop = [stop]
+    return [s for s in stop if s]
+
+
+class StopMatcher:
+    """Incremental matcher over the decoded tail of one generation."""
+
+    def __init__(self, stops: List[str]) -> None:
+        self.stops = [s for s in stops if s]
+        self._held = ""
+
+    def feed(self, text: str) -> Tuple[str, bool]:
+        """Return ``(text safe to emit, stopped)`` after appending *text*."""
+        buf = self._held + text
+        hits = [i for i in (buf.find(s) for s in self.stops) if i >= 0]
+        if hits:
+            self._held = ""
+            return buf[: min(hits)], True
+        # Withhold the longest suffix that is a prefix of some stop string
+        keep = 0
+        for s in self.stops:
+            for k in range(min(len(s) - 1, len(buf)), keep, -1):
+                if buf.endswith(s[:k]):
+                    keep = k
+                    break
+        self._held = buf[len(buf) - keep :]
+        return buf[: len(buf) - keep], False
+
+    def flush(self) -> str:
+        """Release the withheld tail once the generation ended without a match."""
+        held, self._held = self._held, ""
+        return held
+
+
+def stop_matcher(stop: Any) -> Optional[StopMatcher]:
+    """A ``StopMatcher`` for *stop*, or ``None`` if there is nothing to match."""
+    stops = normalize_stop(stop)
+    return StopMatcher(stops) if stops else None
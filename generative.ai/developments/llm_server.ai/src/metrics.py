@@ -0,0 +1,319 @@
+"""Process-wide metrics in the Prometheus text exposition format.
+
+A deliberately small, dependency-free registry: counters, gauges and
+fixed-bucket histograms, each optionally labelled.  Recording is a dict
+lookup plus a short critical section, so instrumentation is cheap on
+the hot path; all formatting happens when ``/metrics`` is scraped.
+
+Metrics that only need a value at scrape time (memory, cache hit
+rates, queue depth) are filled in by *collectors* registered with
+``add_collector``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+#: Latency buckets (seconds) — sub-ms cache hits up to multi-minute loads
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+#: Per-token latency buckets (seconds)
+TOKEN_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+#: Decode-rate buckets (tokens / second)
+RATE_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing total."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.label_names, key)} {_fmt(value)}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.label_names, key)} {_fmt(value)}"
+
+
+class Histogram(_Metric):
+    """Distribution over fixed, cumulative ``le`` buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values → (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[idx] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = [(k, (list(c), s)) for k, (c, s) in self._values.items()]
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                cumulative += n
+                le = _labels(self.label_names, key, f'le="{_fmt(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            base = _labels(self.label_names, key)
+            yield f"{self.name}_sum{base} {_fmt(total)}"
+            yield f"{self.name}_count{base} {cumulative}"
+
+
+class Registry:
+    """Holds metrics and scrape-time collectors; renders the exposition."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Run *collector* before every scrape (to refresh gauges)."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for collect in collectors:
+            try:
+                collect()
+            except Exception:
+                pass  # a broken collector must not break the scrape
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+#: Content type of ``Registry.render`` output
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help_text, labels))  # type: ignore[return-value]
+
+
+def gauge(name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_text, labels))  # type: ignore[return-value]
+
+
+def histogram(
+    name: str,
+    help_text: str,
+    labels: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))  # type: ignore[return-value]
+
+
+# ── Metric definitions ─────────────────────────────────────────────────
+
+HTTP_REQUESTS = counter(
+    "llm_http_requests_total", "HTTP requests by route, method and status.",
+    ("route", "method", "status"),
+)
+HTTP_IN_FLIGHT = gauge(
+    "llm_http_requests_in_flight", "HTTP requests currently being served."
+)
+QUEUE_WAIT = histogram(
+    "llm_queue_wait_seconds", "Time a generation waited in the scheduler queue.",
+    ("source",),
+)
+TTFT = histogram(
+    "llm_time_to_first_token_seconds", "Submission to first generated text.",
+    ("source",),
+)
+TIME_PER_TOKEN = histogram(
+    "llm_time_per_output_token_seconds", "Mean decode time per token after the first.",
+    ("source",), TOKEN_BUCKETS,
+)
+REQUEST_DURATION = histogram(
+    "llm_generation_duration_seconds", "Submission to last token of a generation.",
+    ("source",),
+)
+TOKENS_PER_SECOND = histogram(
+    "llm_generation_tokens_per_second", "Completion tokens per second of a generation.",
+    ("source",), RATE_BUCKETS,
+)
+TOKENS = counter(
+    "llm_tokens_total", "Tokens processed, by type (prompt / completion).",
+    ("source", "type"),
+)
+GENERATIONS = counter(
+    "llm_generations_total", "Finished generations by finish reason.",
+    ("source", "finish_reason"),
+)
+MODEL_LOAD = histogram(
+    "llm_model_load_seconds", "Model load (incl. warm-up) duration.",
+    ("backend", "outcome"),
+)
+DAEMON_COMMANDS = counter(
+    "llm_daemon_commands_total", "Daemon socket commands by outcome.",
+    ("cmd", "outcome"),
+)
+QUEUE_DEPTH = gauge("llm_queue_depth", "Requests waiting in the scheduler queue.")
+CACHE_HIT_RATIO = gauge(
+    "llm_cache_hit_ratio", "Hit ratio of the response / prefix caches.", ("cache",)
+)
+CACHE_LOOKUPS = gauge(
+    "llm_cache_lookups", "Lookups served by the response / prefix caches.", ("cache",)
+)
+PROCESS_RSS = gauge("llm_process_resident_memory_bytes", "Resident set size.")
+GPU_MEMORY = gauge(
+    "llm_gpu_memory_bytes", "CUDA memory held by PyTorch (allocated / reserved).",
+    ("kind",),
+)
+
+
+def observe_generation(
+    source: str,
+    finish_reason: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    duration: float,
+    ttft: float | None = None,
+    queue_wait: float | None = None,
+) -> None:
+    """Record one finished generation (all times in seconds)."""
+    GENERATIONS.inc(source=source, finish_reason=finish_reason)
+    TOKENS.inc(prompt_tokens, source=source, type="prompt")
+    TOKENS.inc(completion_tokens, source=source, type="completion")
+    REQUEST_DURATION.observe(duration, source=source)
+    if queue_wait is not None:
+        QUEUE_WAIT.observe(queue_wait, source=source)
+    if ttft is not None:
+        TTFT.observe(ttft, source=source)
+        if completion_tokens > 1:
+            TIME_PER_TOKEN.observe(
+                (duration - ttft) / (completion_tokens - 1), source=source
+            )
+    if duration > 0 and completion_tokens:
+        TOKENS_PER_SECOND.observe(completion_tokens / duration, source=source)
+
+
+def _collect_process() -> None:
+    try:
+        with open("/proc/self/statm") as fh:
+            PROCESS_RSS.set(int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # ru_maxrss is the peak, in KiB on Linux (bytes on macOS)
+        PROCESS_RSS.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.cuda.is_available():
+        GPU_MEMORY.set(torch.cuda.memory_allocated(), kind="allocated")
+        GPU_MEMORY.set(torch.cuda.memory_reserved(), kind="reserved")
+
+
+REGISTRY.add_collector(_collect_process)
@@ -0,0 +1,180 @@
+"""Per-request tracing — attribute latency to phases in-process.
+
+A ``Trace`` is opened for each API request and travels with it: the
+routes pass it to the scheduler (``RequestHandle.trace``), which hands
+it to the backend as the ``trace`` keyword of its generation methods
+(``InferenceEngine.generate`` forwards it the same way).  Every layer
+records the phases it owns as spans:
+
+  • API       — ``auth``, ``params``, ``cache``, ``usage``
+  • scheduler — ``queue``, ``decode`` (continuous batching)
+  • backend   — ``template``, ``tokenize``, ``prefill``, ``decode``,
+    or ``generate`` where prefill and decode run as one call
+
+Finished traces are appended to a JSONL file by ``TraceWriter`` (off
+the request path) and can be summarised in an ``x-timing`` response
+header using the ``Server-Timing`` syntax.  With tracing off no
+``Trace`` exists and ``span(None, …)`` costs one ``if``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger("llm_daemon")
+
+#: Rotate the trace file (to ``<name>.1``) once it grows past this size
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class Trace:
+    """Timed phases of one request; safe to record from any thread."""
+
+    def __init__(self, name: str, **attrs: Any) -> None:
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs: Dict[str, Any] = dict(attrs)
+        self.started = datetime.now()
+        self._t0 = time.perf_counter()
+        self._end: Optional[float] = None
+        # (name, start, end, attrs) — perf_counter seconds
+        self._spans: List[Tuple[str, float, float, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float, **attrs: Any) -> None:
+        """Record a phase measured elsewhere (``perf_counter`` values)."""
+        with self._lock:
+            self._spans.append((name, start, end, attrs))
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """Time the enclosed block; the yielded dict collects attributes."""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.add(name, start, time.perf_counter(), **attrs)
+
+    def set(self, **attrs: Any) -> None:
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def finish(self) -> None:
+        if self._end is None:
+            self._end = time.perf_counter()
+
+    # ── Export ─────────────────────────────────────────────────────
+    def timings(self) -> Dict[str, float]:
+        """Milliseconds per phase name (repeated phases are summed)."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for name, start, end, _attrs in self._spans:
+                totals[name] = totals.get(name, 0.0) + (end - start) * 1000.0
+        return totals
+
+    def header(self) -> str:
+        """``x-timing`` value, e.g. ``auth;dur=0.4, queue;dur=1.2, total;dur=52``."""
+        parts = [f"{name};dur={ms:.2f}" for name, ms in self.timings().items()]
+        end = self._end if self._end is not None else time.perf_counter()
+        parts.append(f"total;dur={(end - self._t0) * 1000.0:.2f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self._end if self._end is not None else time.perf_counter()
+        with self._lock:
+            spans = sorted(self._spans, key=lambda s: s[1])
+            attrs = dict(self.attrs)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started": self.started.isoformat(),
+            "duration_ms": round((end - self._t0) * 1000.0, 3),
+            "attrs": attrs,
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((start - self._t0) * 1000.0, 3),
+                    "duration_ms": round((stop - start) * 1000.0, 3),
+                    **span_attrs,
+                }
+                for name, start, stop, span_attrs in spans
+            ],
+        }
+
+
+@contextmanager
+def span(trace: Optional[Trace], name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """``trace.span(name)``, or a no-op when *trace* is ``None``."""
+    if trace is None:
+        yield attrs
+        return
+    with trace.span(name, **attrs) as collected:
+        yield collected
+
+
+class TraceWriter:
+    """Append finished traces to *path* as JSON lines from a worker thread."""
+
+    def __init__(self, path: Path | str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def write(self, trace: Trace) -> None:
+        """Finish *trace* and queue it for export; never blocks on disk."""
+        trace.finish()
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="trace-writer", daemon=True
+                    )
+                    self._thread.start()
+        self._queue.put(trace)
+
+    def stop(self) -> None:
+        """Flush queued traces and stop the worker."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            batch = [trace]
+            # Drain whatever else is waiting into the same write
+            while trace is not None and not self._queue.empty():
+                trace = self._queue.get_nowait()
+                batch.append(trace)
+            lines = [json.dumps(t.to_dict()) + "\n" for t in batch if t is not None]
+            if lines:
+                try:
+                    self._append(lines)
+                except Exception:
+                    log.exception("Failed to write %d trace(s)", len(lines))
+            if batch[-1] is None:
+                return
+
+    def _append(self, lines: List[str]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.max_bytes and self.path.stat().st_size >= self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+        except FileNotFoundError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.writelines(lines)
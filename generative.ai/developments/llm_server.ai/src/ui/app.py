@@ -92,11 +92,47 @@ class LLMServerApp(App):
     # ── Lifecycle ──────────────────────────────────────────────────
     def on_mount(self) -> None:
         self.update_sidebar_status()
+        self._subscribe_events()
 
     def on_unmount(self) -> None:
         """TUI exit — do NOT touch daemon state."""
         pass  # Daemon keeps running
 
+    # ── Daemon events (pushed — no polling) ───────────────────────
+    def _subscribe_events(self) -> None:
+        try:
+            self.client.subscribe(self._on_daemon_event_thread)
+        except (DaemonDisconnected, RuntimeError):
+            self.set_timer(3, self._subscribe_events)  # daemon not up yet
+
+    def _on_daemon_event_thread(self, event: str, data: dict) -> None:
+        try:
+            self.call_from_thread(self.on_daemon_event, event, data)
+        except RuntimeError:
+            pass  # app is shutting down
+
+    def on_daemon_event(self, event: str, data: dict) -> None:
+        """Route a daemon event to the sidebar and interested screens."""
+        if event == "disconnected":
+            self.update_sidebar_status()
+            self.set_timer(3, self._subscribe_events)
+            return
+        try:
+            if event == "download":
+                self.query_one(ModelsScreen).on_download_event(data)
+            elif event in ("model", "server"):
+                self.update_sidebar_status()
+                if event == "model" and data.get("state") != "loading":
+                    self.query_one(ModelsScreen)._refresh_downloaded()
+                if self._current_nav == "testing":
+                    self.query_one(TestingScreen)._refresh_model_label()
+            elif event == "usage" and self._current_nav == "keys":
+                self.query_one(APIKeysScreen)._refresh_usage()
+            if event != "download" and self._current_nav == "dashboard":
+                self.query_one(DashboardScreen).refresh_info()
+        except Exception:
+            pass
+
     # ── Navigation ─────────────────────────────────────────────────
     def action_switch_screen(self, name: str) -> None:
         switcher = self.query_one("#main-content", ContentSwitcher)
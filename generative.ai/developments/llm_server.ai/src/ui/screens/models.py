@@ -2,8 +2,6 @@
 
 from __future__ import annotations
 
-import time
-
 from textual import work
 from textual.app import ComposeResult
 from textual.containers import Container, Horizontal, Vertical
@@ -194,6 +192,7 @@ class ModelsScreen(Container):
         dtbl.cursor_type = "row"
 
         self._downloading_model_id: str | None = None
+        self._dl_file_count = 0
         self._file_keys: list[str] = []
         self._refresh_downloaded()
         self._check_existing_download()
@@ -357,7 +356,7 @@ class ModelsScreen(Container):
         model_id: str,
         filenames: list[str] | None = None,
     ) -> None:
-        """Tell daemon to start downloading, then begin polling."""
+        """Tell daemon to start downloading; progress arrives as events."""
         client = self.app.client  # type: ignore[attr-defined]
         try:
             result = client.download_model(model_id, filenames=filenames)
@@ -383,97 +382,78 @@ class ModelsScreen(Container):
         self.query_one("#dl-progress", ProgressBar).update(total=100, progress=0)
         self.query_one("#btn-stop-dl", Button).display = True
         self.query_one("#dl-status", Static).update("")
-        # Start polling loop
-        self._poll_download_loop()
-
-    @work(thread=True, exclusive=True, group="download-poll")
-    def _poll_download_loop(self) -> None:
-        """Poll daemon for download progress every 300ms."""
-        client = self.app.client  # type: ignore[attr-defined]
-        prev_file_count = 0
-
-        while True:
-            time.sleep(0.3)
-            try:
-                st = client.download_status()
-            except DaemonDisconnected:
-                self.app.call_from_thread(
-                    self.query_one("#dl-header", Static).update,
-                    "[red]Daemon disconnected[/red]",
-                )
-                break
-
-            phase = st.get("phase", "idle")
-            files = st.get("files", [])
-            pct = st.get("progress_pct", 0)
-            speed_str = st.get("speed_str", "—")
-            idx = st.get("current_idx", 0)
-            total = st.get("total_files", 0)
-            bytes_done = st.get("bytes_done", 0)
-            bytes_total = st.get("bytes_total", 0)
-
-            # Rebuild file table when file count changes
-            if len(files) != prev_file_count:
-                self._rebuild_file_table(files)
-                prev_file_count = len(files)
-            else:
-                self._update_file_statuses(files)
-
-            # Progress bar
-            self.app.call_from_thread(
-                self.query_one("#dl-progress", ProgressBar).update,
-                total=100,
-                progress=min(pct, 100),
-            )
+        self._dl_file_count = 0
 
-            # Overall label
-            size_done = self._human_size(bytes_done)
-            size_total = self._human_size(bytes_total)
-            self.app.call_from_thread(
-                self.query_one("#dl-overall-label", Static).update,
-                f"  [{idx}/{total}]  {size_done} / {size_total}  ⚡ {speed_str}",
-            )
-
-            # Terminal states
-            if phase == "completed":
-                mid = self._downloading_model_id
-                self.app.call_from_thread(self._refresh_downloaded)
-                self.app.call_from_thread(self._clean_dl_panel)
-                self.app.call_from_thread(
-                    self.app.notify,
-                    f"Model {mid} downloaded ✓",
-                )
-                self._downloading_model_id = None
-                break
+    # ── Download progress (pushed by the daemon) ───────────────────
+    def on_download_event(self, st: dict) -> None:
+        """Apply a ``download`` event from the daemon to the panel."""
+        if self._downloading_model_id is None:
+            if not st.get("active"):
+                return
+            # Download started elsewhere (another TUI, CLI…) — show it
+            self._show_dl_panel(st.get("model_id", "?"))
+
+        phase = st.get("phase", "idle")
+        files = st.get("files", [])
+        pct = st.get("progress_pct", 0)
+        speed_str = st.get("speed_str", "—")
+        idx = st.get("current_idx", 0)
+        total = st.get("total_files", 0)
+        bytes_done = st.get("bytes_done", 0)
+        bytes_total = st.get("bytes_total", 0)
+
+        # Rebuild file table when file count changes
+        if len(files) != self._dl_file_count:
+            self._rebuild_file_table(files)
+            self._dl_file_count = len(files)
+        else:
+            self._update_file_statuses(files)
 
-            elif phase == "cancelled":
-                self.app.call_from_thread(self._clean_dl_panel)
-                self.app.call_from_thread(
-                    self.app.notify,
-                    "Download stopped ✓",
-                    severity="warning",
-                )
-                self._downloading_model_id = None
-                break
+        # Progress bar
+        self.query_one("#dl-progress", ProgressBar).update(
+            total=100, progress=min(pct, 100)
+        )
 
-            elif phase == "error":
-                err = st.get("error", "Unknown error")
-                self.app.call_from_thread(self._clean_dl_panel)
-                self.app.call_from_thread(
-                    self.app.notify,
-                    f"Download error: {err}",
-                    severity="error",
-                )
-                self._downloading_model_id = None
-                break
+        # Overall label
+        size_done = self._human_size(bytes_done)
+        size_total = self._human_size(bytes_total)
+        self.query_one("#dl-overall-label", Static).update(
+            f"  [{idx}/{total}]  {size_done} / {size_total}  ⚡ {speed_str}"
+        )
 
-            elif phase == "idle" and not st.get("active"):
-                break
+        # Terminal states
+        if phase == "completed":
+            mid = self._downloading_model_id
+            self._refresh_downloaded()
+            self._clean_dl_panel()
+            self.app.notify(f"Model {mid} downloaded ✓")  # type: ignore[attr-defined]
+            self._downloading_model_id = None
+
+        elif phase == "cancelled":
+            self._clean_dl_panel()
+            self.app.notify("Download stopped ✓", severity="warning")  # type: ignore[attr-defined]
+            self._downloading_model_id = None
+
+        elif phase == "error":
+            err = st.get("error", "Unknown error")
+            self._clean_dl_panel()
+            self.app.notify(f"Download error: {err}", severity="error")  # type: ignore[attr-defined]
+            self._downloading_model_id = None
+
+    def _show_dl_panel(self, model_id: str) -> None:
+        self._downloading_model_id = model_id
+        self._dl_file_count = 0
+        panel = self.query_one("#dl-panel", Container)
+        panel.display = True
+        self.query_one("#dl-header", Static).update(
+            f"⬇  Downloading [b]{model_id}[/b]"
+        )
+        self.query_one("#btn-stop-dl", Button).display = True
 
     def _rebuild_file_table(self, files: list) -> None:
         """Rebuild the download file table from scratch."""
         ftbl = self.query_one("#dl-file-table", DataTable)
-        self.app.call_from_thread(ftbl.clear)
+        ftbl.clear()
         self._file_keys = []
         status_map = {
             "pending": "[dim]⏳ pending[/dim]",
@@ -485,9 +465,7 @@ class ModelsScreen(Container):
             key = f["name"]
             self._file_keys.append(key)
             icon = status_map.get(f.get("status", "pending"), "[dim]⏳ pending[/dim]")
-            self.app.call_from_thread(
-                ftbl.add_row, icon, f["name"], f.get("size_str", "?"), key=key
-            )
+            ftbl.add_row(icon, f["name"], f.get("size_str", "?"), key=key)
 
     def _update_file_statuses(self, files: list) -> None:
         """Update per-file status icons in the download table."""
@@ -505,9 +483,7 @@ class ModelsScreen(Container):
             for f in files:
                 icon = status_map.get(f.get("status", "pending"), "[dim]?[/dim]")
                 try:
-                    self.app.call_from_thread(
-                        ftbl.update_cell, RowKey(f["name"]), col_key, icon
-                    )
+                    ftbl.update_cell(RowKey(f["name"]), col_key, icon)
                 except Exception:
                     pass
         except Exception:
@@ -519,8 +495,8 @@ class ModelsScreen(Container):
         except DaemonDisconnected:
             self.app.notify("Daemon offline", severity="error")  # type: ignore[attr-defined]
             return
-        # Immediately clean the panel for snappy UX;
-        # the poll loop will also break on "cancelled" phase.
+        # Immediately clean the panel for snappy UX; the "cancelled"
+        # event that follows is ignored once no download is tracked.
         self._clean_dl_panel()
         self._downloading_model_id = None
         self.app.notify("Download stopped ✓", severity="warning")  # type: ignore[attr-defined]
@@ -537,19 +513,12 @@ class ModelsScreen(Container):
         self._file_keys = []
 
     def _check_existing_download(self) -> None:
-        """If daemon has an active download, show the panel and start polling."""
+        """If daemon has an active download, show the panel; events follow."""
         try:
             st = self.app.client.download_status()  # type: ignore[attr-defined]
             if st.get("active"):
-                model_id = st.get("model_id", "?")
-                self._downloading_model_id = model_id
-                panel = self.query_one("#dl-panel", Container)
-                panel.display = True
-                self.query_one("#dl-header", Static).update(
-                    f"⬇  Downloading [b]{model_id}[/b]"
-                )
-                self.query_one("#btn-stop-dl", Button).display = True
-                self._poll_download_loop()
+                self._show_dl_panel(st.get("model_id", "?"))
+                self.on_download_event(st)
         except DaemonDisconnected:
             pass
 
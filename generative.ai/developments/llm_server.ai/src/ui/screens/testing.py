@@ -2,6 +2,9 @@
 
 from __future__ import annotations
 
+import uuid
+
+from rich.text import Text
 from textual import work
 from textual.app import ComposeResult
 from textual.containers import Container, Horizontal
@@ -47,6 +50,9 @@ class TestingScreen(Container):
         height: auto;
         color: #7aa2f7;
     }
+    #stream-line {
+        height: auto;
+    }
     """
 
     def compose(self) -> ComposeResult:
@@ -74,6 +80,7 @@ class TestingScreen(Container):
 
             with Horizontal(id="test-btn-row"):
                 yield Button("🚀  Generate", id="btn-generate", variant="success")
+                yield Button("⏹  Stop", id="btn-stop", variant="error")
                 yield Button("🗑  Clear Output", id="btn-clear", variant="default")
             yield Static("", id="gen-status")
 
@@ -81,9 +88,12 @@ class TestingScreen(Container):
         with Container(classes="test-section"):
             yield Static("[b]Output[/b]", markup=True)
             yield RichLog(id="output-log", highlight=True, markup=True)
+            # Line currently being generated (moved to the log on newline)
+            yield Static("", id="stream-line", markup=False)
 
     # ── Lifecycle ──────────────────────────────────────────────────
     def on_mount(self) -> None:
+        self._generation_id: str | None = None
         self._refresh_model_label()
 
     def _refresh_model_label(self) -> None:
@@ -107,10 +117,21 @@ class TestingScreen(Container):
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "btn-generate":
             self._run_generate()
+        elif event.button.id == "btn-stop":
+            self._stop_generate()
         elif event.button.id == "btn-clear":
             self.query_one("#output-log", RichLog).clear()
             self.query_one("#gen-status", Static).update("")
 
+    @work(thread=True, group="stop")
+    def _stop_generate(self) -> None:
+        if self._generation_id is None:
+            return
+        try:
+            self.app.client.cancel_generation(self._generation_id)  # type: ignore[attr-defined]
+        except DaemonDisconnected:
+            pass
+
     @work(thread=True, exclusive=True, group="generate")
     def _run_generate(self) -> None:
         app = self.app  # type: ignore[attr-defined]
@@ -147,24 +168,53 @@ class TestingScreen(Container):
             messages.append({"role": "system", "content": system_text})
         messages.append({"role": "user", "content": user_text})
 
+        log = self.query_one("#output-log", RichLog)
+        live = self.query_one("#stream-line", Static)
+        self.app.call_from_thread(
+            log.write, f"[bold cyan]User:[/bold cyan] {user_text}"
+        )
+        self.app.call_from_thread(log.write, "[bold green]Assistant:[/bold green]")
+
+        # RichLog only appends whole lines: finished lines go to the log,
+        # the partial one is shown live underneath it.
+        line = ""
+        n_chunks = 0
+        self._generation_id = gen_id = uuid.uuid4().hex[:12]
         try:
-            result = app.client.chat_generate(messages)
-            if result["ok"]:
-                text = result["data"]["text"]
-                log = self.query_one("#output-log", RichLog)
-                self.app.call_from_thread(
-                    log.write, f"[bold cyan]User:[/bold cyan] {user_text}"
-                )
-                self.app.call_from_thread(
-                    log.write, f"[bold green]Assistant:[/bold green] {text}"
-                )
-                self.app.call_from_thread(log.write, "─" * 60)
-                self.app.call_from_thread(status.update, "[green]✓ Done[/green]")
-            else:
-                self.app.call_from_thread(
-                    status.update,
-                    f"[red]Error: {result.get('error', '?')}[/red]",
-                )
+            for frame in app.client.chat_generate_stream(messages, gen_id):
+                event, data = frame["event"], frame["data"]
+                if event == "token":
+                    n_chunks += 1
+                    *done_lines, line = (line + data["text"]).split("\n")
+                    for done in done_lines:
+                        self.app.call_from_thread(log.write, Text(done))
+                    self.app.call_from_thread(live.update, line)
+                    # Frames are text deltas, not tokens — the exact
+                    # token count arrives with the ``done`` frame
+                    self.app.call_from_thread(
+                        status.update, f"⏳ Generating… {n_chunks} chunks"
+                    )
+                elif event == "done":
+                    self.app.call_from_thread(log.write, Text(line))
+                    self.app.call_from_thread(live.update, "")
+                    self.app.call_from_thread(log.write, "─" * 60)
+                    if data["finish_reason"] == "cancelled":
+                        head = "[yellow]⏹ Stopped[/yellow]"
+                    else:
+                        head = "[green]✓ Done[/green]"
+                    self.app.call_from_thread(
+                        status.update,
+                        f"{head}  "
+                        f"TTFT {data['ttft_ms']:.0f} ms · "
+                        f"{data['completion_tokens']} tokens · "
+                        f"{data['tokens_per_s']:.1f} tok/s",
+                    )
+                elif event == "error":
+                    self.app.call_from_thread(live.update, "")
+                    self.app.call_from_thread(
+                        status.update,
+                        f"[red]Error: {data.get('error', '?')}[/red]",
+                    )
         except DaemonDisconnected:
             self.app.call_from_thread(
                 status.update, "[red]Daemon offline[/red]"
@@ -173,3 +223,5 @@ class TestingScreen(Container):
             self.app.call_from_thread(
                 status.update, f"[red]Error: {exc}[/red]"
             )
+        finally:
+            self._generation_id = None